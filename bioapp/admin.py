@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Producto, Lote, Movimiento, Lugar, Contenedor
+from .models import Producto, Lote, Movimiento, Lugar, Contenedor, Exportacion
+from .inventario import recalcular_stock
+from . import resumen
+from django.utils import timezone
 
 class LoteInline(admin.TabularInline):
     model = Lote
@@ -11,16 +14,39 @@ class ProductoAdmin(admin.ModelAdmin):
     search_fields = ('nombre', 'codigo')
     inlines = [LoteInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recalcular_stock(form.instance.pk)
+
 @admin.register(Lote)
 class LoteAdmin(admin.ModelAdmin):
     list_display = ('producto', 'numero_lote', 'contenedor', 'cantidad', 'fecha_vencimiento')
     list_filter = ('fecha_vencimiento', 'contenedor__lugar') 
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalcular_stock(obj.producto_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalcular_stock(obj.producto_id)
+
 @admin.register(Movimiento)
 class MovimientoAdmin(admin.ModelAdmin):
     list_display = ('fecha', 'tipo', 'producto', 'cantidad', 'total_movimiento', 'usuario')
     list_filter = ('tipo', 'fecha')
 
+    def save_model(self, request, obj, form, change):
+        anterior = Movimiento.objects.filter(pk=obj.pk).values_list('fecha', 'producto_id').first() if change else None
+        super().save_model(request, obj, form, change)
+        if anterior and anterior[1] != obj.producto_id:
+            resumen.recalcular_dia(timezone.localdate(anterior[0]), anterior[1])
+        resumen.recalcular_dia(timezone.localdate(obj.fecha), obj.producto_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        resumen.recalcular_dia(timezone.localdate(obj.fecha), obj.producto_id)
+
 @admin.register(Lugar)
 class LugarAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'descripcion')
@@ -28,4 +54,9 @@ class LugarAdmin(admin.ModelAdmin):
 @admin.register(Contenedor)
 class ContenedorAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'lugar')
-    list_filter = ('lugar',)
\ No newline at end of file
+    list_filter = ('lugar',)
+
+@admin.register(Exportacion)
+class ExportacionAdmin(admin.ModelAdmin):
+    list_display = ('fecha_solicitud', 'reporte', 'formato', 'estado', 'filas_procesadas', 'solicitado_por')
+    list_filter = ('reporte', 'formato', 'estado')
@@ -0,0 +1,55 @@
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .inventario import StockInsuficiente, registrar_salidas
+from .models import Producto
+from .serializers import TicketSerializer
+
+
+class TicketAPIView(APIView):
+    """Registra un ticket completo de ventas/mermas: [{codigo, tipo, cantidad}] -> resultado por línea.
+
+    Los códigos se resuelven en una consulta y todas las líneas válidas se
+    asignan por FIFO en una sola transacción; una línea sin stock o con código
+    desconocido no impide registrar las demás.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = TicketSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lineas = serializer.validated_data['lineas']
+        observacion_ticket = serializer.validated_data['observacion']
+
+        productos = Producto.objects.in_bulk({linea['codigo'] for linea in lineas}, field_name='codigo')
+        resultados = []
+        pendientes = []
+        for i, linea in enumerate(lineas):
+            resultado = {'linea': i, 'codigo': linea['codigo'], 'tipo': linea['tipo'], 'cantidad': linea['cantidad']}
+            resultados.append(resultado)
+            producto = productos.get(linea['codigo'])
+            observacion = linea['observacion'] or observacion_ticket
+            if producto is None:
+                resultado.update(ok=False, error="No existe producto.")
+            elif linea['tipo'] == 'MERMA' and len(observacion.strip()) < 5:
+                resultado.update(ok=False, error="Escriba razón de merma obligatoria.")
+            else:
+                pendientes.append((resultado, (producto, linea['tipo'], linea['cantidad'], observacion)))
+
+        registrados = registrar_salidas([datos for _, datos in pendientes], request.user)
+        for (resultado, (producto, *_)), registro in zip(pendientes, registrados):
+            if isinstance(registro, StockInsuficiente):
+                resultado.update(ok=False, error="Stock insuficiente.", disponible=registro.args[0])
+            else:
+                resultado.update(
+                    ok=True, producto=producto.nombre,
+                    total=sum(m.total_movimiento for m in registro),
+                    lotes=[{'lote': m.lote_id, 'cantidad': m.cantidad} for m in registro if m.lote_id],
+                )
+
+        return Response({
+            'lineas': resultados,
+            'registradas': sum(1 for r in resultados if r['ok']),
+            'total': sum(r.get('total', 0) for r in resultados),
+        })
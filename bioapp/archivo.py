@@ -0,0 +1,76 @@
+"""Archivo de movimientos antiguos.
+
+Los movimientos anteriores al horizonte pasan de Movimiento a
+MovimientoArchivado y lo que sumaban queda en SaldoInicial por producto, así
+los saldos (calcular_saldos) siguen cuadrando. ResumenDiario no se toca: los
+paneles y la tendencia no cambian, y reconstruir() y la exportación del
+historial leen las dos tablas.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Movimiento, MovimientoArchivado, SaldoInicial
+
+DIAS_HORIZONTE = 365
+TAMANO_LOTE_ARCHIVO = 2000
+CAMPOS = ('id', 'producto_id', 'lote_id', 'usuario_id', 'tipo', 'cantidad', 'fecha',
+          'precio_unitario_snapshot', 'total_movimiento', 'observacion')
+
+
+def horizonte(hoy=None):
+    """Primer día que se conserva en Movimiento según ARCHIVO_DIAS (365 por defecto)."""
+    dias = getattr(settings, 'ARCHIVO_DIAS', DIAS_HORIZONTE)
+    return (hoy or timezone.localdate()) - timedelta(days=dias)
+
+
+def _sumar_saldos(filas, corte):
+    por_producto = defaultdict(lambda: [0, 0, 0])
+    for fila in filas:
+        saldo = por_producto[fila['producto_id']]
+        saldo[0 if fila['tipo'] == 'ENTRADA' else 1] += fila['cantidad']
+        saldo[2] += 1
+    SaldoInicial.objects.bulk_create([SaldoInicial(producto_id=pk) for pk in por_producto], ignore_conflicts=True)
+
+    def suma(posicion):
+        return Case(*[When(producto_id=pk, then=Value(valores[posicion])) for pk, valores in por_producto.items()],
+                    default=Value(0), output_field=IntegerField())
+
+    SaldoInicial.objects.filter(producto_id__in=sorted(por_producto)).update(
+        entradas=F('entradas') + suma(0), salidas=F('salidas') + suma(1),
+        movimientos=F('movimientos') + suma(2), archivado_hasta=corte)
+
+
+def _borrar(ids):
+    # DELETE directo: con señales post_delete conectadas, QuerySet.delete() cargaría
+    # cada fila para emitirlas, y archivar no cambia ni los paneles ni las exportaciones.
+    tabla = connection.ops.quote_name(Movimiento._meta.db_table)
+    columna = connection.ops.quote_name(Movimiento._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabla} WHERE {columna} IN ({', '.join(['%s'] * len(ids))})", ids)
+
+
+def archivar(hasta=None, tamano=TAMANO_LOTE_ARCHIVO):
+    """Archiva los movimientos de antes del día `hasta` (el horizonte por defecto).
+
+    Trabaja en bloques de `tamano` por (fecha, id); cada bloque se copia, se
+    suma al saldo inicial y se borra en una transacción, así un corte a la
+    mitad deja todo consistente y se puede volver a ejecutar.
+    Devuelve la cantidad de movimientos archivados.
+    """
+    corte = timezone.make_aware(datetime.combine(hasta or horizonte(), time.min))
+    total = 0
+    while True:
+        with transaction.atomic():
+            filas = list(Movimiento.objects.select_for_update()
+                         .filter(fecha__lt=corte).order_by('fecha', 'id').values(*CAMPOS)[:tamano])
+            if not filas:
+                return total
+            MovimientoArchivado.objects.bulk_create([MovimientoArchivado(**fila) for fila in filas])
+            _sumar_saldos(filas, corte)
+            _borrar([fila['id'] for fila in filas])
+        total += len(filas)
@@ -0,0 +1 @@
+"""Backend MySQL/MariaDB de Django con pool de conexiones (ENGINE = 'bioapp.backends.mysql_pool')."""
@@ -0,0 +1,44 @@
+from functools import partial
+
+from django.db.backends.mysql import base as mysql
+
+from .pool import PoolAgotado, obtener_pool
+
+OPCIONES_POOL = {'TAMANO': 'tamano', 'ESPERA': 'espera', 'VIDA_MAXIMA': 'vida_maxima', 'VERIFICAR': 'verificar'}
+
+
+class DatabaseWrapper(mysql.DatabaseWrapper):
+    """El backend MySQL de Django, pero las conexiones salen de un pool y vuelven a él al cerrarse.
+
+    Se configura con la clave POOL de la base en DATABASES (TAMANO, ESPERA,
+    VIDA_MAXIMA, VERIFICAR); sin POOL o con TAMANO 0 se comporta igual que
+    el backend original.
+    """
+
+    _pool_actual = None
+
+    def _pool(self):
+        opciones = self.settings_dict.get('POOL') or {}
+        if not opciones.get('TAMANO'):
+            return None
+        # Con otra base o servidor (p. ej. la base de pruebas) es otro pool.
+        clave = (self.alias, *(self.settings_dict.get(campo) for campo in ('HOST', 'PORT', 'NAME', 'USER')))
+        return obtener_pool(clave, self.alias, **{OPCIONES_POOL[nombre]: valor for nombre, valor in opciones.items()})
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            conexion = pool.tomar(partial(super().get_new_connection, conn_params))
+        except PoolAgotado as e:
+            raise mysql.Database.OperationalError(str(e)) from e
+        self._pool_actual = pool
+        return conexion
+
+    def _close(self):
+        pool, self._pool_actual = self._pool_actual, None
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.devolver(self.connection)
@@ -0,0 +1,164 @@
+"""Pool acotado de conexiones DB-API, compartido por los hilos de un proceso.
+
+Django abre una conexión por hilo y la cierra al terminar cada solicitud
+(CONN_MAX_AGE = 0); con este pool el cierre la devuelve y la próxima
+solicitud, de cualquier hilo, la reutiliza sin repetir el handshake.
+"""
+import threading
+import time
+from collections import deque
+
+from bioapp.metricas import POOL_CONEXIONES, POOL_ESPERA, POOL_EVENTOS
+
+
+class PoolAgotado(Exception):
+    pass
+
+
+class PoolConexiones:
+    """A lo más `tamano` conexiones abiertas; quien no consigue una espera hasta `espera` segundos.
+
+    Antes de entregar una conexión libre se verifica con ping() (si
+    `verificar`), y las que superan `vida_maxima` segundos desde que se
+    abrieron se cierran en vez de reutilizarse.
+    """
+
+    def __init__(self, alias, tamano=10, espera=5.0, vida_maxima=1800, verificar=True):
+        self.alias = alias
+        self.tamano = tamano
+        self.espera = espera
+        self.vida_maxima = vida_maxima
+        self.verificar = verificar
+        self._libres = deque()
+        self._en_uso = {}
+        self._abiertas = 0
+        self._condicion = threading.Condition()
+
+    def estado(self):
+        with self._condicion:
+            return {'abiertas': self._abiertas, 'en_uso': len(self._en_uso), 'libres': len(self._libres)}
+
+    def _publicar(self):
+        POOL_CONEXIONES.fijar(len(self._en_uso), alias=self.alias, estado='en_uso')
+        POOL_CONEXIONES.fijar(len(self._libres), alias=self.alias, estado='libres')
+
+    def _vencida(self, creada):
+        return self.vida_maxima is not None and time.monotonic() - creada >= self.vida_maxima
+
+    def _reservar(self, limite):
+        """Una conexión libre (conexion, creada) o (None, None) si hay cupo para abrir otra."""
+        with self._condicion:
+            while True:
+                if self._libres:
+                    # La más recién usada: las que sobran quedan al fondo y envejecen.
+                    return self._libres.pop()
+                if self._abiertas < self.tamano:
+                    self._abiertas += 1
+                    return None, None
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    POOL_EVENTOS.inc(alias=self.alias, evento='agotado')
+                    raise PoolAgotado(f"Sin conexiones libres en el pool '{self.alias}' "
+                                      f"({self.tamano} en uso) después de {self.espera}s.")
+                self._condicion.wait(restante)
+
+    def _entregar(self, conexion, creada, evento):
+        with self._condicion:
+            self._en_uso[id(conexion)] = creada
+            self._publicar()
+        POOL_EVENTOS.inc(alias=self.alias, evento=evento)
+        return conexion
+
+    def _descartar(self, conexion, evento):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+        with self._condicion:
+            self._abiertas -= 1
+            self._publicar()
+            self._condicion.notify()
+        POOL_EVENTOS.inc(alias=self.alias, evento=evento)
+
+    def _responde(self, conexion):
+        try:
+            conexion.ping()
+        except Exception:
+            return False
+        return True
+
+    def tomar(self, crear):
+        """Entrega una conexión libre y sana, o abre una nueva con crear() si hay cupo."""
+        inicio = time.monotonic()
+        while True:
+            conexion, creada = self._reservar(inicio + self.espera)
+            if conexion is None:
+                POOL_ESPERA.observar(time.monotonic() - inicio, alias=self.alias)
+                try:
+                    conexion = crear()
+                except BaseException:
+                    with self._condicion:
+                        self._abiertas -= 1
+                        self._condicion.notify()
+                    raise
+                return self._entregar(conexion, time.monotonic(), 'creada')
+            if self._vencida(creada):
+                self._descartar(conexion, 'vencida')
+            elif self.verificar and not self._responde(conexion):
+                self._descartar(conexion, 'sin_respuesta')
+            else:
+                POOL_ESPERA.observar(time.monotonic() - inicio, alias=self.alias)
+                return self._entregar(conexion, creada, 'reutilizada')
+
+    def devolver(self, conexion):
+        """Deshace lo que haya quedado sin confirmar y la deja libre (o la cierra si ya venció)."""
+        with self._condicion:
+            creada = self._en_uso.pop(id(conexion), None)
+        if creada is None:
+            conexion.close()
+            return
+        if self._vencida(creada):
+            self._descartar(conexion, 'vencida')
+            return
+        try:
+            conexion.rollback()
+        except Exception:
+            self._descartar(conexion, 'error')
+            return
+        with self._condicion:
+            self._libres.append((conexion, creada))
+            self._publicar()
+            self._condicion.notify()
+
+    def vaciar(self):
+        """Cierra las conexiones libres; las que están en uso se cierran al devolverse si vencen."""
+        with self._condicion:
+            libres, self._libres = list(self._libres), deque()
+            self._abiertas -= len(libres)
+            self._publicar()
+            self._condicion.notify_all()
+        for conexion, _ in libres:
+            try:
+                conexion.close()
+            except Exception:
+                pass
+
+
+_POOLS = {}
+_BLOQUEO = threading.Lock()
+
+
+def obtener_pool(clave, alias, **opciones):
+    """El pool de `clave` (alias y destino de la conexión), creado la primera vez con `opciones`."""
+    with _BLOQUEO:
+        pool = _POOLS.get(clave)
+        if pool is None:
+            pool = _POOLS[clave] = PoolConexiones(alias, **opciones)
+        return pool
+
+
+def vaciar_pools():
+    with _BLOQUEO:
+        pools = list(_POOLS.values())
+    for pool in pools:
+        pool.vaciar()
@@ -0,0 +1,120 @@
+import re
+import unicodedata
+
+from django.db.models import Q
+
+from .models import Producto, Lote, Contenedor, Lugar, TerminoBusqueda
+from .versiones import nueva_version, version
+
+LARGO_TERMINO = 50
+_SEPARADORES = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return texto.lower().strip()
+
+
+def terminos(*textos, codigos=()):
+    """Palabras indexables de los textos; los códigos además se indexan sin separadores."""
+    resultado = set()
+    for texto in textos:
+        resultado.update(_SEPARADORES.split(normalizar(texto)))
+    for codigo in codigos:
+        partes = _SEPARADORES.split(normalizar(codigo))
+        resultado.update(partes)
+        resultado.add(''.join(partes))
+    return {t[:LARGO_TERMINO] for t in resultado if t}
+
+
+def terminos_de(tipo, objeto):
+    if tipo == 'PRODUCTO':
+        return terminos(objeto.nombre, codigos=[objeto.codigo])
+    if tipo == 'LOTE':
+        return terminos(codigos=[objeto.numero_lote])
+    return terminos(objeto.nombre)
+
+
+def version_de(tipo):
+    """Versión del índice de un tipo; cambia solo cuando se reindexa ese tipo."""
+    return version(f"busqueda:{tipo.lower()}")
+
+
+def indexar(tipo, objeto):
+    TerminoBusqueda.objects.filter(tipo=tipo, objeto_id=objeto.pk).delete()
+    TerminoBusqueda.objects.bulk_create(
+        [TerminoBusqueda(tipo=tipo, objeto_id=objeto.pk, termino=t) for t in terminos_de(tipo, objeto)])
+    nueva_version(f"busqueda:{tipo.lower()}")
+
+
+def desindexar(tipo, objeto_id):
+    TerminoBusqueda.objects.filter(tipo=tipo, objeto_id=objeto_id).delete()
+    nueva_version(f"busqueda:{tipo.lower()}")
+
+
+MODELOS = {
+    'PRODUCTO': Producto,
+    'LOTE': Lote,
+    'CONTENEDOR': Contenedor,
+    'LUGAR': Lugar,
+}
+
+
+def reindexar_todo(tamano=2000):
+    TerminoBusqueda.objects.all().delete()
+    total = 0
+    for tipo, modelo in MODELOS.items():
+        filas = []
+        for objeto in modelo.objects.all().iterator(chunk_size=tamano):
+            filas.extend(TerminoBusqueda(tipo=tipo, objeto_id=objeto.pk, termino=t) for t in terminos_de(tipo, objeto))
+            if len(filas) >= tamano:
+                TerminoBusqueda.objects.bulk_create(filas)
+                total += len(filas)
+                filas = []
+        TerminoBusqueda.objects.bulk_create(filas)
+        total += len(filas)
+        nueva_version(f"busqueda:{tipo.lower()}")
+    return total
+
+
+def _siguiente(palabra):
+    """Menor cadena mayor que todas las que empiezan con `palabra` (alfabeto 0-9a-z), o None."""
+    while palabra:
+        ultimo = palabra[-1]
+        if ultimo != 'z':
+            return palabra[:-1] + ('a' if ultimo == '9' else chr(ord(ultimo) + 1))
+        palabra = palabra[:-1]
+    return None
+
+
+def _coincidencias(tipo, palabra):
+    # Rango en vez de LIKE 'x%': SQLite no usa índices con LIKE y el orden
+    # 0-9 < a-z se cumple en todas las intercalaciones de MySQL.
+    filas = TerminoBusqueda.objects.filter(tipo=tipo, termino__gte=palabra)
+    tope = _siguiente(palabra)
+    if tope:
+        filas = filas.filter(termino__lt=tope)
+    return filas.values('objeto_id')
+
+
+def condicion(texto, campos):
+    """Q para filtrar por `texto`: cada palabra debe ser prefijo de algún término de alguno de `campos`.
+
+    `campos` mapea tipo de índice -> campo del queryset a filtrar, p. ej.
+    {'PRODUCTO': 'producto_id', 'LOTE': 'pk'}. Devuelve None si no hay palabras.
+    """
+    palabras = terminos(texto)
+    if not palabras:
+        return None
+    resultado = Q()
+    for palabra in palabras:
+        alguna = Q()
+        for tipo, campo in campos.items():
+            alguna |= Q(**{f"{campo}__in": _coincidencias(tipo, palabra)})
+        resultado &= alguna
+    return resultado
+
+
+def filtrar(queryset, texto, campos):
+    filtro = condicion(texto, campos)
+    return queryset.filter(filtro) if filtro is not None else queryset
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Producto
+from .versiones import version
+
+# Campos del producto que necesitan el formulario de movimientos y los
+# servicios de inventario; el saldo (stock_actual) no va porque cambia con
+# cada movimiento sin pasar por save(). Van en el orden del modelo, como
+# los espera Model.from_db().
+CAMPOS = tuple(f.attname for f in Producto._meta.concrete_fields
+               if f.attname in {'id', 'codigo', 'nombre', 'unidad_medida', 'tipo_origen', 'gestiona_lotes',
+                                'precio_costo', 'precio_venta'})
+NO_EXISTE = 'no-existe'
+TIMEOUT = 60 * 60
+
+
+class _LRU:
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+_recientes = _LRU(getattr(settings, 'CODIGOS_EN_MEMORIA', 1000))
+# La versión 'productos' vive en CACHES; con LocMem cada worker tiene la suya y
+# no se entera de los cambios hechos en otro, así que el LRU además caduca.
+SEGUNDOS_EN_MEMORIA = getattr(settings, 'CODIGOS_SEGUNDOS_EN_MEMORIA', 5)
+
+
+def _snapshot(codigo, v):
+    clave = f"bioapp:codigo:{v}:{codigo}"
+    valores = cache.get(clave)
+    if valores is None:
+        fila = Producto.objects.filter(codigo=codigo).values_list(*CAMPOS).first()
+        valores = fila or NO_EXISTE
+        cache.set(clave, valores, TIMEOUT)
+    return valores
+
+
+def producto_por_codigo(codigo):
+    """Producto de un código de barras, o None si no existe.
+
+    Se resuelve primero en un LRU del proceso y luego en CACHES, ambos bajo la
+    versión 'productos' (que cambia al guardar o borrar un Producto). Los
+    workers solo ven el mismo dato si CACHES es compartido (Memcached/Redis);
+    con LocMem otro worker puede servir el precio viejo hasta que caduque su
+    snapshot (TIMEOUT). Las entradas del LRU duran SEGUNDOS_EN_MEMORIA como
+    máximo. Devuelve una instancia con solo CAMPOS cargados, válida para
+    asignar en claves foráneas.
+    """
+    codigo = (codigo or '').strip()
+    if not codigo:
+        return None
+    v = version('productos')
+    ahora = time.monotonic()
+    guardado = _recientes.get(codigo)
+    if guardado is not None and guardado[0] == v and guardado[2] > ahora:
+        valores = guardado[1]
+    else:
+        valores = _snapshot(codigo, v)
+        _recientes.set(codigo, (v, valores, ahora + SEGUNDOS_EN_MEMORIA))
+    if valores == NO_EXISTE:
+        return None
+    return Producto.from_db(DEFAULT_DB_ALIAS, CAMPOS, valores)
@@ -0,0 +1,56 @@
+"""Consultas independientes en paralelo para las vistas async (paneles).
+
+El ORM async de Django pasa cada consulta por el mismo hilo de la conexión,
+así que igual quedan en serie; aquí cada consulta corre en un hilo de un
+pool acotado, con su propia conexión, y la vista espera a todas juntas.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PANELES_HILOS', 4),
+                                       thread_name_prefix='panel')
+    return _executor
+
+
+def _en_hilo(funcion, envolturas=()):
+    close_old_connections()
+    try:
+        # Los execute_wrapper de la solicitud (p. ej. MetricasMiddleware) también
+        # miden las consultas que corren aquí, en otra conexión.
+        with ExitStack() as pila:
+            for envoltura in envolturas:
+                pila.enter_context(connection.execute_wrapper(envoltura))
+            return funcion()
+    finally:
+        close_old_connections()
+
+
+def _estado_conexion():
+    return connection.in_atomic_block, list(connection.execute_wrappers)
+
+
+async def en_paralelo(consultas):
+    """Ejecuta {nombre: función sin argumentos} y devuelve {nombre: resultado}.
+
+    Si la solicitud tiene una transacción abierta (o PANELES_EN_PARALELO es
+    False) corren en serie en la conexión de la solicitud: otra conexión no
+    vería lo que la transacción todavía no confirmó.
+    """
+    en_transaccion, envolturas = await sync_to_async(_estado_conexion)()
+    if not getattr(settings, 'PANELES_EN_PARALELO', True) or en_transaccion:
+        return {nombre: await sync_to_async(funcion)() for nombre, funcion in consultas.items()}
+    loop = asyncio.get_running_loop()
+    resultados = await asyncio.gather(
+        *[loop.run_in_executor(_get_executor(), _en_hilo, funcion, envolturas) for funcion in consultas.values()])
+    return dict(zip(consultas, resultados))
@@ -0,0 +1,110 @@
+"""Archivos estáticos con hash en el nombre, precomprimidos y servidos con caché larga.
+
+collectstatic (con EstaticosComprimidos) deja en STATIC_ROOT cada archivo
+con el hash de su contenido en el nombre más sus versiones .gz y .br, y
+EstaticosMiddleware los sirve: los nombres con hash no cambian nunca, así
+que el navegador los guarda un año sin volver a preguntar.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # Sin brotli solo se genera .gz.
+    brotli = None
+
+COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html', '.woff', '.ttf', '.eot')
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'public, max-age=60'
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def comprimir(ruta):
+    """Escribe ruta.gz y ruta.br junto al archivo, solo si ahorran algo."""
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    variantes = {'.gz': gzip.compress(datos, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes['.br'] = brotli.compress(datos, quality=11)
+    for extension, comprimido in variantes.items():
+        if len(comprimido) < len(datos) * 0.95:
+            with open(ruta + extension, 'wb') as f:
+                f.write(comprimido)
+        elif os.path.exists(ruta + extension):
+            os.remove(ruta + extension)
+
+
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # Sin manifest (no se corrió collectstatic: desarrollo y pruebas) se usa el nombre sin hash.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for nombre in set(self.hashed_files.values()):
+            if nombre.endswith(COMPRIMIBLES):
+                comprimir(self.path(nombre))
+
+
+class EstaticosMiddleware:
+    """Sirve lo que collectstatic dejó en STATIC_ROOT, antes de sesiones y vistas.
+
+    Los nombres con hash del manifest van con caché inmutable de un año; el
+    resto se revalida con If-Modified-Since. Si el cliente acepta br o gzip y
+    existe la versión precomprimida, se envía esa. Con DEBUG no se usa:
+    runserver sirve los estáticos desde las carpetas de origen.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefijo = urlsplit(settings.STATIC_URL).path
+        self.raiz = str(settings.STATIC_ROOT)
+        self.inmutables = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefijo):
+            return self.get_response(request)
+        nombre = request.path[len(self.prefijo):]
+        try:
+            ruta = safe_join(self.raiz, nombre)
+        except SuspiciousFileOperation:
+            return self.get_response(request)
+        if not os.path.isfile(ruta):
+            return self.get_response(request)
+
+        modificado = os.stat(ruta).st_mtime
+        if not was_modified_since(request.headers.get('If-Modified-Since'), modificado):
+            return HttpResponseNotModified()
+
+        aceptadas = request.headers.get('Accept-Encoding', '')
+        servir, codificacion = ruta, None
+        for nombre_codificacion, extension in CODIFICACIONES:
+            if re.search(rf'\b{nombre_codificacion}\b', aceptadas) and os.path.isfile(ruta + extension):
+                servir, codificacion = ruta + extension, nombre_codificacion
+                break
+
+        tipo, _ = mimetypes.guess_type(ruta)
+        response = FileResponse(open(servir, 'rb'), content_type=tipo or 'application/octet-stream')
+        if codificacion:
+            response['Content-Encoding'] = codificacion
+        response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(modificado)
+        response['Cache-Control'] = CACHE_INMUTABLE if nombre in self.inmutables else CACHE_REVALIDAR
+        return response
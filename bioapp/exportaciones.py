@@ -0,0 +1,178 @@
+import csv
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Exportacion, Lote, Movimiento, MovimientoArchivado, VersionDatos
+from .reportes import CABECERA_HISTORIAL, CABECERA_UBICACIONES, filas_historial, filas_ubicaciones
+
+logger = logging.getLogger(__name__)
+
+# Un trabajo que lleva más que esto sin terminar se considera abandonado
+# (p. ej. el proceso que lo generaba se reinició) y se vuelve a encolar.
+TIEMPO_MAXIMO = timedelta(minutes=30)
+FRECUENCIA_PROGRESO = 2000
+
+REPORTES = {
+    'HISTORIAL': ('historial_movimientos', CABECERA_HISTORIAL, filas_historial,
+                  lambda: Movimiento.objects.count() + MovimientoArchivado.objects.count()),
+    'UBICACIONES': ('reporte_stock_ubicaciones', CABECERA_UBICACIONES, filas_ubicaciones,
+                    lambda: Lote.objects.filter(cantidad__gt=0).count()),
+}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'EXPORTACIONES_HILOS', 2),
+                                       thread_name_prefix='exportacion')
+    return _executor
+
+
+VERSION_EDICIONES = 'exportaciones'
+
+
+def datos_editados():
+    """Registra que se editó o borró algo que sale en los reportes (ver signals.py)."""
+    if not VersionDatos.objects.filter(nombre=VERSION_EDICIONES).update(numero=F('numero') + 1):
+        VersionDatos.objects.get_or_create(nombre=VERSION_EDICIONES)
+        VersionDatos.objects.filter(nombre=VERSION_EDICIONES).update(numero=F('numero') + 1)
+
+
+def huella_datos(reporte):
+    """Resume el estado de los datos de un reporte; si no cambia, el archivo ya generado sirve.
+
+    Altas y saldos se notan en los conteos y máximos; las ediciones (un
+    producto renombrado, un movimiento corregido en el admin) en VersionDatos.
+    """
+    # Con lo archivado sumado, archivar no cambia la huella (el contenido es el mismo).
+    vivos = Movimiento.objects.aggregate(n=Count('id'), ultimo=Max('id'))
+    archivados = MovimientoArchivado.objects.aggregate(n=Count('id'), ultimo=Max('id'))
+    ultimos = [u for u in (vivos['ultimo'], archivados['ultimo']) if u is not None]
+    ediciones = VersionDatos.objects.filter(nombre=VERSION_EDICIONES).values_list('numero', flat=True).first()
+    datos = [reporte, vivos['n'] + archivados['n'], max(ultimos, default=None), ediciones or 0]
+    if reporte == 'UBICACIONES':
+        lotes = Lote.objects.filter(cantidad__gt=0).aggregate(n=Count('id'), ultimo=Max('id'), unidades=Sum('cantidad'))
+        datos += [lotes['n'], lotes['ultimo'], lotes['unidades']]
+    return hashlib.sha1(repr(datos).encode()).hexdigest()
+
+
+def solicitar_exportacion(reporte, formato, usuario):
+    """Devuelve la exportación para los datos actuales, reutilizándola o encolándola si hace falta."""
+    exportacion, creada = Exportacion.objects.get_or_create(
+        reporte=reporte, formato=formato, huella=huella_datos(reporte),
+        defaults={'solicitado_por': usuario},
+    )
+    if creada:
+        _encolar(exportacion)
+        return exportacion
+
+    archivo_perdido = exportacion.estado == 'LISTO' and not default_storage.exists(exportacion.archivo.name)
+    abandonada = (exportacion.estado in ('PENDIENTE', 'PROCESANDO')
+                  and exportacion.fecha_solicitud < timezone.now() - TIEMPO_MAXIMO)
+    if exportacion.estado == 'ERROR' or archivo_perdido or abandonada:
+        reiniciada = Exportacion.objects.filter(pk=exportacion.pk, estado=exportacion.estado).update(
+            estado='PENDIENTE', filas_procesadas=0, error='', fecha_termino=None,
+            fecha_solicitud=timezone.now(), solicitado_por=usuario,
+        )
+        exportacion.refresh_from_db()
+        if reiniciada:
+            _encolar(exportacion)
+    return exportacion
+
+
+def _encolar(exportacion):
+    if getattr(settings, 'EXPORTACIONES_EN_SEGUNDO_PLANO', True):
+        transaction.on_commit(lambda: _get_executor().submit(_generar_en_hilo, exportacion.pk))
+
+
+def _generar_en_hilo(exportacion_id):
+    close_old_connections()
+    try:
+        generar_exportacion(exportacion_id)
+    except Exception:
+        logger.exception("Falló la exportación %s", exportacion_id)
+    finally:
+        close_old_connections()
+
+
+def generar_exportacion(exportacion_id):
+    """Genera el archivo si la exportación sigue pendiente; devuelve None si otro proceso ya la tomó."""
+    if not Exportacion.objects.filter(pk=exportacion_id, estado='PENDIENTE').update(estado='PROCESANDO'):
+        return None
+    exportacion = Exportacion.objects.get(pk=exportacion_id)
+
+    prefijo, cabecera, filas, contar = REPORTES[exportacion.reporte]
+    extension = exportacion.formato.lower()
+    nombre = default_storage.get_available_name(
+        f"exportaciones/{prefijo}_{timezone.localtime():%Y%m%d_%H%M}_{exportacion.huella[:8]}.{extension}")
+    ruta = default_storage.path(nombre)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    Exportacion.objects.filter(pk=exportacion.pk).update(filas_totales=contar())
+
+    def con_progreso():
+        procesadas = 0
+        for fila in filas():
+            yield fila
+            procesadas += 1
+            if procesadas % FRECUENCIA_PROGRESO == 0:
+                Exportacion.objects.filter(pk=exportacion.pk).update(filas_procesadas=procesadas)
+        Exportacion.objects.filter(pk=exportacion.pk).update(filas_procesadas=procesadas)
+
+    try:
+        if exportacion.formato == 'XLSX':
+            _escribir_xlsx(ruta, exportacion.get_reporte_display(), cabecera, con_progreso())
+        else:
+            _escribir_csv(ruta, cabecera, con_progreso())
+    except Exception as e:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        Exportacion.objects.filter(pk=exportacion.pk).update(
+            estado='ERROR', error=str(e), fecha_termino=timezone.now())
+        raise
+
+    Exportacion.objects.filter(pk=exportacion.pk).update(
+        estado='LISTO', archivo=nombre, fecha_termino=timezone.now())
+    _limpiar_anteriores(exportacion)
+    exportacion.refresh_from_db()
+    return exportacion
+
+
+def _limpiar_anteriores(exportacion):
+    """Borra los archivos de exportaciones del mismo reporte generadas con datos ya obsoletos."""
+    obsoletas = (Exportacion.objects
+                 .filter(reporte=exportacion.reporte, formato=exportacion.formato, estado__in=['LISTO', 'ERROR'])
+                 .filter(fecha_solicitud__lt=exportacion.fecha_solicitud))
+    for anterior in obsoletas:
+        if anterior.archivo and default_storage.exists(anterior.archivo.name):
+            default_storage.delete(anterior.archivo.name)
+    obsoletas.delete()
+
+
+def _escribir_csv(ruta, cabecera, filas):
+    with open(ruta, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(cabecera)
+        writer.writerows(filas)
+
+
+def _escribir_xlsx(ruta, titulo, cabecera, filas):
+    # write_only escribe las filas a disco a medida que llegan.
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(title=titulo[:31])
+    hoja.append(cabecera)
+    for fila in filas:
+        hoja.append(fila)
+    libro.save(ruta)
@@ -1,9 +1,34 @@
 from django import forms
+from django.core.exceptions import ValidationError
 from .models import Producto, Movimiento, Lote, Lugar, Contenedor
+from .codigos import producto_por_codigo
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.forms import UserCreationForm
 from django.utils import timezone
 
+class SelectRemoto(forms.Select):
+    """Select que solo dibuja la opción elegida; el resto de las opciones las carga el navegador."""
+
+    def optgroups(self, name, value, attrs=None):
+        todas = self.choices
+        # Al redibujar un formulario inválido llegan los valores tal como se enviaron.
+        pk = todas.queryset.model._meta.pk
+        elegidos = []
+        for v in value:
+            try:
+                v = pk.to_python(v)
+            except (ValueError, ValidationError):
+                continue
+            if v is not None:
+                elegidos.append(v)
+        self.choices = [('', '')]
+        if elegidos:
+            self.choices += [todas.choice(obj) for obj in todas.queryset.filter(pk__in=elegidos)]
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = todas
+
 class ProductoForm(forms.ModelForm):
     class Meta:
         model = Producto
@@ -36,7 +61,7 @@ class MovimientoForm(forms.ModelForm):
         queryset=Producto.objects.all(),
         required=False, 
         label="Opción B: Buscar Manualmente",
-        widget=forms.Select(attrs={'class': 'form-select select2-producto'})
+        widget=SelectRemoto(attrs={'class': 'form-select select2-producto'})
     )
 
     numero_lote_entrada = forms.CharField(
@@ -63,7 +88,7 @@ class MovimientoForm(forms.ModelForm):
         queryset=Contenedor.objects.all().order_by('lugar__nombre', 'nombre'),
         required=False,
         label="2. Contenedor Específico",
-        widget=forms.Select(attrs={'class': 'form-select', 'id': 'id_contenedor_destino'})
+        widget=SelectRemoto(attrs={'class': 'form-select', 'id': 'id_contenedor_destino'})
     )
 
     class Meta:
@@ -88,15 +113,13 @@ class MovimientoForm(forms.ModelForm):
         producto = None
 
         if codigo:
-            try:
-                producto = Producto.objects.get(codigo=codigo)
-            except Producto.DoesNotExist:
-                pass 
+            producto = producto_por_codigo(codigo)
         elif manual:
             producto = manual
 
         if not producto:
             raise forms.ValidationError("❌ Debe seleccionar un producto válido.")
+        cleaned_data['producto'] = producto
 
         if tipo == 'MERMA':
             if not observacion or not observacion.strip():
@@ -171,4 +194,12 @@ class EditarEmpleadoForm(forms.ModelForm):
         fields = ['username', 'first_name', 'last_name', 'email', 'is_active']
         widgets = {
             'username': forms.TextInput(attrs={'class': 'form-control', 'readonly': 'readonly'}),
-        }
\ No newline at end of file
+        }
+class HistorialFiltroForm(forms.Form):
+    tipo = forms.ChoiceField(
+        choices=[('', 'Todos los tipos')] + list(Movimiento.TIPOS),
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
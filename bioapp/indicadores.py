@@ -0,0 +1,141 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+from .concurrente import en_paralelo
+from .models import Contenedor, Lote, ResumenDiario, alerta_de, condiciones_alerta
+from .versiones import nueva_version, version
+
+VERSION_OPERATIVO = 'operativo'
+KPIS_TIMEOUT = 60 * 60 * 24
+NIVELES_CALOR = 4
+OCUPACION_VACIA = {'lotes': 0, 'unidades': 0, 'primer_vencimiento': None, 'vencidos': 0}
+
+
+def invalidar_operativo():
+    """Cambia la versión de los KPIs operativos al confirmarse la transacción en curso.
+
+    Se hace al confirmar para que nadie cachee, con la versión nueva, datos
+    que todavía no son visibles.
+    """
+    transaction.on_commit(lambda: nueva_version(VERSION_OPERATIVO))
+
+
+def _calcular_ocupacion(hoy):
+    filas = (Lote.objects.activos().filter(contenedor__isnull=False)
+             .values('contenedor_id', 'contenedor__lugar_id')
+             .annotate(lotes=Count('id'), unidades=Sum('cantidad'), primer_vencimiento=Min('fecha_vencimiento'),
+                       vencidos=Count('id', filter=condiciones_alerta(hoy)['VENCIDO']))
+             .order_by())
+    contenedores, lugares = {}, {}
+    for fila in filas:
+        lugar_id = fila.pop('contenedor__lugar_id')
+        contenedores[fila.pop('contenedor_id')] = fila
+        lugar = lugares.setdefault(lugar_id, dict(OCUPACION_VACIA, contenedores_ocupados=0))
+        lugar['contenedores_ocupados'] += 1
+        lugar['lotes'] += fila['lotes']
+        lugar['unidades'] += fila['unidades']
+        lugar['vencidos'] += fila['vencidos']
+        if lugar['primer_vencimiento'] is None or fila['primer_vencimiento'] < lugar['primer_vencimiento']:
+            lugar['primer_vencimiento'] = fila['primer_vencimiento']
+    return {
+        'contenedores': contenedores,
+        'lugares': lugares,
+        'max_unidades': max((c['unidades'] for c in contenedores.values()), default=0),
+    }
+
+
+def mapa_ocupacion(hoy=None):
+    """Ocupación por contenedor y por lugar: lotes con stock, unidades, primer vencimiento y vencidos.
+
+    Sale de una sola consulta agrupada por contenedor, sin importar cuántos
+    haya; los lugares se suman aquí. Se cachea como los KPIs (misma versión,
+    por día: los vencidos dependen de la fecha).
+    """
+    hoy = hoy or timezone.localdate()
+    clave = f"bioapp:ocupacion:{version(VERSION_OPERATIVO)}:{hoy.isoformat()}"
+    mapa = cache.get(clave)
+    if mapa is None:
+        mapa = _calcular_ocupacion(hoy)
+        cache.set(clave, mapa, KPIS_TIMEOUT)
+    return mapa
+
+
+def nivel_calor(fraccion):
+    """0 (vacío) a NIVELES_CALOR (lleno) para colorear el mapa."""
+    if fraccion <= 0:
+        return 0
+    return min(NIVELES_CALOR, int(fraccion * NIVELES_CALOR) + 1)
+
+
+def ocupacion_lugares(lugares, mapa):
+    """Asigna `ocupacion` a cada lugar; necesitan anotado `total_contenedores`."""
+    for lugar in lugares:
+        datos = dict(mapa['lugares'].get(lugar.pk) or dict(OCUPACION_VACIA, contenedores_ocupados=0))
+        datos['porcentaje'] = (int(datos['contenedores_ocupados'] / lugar.total_contenedores * 100)
+                               if lugar.total_contenedores else 0)
+        datos['nivel'] = nivel_calor(datos['porcentaje'] / 100)
+        datos['alerta'] = alerta_de(datos['primer_vencimiento']) if datos['primer_vencimiento'] else None
+        lugar.ocupacion = datos
+    return lugares
+
+
+def ocupacion_contenedores(contenedores, mapa):
+    """Asigna `ocupacion` a cada contenedor; el nivel es relativo al contenedor con más unidades de la bodega."""
+    for contenedor in contenedores:
+        datos = dict(mapa['contenedores'].get(contenedor.pk) or OCUPACION_VACIA)
+        datos['nivel'] = nivel_calor(datos['unidades'] / mapa['max_unidades']) if mapa['max_unidades'] else 0
+        datos['alerta'] = alerta_de(datos['primer_vencimiento']) if datos['primer_vencimiento'] else None
+        contenedor.ocupacion = datos
+    return contenedores
+
+
+def _clave_kpis(hoy):
+    return f"bioapp:kpis_operativos:{version(VERSION_OPERATIVO)}:{hoy.isoformat()}"
+
+
+def _consultas_kpis(hoy):
+    """Las consultas de los KPIs; son independientes entre sí."""
+    alerta = condiciones_alerta(hoy)
+    return {
+        'lotes': lambda: Lote.objects.activos().aggregate(
+            vencidos=Count('id', filter=alerta['VENCIDO'] | alerta['HOY']),
+            por_vencer=Count('id', filter=alerta['VENCIDO'] | alerta['HOY'] | alerta['CRITICO']),
+        ),
+        'contenedores_usados': lambda: len(mapa_ocupacion(hoy)['contenedores']),
+        'total_contenedores': lambda: Contenedor.objects.count(),
+        'movimientos_hoy': lambda: ResumenDiario.objects.filter(fecha=hoy).aggregate(n=Sum('movimientos'))['n'] or 0,
+    }
+
+
+def _armar_kpis(lotes, contenedores_usados, total_contenedores, movimientos_hoy):
+    return {
+        'lotes_vencidos': lotes['vencidos'],
+        'lotes_por_vencer': lotes['por_vencer'],
+        'ocupacion': int(contenedores_usados / total_contenedores * 100) if total_contenedores else 0,
+        'movimientos_hoy': movimientos_hoy,
+    }
+
+
+def kpis_operativos():
+    """Indicadores del panel operativo, cacheados por versión y día (hasta 4 consultas si no están en caché)."""
+    hoy = timezone.localdate()
+    clave = _clave_kpis(hoy)
+    kpis = cache.get(clave)
+    if kpis is None:
+        kpis = _armar_kpis(**{nombre: consulta() for nombre, consulta in _consultas_kpis(hoy).items()})
+        cache.set(clave, kpis, KPIS_TIMEOUT)
+    return kpis
+
+
+async def akpis_operativos():
+    """Como kpis_operativos, pero las consultas corren a la vez (ver concurrente.py)."""
+    hoy = timezone.localdate()
+    clave = await sync_to_async(_clave_kpis)(hoy)
+    kpis = await cache.aget(clave)
+    if kpis is None:
+        kpis = _armar_kpis(**await en_paralelo(_consultas_kpis(hoy)))
+        await cache.aset(clave, kpis, KPIS_TIMEOUT)
+    return kpis
@@ -0,0 +1,289 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from . import metricas, resumen
+from .indicadores import invalidar_operativo
+from .models import Producto, Lote, Movimiento, MovimientoArchivado, SaldoInicial
+
+TIPOS_SALIDA = ('VENTA', 'MERMA')
+TAMANO_LOTE_ESCRITURA = 500
+
+
+class StockInsuficiente(Exception):
+    pass
+
+
+def ajustar_stock(producto_id, delta):
+    """Suma `delta` al saldo persistido del producto con un UPDATE atómico."""
+    if delta:
+        Producto.objects.filter(pk=producto_id).update(stock_actual=F('stock_actual') + delta)
+
+
+def descontar_stock(cantidades):
+    """Resta de varios productos a la vez: `cantidades` es {producto_id: cantidad}."""
+    cantidades = {pk: n for pk, n in cantidades.items() if n}
+    if not cantidades:
+        return
+    delta = Case(*[When(pk=pk, then=Value(n)) for pk, n in cantidades.items()],
+                 default=Value(0), output_field=IntegerField())
+    Producto.objects.filter(pk__in=cantidades).update(stock_actual=F('stock_actual') - delta)
+
+
+def calcular_saldos(producto_ids=None):
+    """Saldo real de cada producto según Lote (con lotes) o Movimiento y SaldoInicial (flujo rápido)."""
+    productos = Producto.objects.all()
+    if producto_ids is not None:
+        productos = productos.filter(pk__in=producto_ids)
+    saldos = {pk: 0 for pk in productos.values_list('pk', flat=True)}
+
+    por_lote = (Lote.objects.filter(producto__in=productos, producto__gestiona_lotes=True)
+                .values('producto').annotate(total=Sum('cantidad')))
+    for fila in por_lote:
+        saldos[fila['producto']] = fila['total'] or 0
+
+    por_movimiento = (Movimiento.objects.filter(producto__in=productos, producto__gestiona_lotes=False)
+                      .values('producto')
+                      .annotate(entradas=Sum('cantidad', filter=Q(tipo='ENTRADA')),
+                                salidas=Sum('cantidad', filter=Q(tipo__in=TIPOS_SALIDA))))
+    for fila in por_movimiento:
+        saldos[fila['producto']] = (fila['entradas'] or 0) - (fila['salidas'] or 0)
+    # Lo archivado (ver archivo.py) entra como saldo de apertura.
+    iniciales = (SaldoInicial.objects.filter(producto__in=productos, producto__gestiona_lotes=False)
+                 .values_list('producto_id', 'entradas', 'salidas'))
+    for producto_id, entradas, salidas in iniciales:
+        saldos[producto_id] += entradas - salidas
+
+    return saldos
+
+
+def recalcular_stock(producto_id):
+    saldo = calcular_saldos([producto_id]).get(producto_id, 0)
+    Producto.objects.filter(pk=producto_id).update(stock_actual=saldo)
+    return saldo
+
+
+def reconciliar_saldos(corregir=True):
+    """Compara el saldo persistido con el calculado. Devuelve [(producto, registrado, calculado)]."""
+    saldos = calcular_saldos()
+    diferencias = []
+    for producto in Producto.objects.only('id', 'codigo', 'nombre', 'stock_actual').order_by('pk'):
+        calculado = saldos.get(producto.pk, 0)
+        if producto.stock_actual != calculado:
+            diferencias.append((producto, producto.stock_actual, calculado))
+            if corregir:
+                Producto.objects.filter(pk=producto.pk).update(stock_actual=calculado)
+    return diferencias
+
+
+def diferencias_lotes():
+    """Lotes cuya cantidad no cuadra con sus movimientos, vivos y archivados.
+
+    Solo aplica a lotes con ENTRADA registrada (en cualquiera de las dos tablas).
+    """
+    sumas = {
+        'entradas': Sum('cantidad', filter=Q(tipo='ENTRADA')),
+        'salidas': Sum('cantidad', filter=Q(tipo__in=TIPOS_SALIDA)),
+    }
+    archivados = {fila['lote']: fila for fila in
+                  MovimientoArchivado.objects.filter(lote__isnull=False).values('lote').annotate(**sumas).order_by()}
+    lotes = (Lote.objects.annotate(
+                entradas=Sum('movimiento__cantidad', filter=Q(movimiento__tipo='ENTRADA')),
+                salidas=Sum('movimiento__cantidad', filter=Q(movimiento__tipo__in=TIPOS_SALIDA)))
+             .filter(Q(entradas__isnull=False) | Q(pk__in=MovimientoArchivado.objects.values('lote')))
+             .select_related('producto'))
+    diferencias = []
+    for lote in lotes:
+        archivado = archivados.get(lote.pk, {})
+        entradas = (lote.entradas or 0) + (archivado.get('entradas') or 0)
+        salidas = (lote.salidas or 0) + (archivado.get('salidas') or 0)
+        if not entradas:
+            continue
+        calculado = entradas - salidas
+        if lote.cantidad != calculado:
+            diferencias.append((lote, lote.cantidad, calculado))
+    return diferencias
+
+
+def dar_de_baja_vencidos(usuario, hasta=None, tamano=TAMANO_LOTE_ESCRITURA):
+    """Pasa a MERMA todo lote con stock que vence hasta `hasta` (hoy por defecto).
+
+    Todo ocurre en una transacción con los lotes bloqueados; volver a ejecutarla
+    no hace nada porque los lotes ya quedaron en cero.
+    """
+    hasta = hasta or timezone.localdate()
+    resultado = {'lotes': 0, 'unidades': 0, 'valor': 0}
+    with transaction.atomic():
+        lotes = list(Lote.objects.select_for_update()
+                     .filter(fecha_vencimiento__lt=hasta + timedelta(days=1), cantidad__gt=0)
+                     .order_by('fecha_vencimiento', 'pk')
+                     .values_list('pk', 'producto_id', 'cantidad', 'fecha_vencimiento'))
+        if not lotes:
+            return resultado
+        costos = dict(Producto.objects.filter(pk__in={l[1] for l in lotes}).values_list('pk', 'precio_costo'))
+
+        for inicio in range(0, len(lotes), tamano):
+            bloque = lotes[inicio:inicio + tamano]
+            movimientos = []
+            por_producto = defaultdict(int)
+            for lote_id, producto_id, cantidad, vencimiento in bloque:
+                precio = costos[producto_id]
+                movimientos.append(Movimiento(
+                    producto_id=producto_id, lote_id=lote_id, usuario=usuario, tipo='MERMA',
+                    cantidad=cantidad, precio_unitario_snapshot=precio, total_movimiento=cantidad * precio,
+                    observacion=f"BAJA AUTOMÁTICA POR VENCIMIENTO (Venció el {vencimiento})",
+                ))
+                por_producto[producto_id] += cantidad
+                resultado['unidades'] += cantidad
+                resultado['valor'] += cantidad * precio
+            Movimiento.objects.bulk_create(movimientos)
+            resumen.acumular(movimientos)
+            Lote.objects.filter(pk__in=[l[0] for l in bloque]).update(cantidad=0)
+            descontar_stock(por_producto)
+        resultado['lotes'] = len(lotes)
+        invalidar_operativo()
+        metricas.al_confirmar(_contar_bajas, len(lotes), resultado['unidades'])
+    return resultado
+
+
+def asignar_fifo(lotes, cantidad):
+    """Reparte `cantidad` sobre `lotes` [(lote_id, disponible)] en el orden dado.
+
+    Devuelve [(lote_id, consumido)] o lanza StockInsuficiente si no alcanza.
+    """
+    asignacion = []
+    pendiente = cantidad
+    for lote_id, disponible in lotes:
+        if pendiente == 0:
+            break
+        consumido = min(disponible, pendiente)
+        asignacion.append((lote_id, consumido))
+        pendiente -= consumido
+    if pendiente:
+        raise StockInsuficiente(cantidad - pendiente)
+    return asignacion
+
+
+def _descontar_lotes(asignacion):
+    delta = Case(*[When(pk=lote_id, then=Value(n)) for lote_id, n in asignacion],
+                 default=Value(0), output_field=IntegerField())
+    Lote.objects.filter(pk__in=[lote_id for lote_id, _ in asignacion]).update(cantidad=F('cantidad') - delta)
+
+
+def registrar_entrada(producto, cantidad, usuario, observacion="", numero_lote=None,
+                      fecha_vencimiento=None, contenedor=None):
+    with transaction.atomic():
+        lote = None
+        if producto.gestiona_lotes:
+            lote = Lote.objects.create(
+                producto=producto, cantidad=cantidad, numero_lote=numero_lote,
+                fecha_vencimiento=fecha_vencimiento, contenedor=contenedor
+            )
+        movimiento = Movimiento.objects.create(
+            producto=producto, lote=lote, usuario=usuario, tipo='ENTRADA', cantidad=cantidad,
+            precio_unitario_snapshot=producto.precio_costo, observacion=observacion
+        )
+        resumen.acumular([movimiento])
+        ajustar_stock(producto.pk, cantidad)
+        metricas.al_confirmar(metricas.MOVIMIENTOS.inc, tipo='ENTRADA')
+    return movimiento
+
+
+def registrar_salida(producto, tipo, cantidad, usuario, observacion=""):
+    """Registra una VENTA o MERMA por FIFO; lanza StockInsuficiente si no alcanza."""
+    resultado = registrar_salidas([(producto, tipo, cantidad, observacion)], usuario)[0]
+    if isinstance(resultado, StockInsuficiente):
+        raise resultado
+    return resultado
+
+
+def registrar_salidas(lineas, usuario):
+    """Registra varias VENTA/MERMA [(producto, tipo, cantidad, observacion)] en una transacción.
+
+    Los lotes candidatos de todos los productos (y los productos sin lotes) se
+    bloquean con una consulta cada uno, el reparto FIFO (vencimiento más
+    próximo primero) se calcula en memoria y lotes, movimientos y saldos se
+    escriben en bloque, así dos ventas simultáneas no pueden sobrevender y el
+    costo en consultas no depende de cuántas líneas o lotes haya.
+
+    Devuelve, por línea, la lista de movimientos creados o la excepción
+    StockInsuficiente (con el disponible) si esa línea no alcanzó.
+    """
+    resultados = []
+    with transaction.atomic():
+        con_lotes = {producto.pk for producto, *_ in lineas if producto.gestiona_lotes}
+        sin_lotes = {producto.pk for producto, *_ in lineas if not producto.gestiona_lotes}
+
+        disponibles = defaultdict(list)
+        if con_lotes:
+            candidatos = (Lote.objects.select_for_update()
+                          .filter(producto_id__in=con_lotes, cantidad__gt=0)
+                          .order_by('producto_id', 'fecha_vencimiento', 'pk')
+                          .values_list('pk', 'producto_id', 'cantidad'))
+            for lote_id, producto_id, cantidad in candidatos:
+                disponibles[producto_id].append([lote_id, cantidad])
+        saldos = {}
+        if sin_lotes:
+            saldos = dict(Producto.objects.select_for_update().filter(pk__in=sin_lotes)
+                          .order_by('pk').values_list('pk', 'stock_actual'))
+
+        consumo_lotes = defaultdict(int)
+        consumo_productos = defaultdict(int)
+        movimientos = []
+        lotes_por_linea = []
+        for producto, tipo, cantidad, observacion in lineas:
+            if producto.gestiona_lotes:
+                lotes = disponibles[producto.pk]
+                try:
+                    asignacion = asignar_fifo([(lote_id, n) for lote_id, n in lotes if n], cantidad)
+                except StockInsuficiente as e:
+                    resultados.append(e)
+                    continue
+                restante = dict(asignacion)
+                for lote in lotes:
+                    lote[1] -= restante.get(lote[0], 0)
+                for lote_id, n in asignacion:
+                    consumo_lotes[lote_id] += n
+                lotes_por_linea.append((tipo, len(asignacion)))
+            else:
+                if saldos[producto.pk] < cantidad:
+                    resultados.append(StockInsuficiente(saldos[producto.pk]))
+                    continue
+                saldos[producto.pk] -= cantidad
+                asignacion = [(None, cantidad)]
+
+            precio = producto.precio_venta if tipo == 'VENTA' else producto.precio_costo
+            nuevos = [
+                Movimiento(producto=producto, lote_id=lote_id, usuario=usuario, tipo=tipo, cantidad=n,
+                           precio_unitario_snapshot=precio, total_movimiento=n * precio, observacion=observacion)
+                for lote_id, n in asignacion
+            ]
+            movimientos.extend(nuevos)
+            resultados.append(nuevos)
+            consumo_productos[producto.pk] += cantidad
+
+        if consumo_lotes:
+            _descontar_lotes(consumo_lotes.items())
+        if movimientos:
+            Movimiento.objects.bulk_create(movimientos)
+            resumen.acumular(movimientos)
+            invalidar_operativo()
+            metricas.al_confirmar(_contar_salidas, [m.tipo for m in movimientos], lotes_por_linea)
+        descontar_stock(consumo_productos)
+    return resultados
+
+
+def _contar_salidas(tipos, lotes_por_linea):
+    for tipo in tipos:
+        metricas.MOVIMIENTOS.inc(tipo=tipo)
+    for tipo, lotes in lotes_por_linea:
+        metricas.LOTES_POR_SALIDA.observar(lotes, tipo=tipo)
+
+
+def _contar_bajas(lotes, unidades):
+    metricas.MOVIMIENTOS.inc(lotes, tipo='MERMA')
+    metricas.LOTES_DADOS_DE_BAJA.inc(lotes)
+    metricas.UNIDADES_DADAS_DE_BAJA.inc(unidades)
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bioapp.archivo import TAMANO_LOTE_ARCHIVO, archivar, horizonte
+
+
+class Command(BaseCommand):
+    help = ("Pasa los movimientos anteriores al horizonte (settings.ARCHIVO_DIAS) a MovimientoArchivado "
+            "y acumula su saldo en SaldoInicial.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help="Conservar solo los últimos N días (reemplaza ARCHIVO_DIAS).")
+        parser.add_argument('--hasta', help="Archivar lo anterior a este día AAAA-MM-DD.")
+        parser.add_argument('--tamano', type=int, default=TAMANO_LOTE_ARCHIVO, help="Movimientos por transacción.")
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['hasta']:
+            raise CommandError("Use --dias o --hasta, no ambos.")
+        if options['hasta']:
+            try:
+                hasta = date.fromisoformat(options['hasta'])
+            except ValueError:
+                raise CommandError("--hasta debe tener el formato AAAA-MM-DD.")
+        elif options['dias'] is not None:
+            if options['dias'] < 1:
+                raise CommandError("--dias debe ser mayor que cero.")
+            hasta = timezone.localdate() - timedelta(days=options['dias'])
+        else:
+            hasta = horizonte()
+        archivados = archivar(hasta, options['tamano'])
+        self.stdout.write(self.style.SUCCESS(f"Movimientos archivados (anteriores al {hasta}): {archivados}"))
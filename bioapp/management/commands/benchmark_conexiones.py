@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+from bioapp.management.commands.benchmark_vistas import percentil
+
+# Lo que una solicitud corta (p. ej. registrar_movimiento por escáner) hace con
+# la base además de sus consultas: abrir la conexión, usarla y cerrarla.
+CONSULTA = "SELECT id FROM bioapp_producto WHERE codigo = %s"
+
+
+class Command(BaseCommand):
+    help = ("Mide el costo por solicitud de abrir, usar y cerrar la conexión MySQL con y sin el pool "
+            "(bioapp.backends.mysql_pool). Requiere una base MySQL/MariaDB, p. ej. BIOFRESCO_DB_HOST.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--hilos', type=int, default=4, help="Solicitudes simultáneas.")
+        parser.add_argument('--ciclos', type=int, default=200, help="Solicitudes por hilo y modo.")
+        parser.add_argument('--tamano', type=int, help="Tamaño del pool; por defecto el de settings o --hilos.")
+        parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado.")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if connections[alias].vendor != 'mysql':
+            raise CommandError(f"La base '{alias}' no es MySQL/MariaDB; el pool solo aplica a ese backend.")
+        if options['hilos'] < 1 or options['ciclos'] < 1:
+            raise CommandError("--hilos y --ciclos deben ser mayores que cero.")
+        configuracion = connections.settings[alias]
+        pool = dict(configuracion.get('POOL') or {})
+        tamano = options['tamano'] or pool.get('TAMANO') or options['hilos']
+        modos = {
+            'sin_pool': {},
+            'con_pool': {**pool, 'TAMANO': tamano},
+        }
+
+        informe = {'hilos': options['hilos'], 'ciclos': options['ciclos'], 'tamano_pool': tamano, 'modos': {}}
+        for modo, opciones in modos.items():
+            ajustes = {**configuracion, 'ENGINE': 'bioapp.backends.mysql_pool', 'POOL': opciones, 'CONN_MAX_AGE': 0}
+            latencias, segundos, estado = self._medir(ajustes, f"{alias}_benchmark", options['hilos'],
+                                                      options['ciclos'])
+            latencias.sort()
+            informe['modos'][modo] = {
+                'p50_ms': round(percentil(latencias, 50), 3),
+                'p95_ms': round(percentil(latencias, 95), 3),
+                'max_ms': round(latencias[-1], 3),
+                'solicitudes_por_segundo': round(len(latencias) / segundos, 1),
+                'pool': estado,
+            }
+
+        sin, con = informe['modos']['sin_pool'], informe['modos']['con_pool']
+        informe['mejora_p50'] = round(sin['p50_ms'] / con['p50_ms'], 2) if con['p50_ms'] else None
+        for modo, r in informe['modos'].items():
+            self.stdout.write(f"{modo:<9} p50={r['p50_ms']:8.3f}ms p95={r['p95_ms']:8.3f}ms "
+                              f"{r['solicitudes_por_segundo']:9.1f} sol/s")
+        self.stdout.write(f"Mejora p50 con pool: x{informe['mejora_p50']}")
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                json.dump(informe, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Informe guardado en {options['salida']}."))
+
+    def _medir(self, ajustes, alias, hilos, ciclos):
+        backend = load_backend(ajustes['ENGINE'])
+        latencias, errores = [], []
+        bloqueo = threading.Lock()
+
+        def trabajar(numero):
+            # Un wrapper por hilo, como hace Django; con pool comparten las conexiones.
+            conexion = backend.DatabaseWrapper(dict(ajustes), alias)
+            propias = []
+            try:
+                for ciclo in range(ciclos):
+                    inicio = time.perf_counter()
+                    with conexion.cursor() as cursor:
+                        cursor.execute(CONSULTA, [f"{numero}-{ciclo}"])
+                        cursor.fetchall()
+                    conexion.close()
+                    propias.append((time.perf_counter() - inicio) * 1000)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                conexion.close()
+            with bloqueo:
+                latencias.extend(propias)
+
+        inicio = time.perf_counter()
+        trabajadores = [threading.Thread(target=trabajar, args=(n,)) for n in range(hilos)]
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        segundos = time.perf_counter() - inicio
+
+        estado = None
+        if ajustes['POOL']:
+            pool = backend.DatabaseWrapper(dict(ajustes), alias)._pool()
+            if pool is not None:
+                estado = pool.estado()
+                pool.vaciar()
+        if errores:
+            raise CommandError(f"Falló la medición: {errores[0]}")
+        return latencias, segundos, estado
@@ -0,0 +1,106 @@
+import os
+import resource
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from bioapp.models import Producto, Lote, Movimiento, Lugar, Contenedor
+from bioapp.views import exportar_historial_csv, exportar_ubicaciones_csv
+
+
+def _rss_actual():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _MonitorRSS(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.inicial = self.pico = _rss_actual()
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(0.01):
+            self.pico = max(self.pico, _rss_actual())
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+        self.pico = max(self.pico, _rss_actual())
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide tiempo y RSS máximo de las exportaciones CSV con N movimientos sintéticos (se revierten al final)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', nargs='+', type=int, default=[100_000, 1_000_000],
+                            help="Cantidades de movimientos a medir (acumulativas).")
+        parser.add_argument('--productos', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(sorted(options['filas']), options['productos'])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Datos sintéticos revertidos.")
+
+    def _ejecutar(self, tamanos, n_productos):
+        usuario = User.objects.create(username='benchmark_exportaciones', is_superuser=True, is_staff=True)
+        lugar = Lugar.objects.create(nombre='Benchmark')
+        # MySQL no devuelve las PK en bulk_create: se releen las filas creadas.
+        Contenedor.objects.bulk_create([Contenedor(nombre=f"B{i}", lugar=lugar) for i in range(50)])
+        contenedores = list(Contenedor.objects.filter(lugar=lugar))
+        Producto.objects.bulk_create([
+            Producto(codigo=f"BENCH{i:06d}", nombre=f"Producto {i}", precio_costo=100, precio_venta=150)
+            for i in range(n_productos)])
+        productos = list(Producto.objects.filter(codigo__startswith='BENCH'))
+        hoy = timezone.localdate()
+        Lote.objects.bulk_create([
+            Lote(producto=p, numero_lote=f"L{p.pk}-{j}", cantidad=10 + j,
+                 fecha_vencimiento=hoy + timedelta(days=j * 3 - 5), contenedor=contenedores[(i + j) % 50])
+            for i, p in enumerate(productos) for j in range(4)])
+        lotes = list(Lote.objects.filter(producto__in=productos))
+
+        factory = RequestFactory()
+        creados = 0
+        for tamano in tamanos:
+            while creados < tamano:
+                lote_datos = min(5000, tamano - creados)
+                Movimiento.objects.bulk_create([
+                    Movimiento(producto_id=lotes[(creados + i) % len(lotes)].producto_id,
+                               lote=lotes[(creados + i) % len(lotes)], usuario=usuario,
+                               tipo=('ENTRADA', 'VENTA', 'MERMA')[(creados + i) % 3], cantidad=1 + i % 7,
+                               precio_unitario_snapshot=100, total_movimiento=100 * (1 + i % 7),
+                               observacion="benchmark")
+                    for i in range(lote_datos)])
+                creados += lote_datos
+
+            for nombre, vista, url in (('historial', exportar_historial_csv, '/gerencia/exportar/'),
+                                       ('ubicaciones', exportar_ubicaciones_csv, '/administracion/reporte-ubicaciones/exportar/')):
+                request = factory.get(url)
+                request.user = usuario
+                monitor = _MonitorRSS()
+                monitor.start()
+                inicio = time.perf_counter()
+                response = vista(request)
+                total_bytes = sum(len(parte) for parte in response.streaming_content)
+                segundos = time.perf_counter() - inicio
+                monitor.detener()
+                self.stdout.write(
+                    f"{nombre:<12} movimientos={tamano:>9,} tiempo={segundos:8.2f}s "
+                    f"tamaño={total_bytes / 2**20:8.1f}MB rss_pico={monitor.pico / 2**20:8.1f}MB "
+                    f"rss_extra={(monitor.pico - monitor.inicial) / 2**20:7.1f}MB")
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from bioapp.indicadores import VERSION_OPERATIVO
+from bioapp.management.commands.benchmark_vistas import percentil
+from bioapp.models import Movimiento
+from bioapp.versiones import nueva_version
+
+PANELES = [('dashboard_gerencia', {'periodo': 'mes'}), ('dashboard_operativo', {})]
+
+# (modo, cliente, consultas en paralelo)
+MODOS = [
+    ('wsgi_serie', 'wsgi', False),
+    ('asgi_serie', 'asgi', False),
+    ('asgi_paralelo', 'asgi', True),
+]
+
+
+def _resumen(latencias):
+    latencias = sorted(latencias)
+    return {'p50_ms': round(percentil(latencias, 50), 2), 'p95_ms': round(percentil(latencias, 95), 2),
+            'max_ms': round(latencias[-1], 2)}
+
+
+class Command(BaseCommand):
+    help = ("Compara la latencia de los paneles servidos por WSGI con consultas en serie contra ASGI "
+            "con las consultas independientes en paralelo. Usa los datos de la base (ver generar_datos).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help="Usuario gerente; por defecto el primer superusuario.")
+        parser.add_argument('--solicitudes', type=int, default=30, help="Solicitudes por panel y modo.")
+        parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado.")
+
+    def handle(self, *args, **options):
+        if options['solicitudes'] < 1:
+            raise CommandError("--solicitudes debe ser mayor que cero.")
+        if not Movimiento.objects.exists():
+            raise CommandError("La base no tiene movimientos; cargue datos con `manage.py generar_datos`.")
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+        else:
+            usuario = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+        if usuario is None:
+            raise CommandError("No hay usuario para navegar; indique --usuario o cree un superusuario.")
+
+        informe = {'solicitudes': options['solicitudes'], 'movimientos': Movimiento.objects.count(), 'paneles': {}}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for modo, servidor, paralelo in MODOS:
+                with override_settings(PANELES_EN_PARALELO=paralelo):
+                    if servidor == 'wsgi':
+                        resultados = self._wsgi(usuario, options['solicitudes'])
+                    else:
+                        resultados = asyncio.run(self._asgi(usuario, options['solicitudes']))
+                for panel, latencias in resultados.items():
+                    informe['paneles'].setdefault(panel, {})[modo] = _resumen(latencias)
+
+        for panel, modos in informe['paneles'].items():
+            base = modos['wsgi_serie']['p50_ms']
+            for modo, r in modos.items():
+                r['mejora_p50'] = round(base / r['p50_ms'], 2) if r['p50_ms'] else None
+                self.stdout.write(f"{panel:<22} {modo:<14} p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms "
+                                  f"x{r['mejora_p50']}")
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                json.dump(informe, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Informe guardado en {options['salida']}."))
+
+    def _wsgi(self, usuario, solicitudes):
+        cliente = Client()
+        cliente.force_login(usuario)
+        resultados = {}
+        for panel, datos in PANELES:
+            url = reverse(panel)
+            cliente.get(url, datos)
+            latencias = resultados[panel] = []
+            for _ in range(solicitudes):
+                # Sin caché de KPIs: se mide el costo de las consultas.
+                nueva_version(VERSION_OPERATIVO)
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url, datos)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code != 200:
+                    raise CommandError(f"{url} respondió {respuesta.status_code} al usuario {usuario}.")
+        return resultados
+
+    async def _asgi(self, usuario, solicitudes):
+        cliente = AsyncClient()
+        await cliente.aforce_login(usuario)
+        resultados = {}
+        for panel, datos in PANELES:
+            url = reverse(panel)
+            await cliente.get(url, datos)
+            latencias = resultados[panel] = []
+            for _ in range(solicitudes):
+                nueva_version(VERSION_OPERATIVO)
+                inicio = time.perf_counter()
+                respuesta = await cliente.get(url, datos)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                if respuesta.status_code != 200:
+                    raise CommandError(f"{url} respondió {respuesta.status_code} al usuario {usuario}.")
+        return resultados
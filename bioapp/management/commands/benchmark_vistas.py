@@ -0,0 +1,180 @@
+import json
+import math
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from bioapp.models import Producto, Lote, Movimiento, Lugar, Contenedor
+
+# (etiqueta, nombre de la URL, parámetros GET, es exportación)
+VISTAS = [
+    ('dashboard_gerencia', 'dashboard_gerencia', {}, False),
+    ('dashboard_gerencia_mes', 'dashboard_gerencia', {'periodo': 'mes'}, False),
+    ('tendencia', 'tendencia_movimientos', {'dias': 30}, False),
+    ('historial', 'historial_movimientos', {}, False),
+    ('historial_ventas', 'historial_movimientos', {'tipo': 'VENTA'}, False),
+    ('historial_busqueda', 'historial_movimientos', {'buscar': 'manzana'}, False),
+    ('dashboard_operativo', 'dashboard_operativo', {}, False),
+    ('catalogo', 'catalogo', {}, False),
+    ('catalogo_busqueda', 'catalogo', {'buscar': 'palta'}, False),
+    ('reporte_ubicaciones', 'reporte_ubicaciones', {}, False),
+    ('mapa', 'gestion_bodega', {}, False),
+    ('registrar_movimiento', 'registrar_movimiento', {}, False),
+    ('contenedores_por_lugar', 'contenedores_por_lugar', {}, False),
+    ('autocompletar', 'autocompletar', {'q': 'man'}, False),
+    ('exportar_historial', 'exportar_historial', {}, True),
+    ('exportar_ubicaciones', 'exportar_ubicaciones', {}, True),
+]
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por rango más cercano; valores ya ordenados."""
+    if not valores:
+        return None
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+class _Contador:
+    """execute_wrapper que cuenta consultas; en_paralelo lo lleva a los hilos de los paneles."""
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.total += 1
+        return execute(sql, params, many, context)
+
+
+def _pedir(cliente, url, datos):
+    contador = _Contador()
+    with connection.execute_wrapper(contador):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(url, datos)
+        if respuesta.streaming:
+            for _ in respuesta.streaming_content:
+                pass
+        segundos = time.perf_counter() - inicio
+    return respuesta.status_code, segundos, contador.total
+
+
+def _medir(usuario, url, datos, solicitudes, hilos):
+    """Hace `solicitudes` GET a `url` repartidos en `hilos` hilos, cada uno con su cliente y su conexión."""
+    pendientes = queue.Queue()
+    for _ in range(solicitudes):
+        pendientes.put(None)
+    resultados = []
+    bloqueo = threading.Lock()
+
+    def trabajar():
+        cliente = Client()
+        cliente.force_login(usuario)
+        try:
+            while True:
+                try:
+                    pendientes.get_nowait()
+                except queue.Empty:
+                    return
+                resultado = _pedir(cliente, url, datos)
+                with bloqueo:
+                    resultados.append(resultado)
+        finally:
+            connection.close()
+
+    trabajadores = [threading.Thread(target=trabajar) for _ in range(min(hilos, solicitudes))]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    total = time.perf_counter() - inicio
+
+    latencias = sorted(segundos * 1000 for _, segundos, _ in resultados)
+    consultas = sorted(n for _, _, n in resultados)
+    return {
+        'url': url + ('?' + '&'.join(f"{k}={v}" for k, v in datos.items()) if datos else ''),
+        'solicitudes': len(resultados),
+        'errores': sum(1 for estado, _, _ in resultados if estado >= 400),
+        'p50_ms': round(percentil(latencias, 50), 2),
+        'p95_ms': round(percentil(latencias, 95), 2),
+        'max_ms': round(latencias[-1], 2),
+        'por_segundo': round(len(resultados) / total, 2),
+        'consultas_p50': percentil(consultas, 50),
+        'consultas_max': consultas[-1],
+    }
+
+
+class Command(BaseCommand):
+    help = ("Mide latencia p50/p95, solicitudes por segundo y consultas de las vistas principales y "
+            "exportaciones con varios hilos concurrentes; deja el resultado en un JSON comparable.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help="Usuario con el que se navega; por defecto el primer superusuario.")
+        parser.add_argument('--hilos', type=int, default=4)
+        parser.add_argument('--solicitudes', type=int, default=40, help="Solicitudes por vista.")
+        parser.add_argument('--solicitudes-exportacion', type=int, default=4)
+        parser.add_argument('--vistas', nargs='+', choices=[v[0] for v in VISTAS], help="Solo estas vistas.")
+        parser.add_argument('--etiqueta', default='', help="Texto libre para el informe, p. ej. el commit.")
+        parser.add_argument('--salida', default='benchmark_vistas.json')
+        parser.add_argument('--comparar', help="Informe JSON anterior contra el que comparar p95 y consultas.")
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1 or options['solicitudes'] < 1 or options['solicitudes_exportacion'] < 1:
+            raise CommandError("--hilos y las cantidades de solicitudes deben ser mayores que cero.")
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+        else:
+            usuario = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+        if usuario is None:
+            raise CommandError("No hay usuario para navegar; indique --usuario o cree un superusuario.")
+        anterior = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as f:
+                anterior = json.load(f)
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'etiqueta': options['etiqueta'],
+            'base_de_datos': connection.vendor,
+            'hilos': options['hilos'],
+            'datos': {modelo.__name__.lower(): modelo.objects.count()
+                      for modelo in (Producto, Lote, Movimiento, Lugar, Contenedor)},
+            'vistas': {},
+        }
+        seleccion = [v for v in VISTAS if not options['vistas'] or v[0] in options['vistas']]
+        # El cliente de pruebas usa el host "testserver".
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            calentamiento = Client()
+            calentamiento.force_login(usuario)
+            inicio = time.perf_counter()
+            for etiqueta, nombre, datos, exportacion in seleccion:
+                url = reverse(nombre)
+                _pedir(calentamiento, url, datos)
+                solicitudes = options['solicitudes_exportacion' if exportacion else 'solicitudes']
+                resultado = _medir(usuario, url, datos, solicitudes, options['hilos'])
+                informe['vistas'][etiqueta] = resultado
+                self.stdout.write(self._linea(etiqueta, resultado, (anterior or {}).get('vistas', {}).get(etiqueta)))
+            informe['segundos'] = round(time.perf_counter() - inicio, 2)
+
+        with open(options['salida'], 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Informe guardado en {options['salida']} ({informe['segundos']}s)."))
+
+    def _linea(self, etiqueta, r, anterior):
+        linea = (f"{etiqueta:<24} p50={r['p50_ms']:9.2f}ms p95={r['p95_ms']:9.2f}ms "
+                 f"rps={r['por_segundo']:8.2f} consultas={r['consultas_max']:>3} errores={r['errores']}")
+        if anterior:
+            cambio = (r['p95_ms'] - anterior['p95_ms']) / anterior['p95_ms'] * 100 if anterior['p95_ms'] else 0
+            linea += f"  | p95 {cambio:+.0f}% consultas {r['consultas_max'] - anterior['consultas_max']:+d}"
+            if cambio > 20 or r['consultas_max'] > anterior['consultas_max']:
+                return self.style.WARNING(linea)
+        return linea
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bioapp.models import Producto, Lugar
+from bioapp.sinteticos import generar, limpiar
+
+
+class Command(BaseCommand):
+    help = ("Genera un set de datos sintético del tamaño de producción: productos con popularidad "
+            "tipo Zipf, lugares, contenedores, lotes con vencimientos y movimientos consumidos por FIFO.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=500)
+        parser.add_argument('--lugares', type=int, default=5)
+        parser.add_argument('--contenedores', type=int, default=60, help="Total, repartidos entre los lugares.")
+        parser.add_argument('--movimientos', type=int, default=100_000)
+        parser.add_argument('--dias', type=int, default=180, help="Días de historia hacia atrás desde hoy.")
+        parser.add_argument('--semilla', type=int, default=1, help="Misma semilla, mismos datos.")
+        parser.add_argument('--prefijo', default='SIN', help="Prefijo de códigos de producto y nombres de lugar.")
+        parser.add_argument('--limpiar', action='store_true', help="Borra antes lo generado con el mismo prefijo.")
+
+    def handle(self, *args, **options):
+        prefijo = options['prefijo']
+        if min(options['productos'], options['lugares'], options['contenedores'], options['dias']) < 1:
+            raise CommandError("--productos, --lugares, --contenedores y --dias deben ser mayores que cero.")
+        if options['limpiar']:
+            self.stdout.write(f"Productos anteriores borrados: {limpiar(prefijo)}")
+        elif (Producto.objects.filter(codigo__startswith=prefijo).exists()
+              or Lugar.objects.filter(nombre__startswith=f"{prefijo} ").exists()):
+            raise CommandError(f"Ya hay datos con el prefijo {prefijo!r}; use --limpiar u otro --prefijo.")
+
+        inicio = time.perf_counter()
+        creados = generar(productos=options['productos'], lugares=options['lugares'],
+                          contenedores=options['contenedores'], movimientos=options['movimientos'],
+                          dias=options['dias'], semilla=options['semilla'], prefijo=prefijo)
+        detalle = ", ".join(f"{nombre}={cantidad:,}" for nombre, cantidad in creados.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos sintéticos generados en {time.perf_counter() - inicio:.1f}s: {detalle}"))
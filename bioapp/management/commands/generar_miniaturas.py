@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import F
+
+from bioapp.miniaturas import generar
+from bioapp.models import ANCHOS_MINIATURA, Producto, ruta_miniatura
+
+
+def _generar_una(producto_id):
+    try:
+        return producto_id, generar(producto_id), None
+    except Exception as e:
+        return producto_id, 0, e
+
+
+def _generar_en_hilo(producto_id):
+    close_old_connections()
+    try:
+        return _generar_una(producto_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas de las imágenes de productos que aún no las tienen (o de todas con --todas)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help="Regenera también las que ya existen.")
+        parser.add_argument('--hilos', type=int, default=4, help="Imágenes procesadas a la vez.")
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1:
+            raise CommandError("--hilos debe ser mayor que cero.")
+        productos = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        if not options['todas']:
+            productos = productos.exclude(miniatura_de=F('imagen'))
+        pendientes = list(productos.order_by('pk').values_list('pk', flat=True))
+        if not pendientes:
+            self.stdout.write("No hay imágenes pendientes.")
+            return
+
+        listas, fallidas = [], 0
+        with ThreadPoolExecutor(max_workers=options['hilos']) as pool:
+            resultados = (map(_generar_una, pendientes) if options['hilos'] == 1
+                          else pool.map(_generar_en_hilo, pendientes))
+            for producto_id, escritos, error in resultados:
+                if error is not None:
+                    fallidas += 1
+                    self.stderr.write(f"Producto #{producto_id}: {error}")
+                elif escritos:
+                    listas.append(producto_id)
+
+        originales = miniaturas = 0
+        ancho = ANCHOS_MINIATURA[1]
+        for imagen in Producto.objects.filter(pk__in=listas).values_list('imagen', flat=True):
+            originales += default_storage.size(imagen)
+            miniaturas += default_storage.size(ruta_miniatura(imagen, ancho, 'webp'))
+        self.stdout.write(self.style.SUCCESS(f"Miniaturas generadas para {len(listas)} productos ({fallidas} con error)."))
+        if miniaturas:
+            self.stdout.write(f"Originales: {originales / 1024:.0f} KB; miniaturas {ancho}px WebP: "
+                              f"{miniaturas / 1024:.0f} KB (x{originales / miniaturas:.0f} menos).")
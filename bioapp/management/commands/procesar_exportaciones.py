@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bioapp.exportaciones import generar_exportacion
+from bioapp.models import Exportacion
+
+
+class Command(BaseCommand):
+    help = "Genera las exportaciones pendientes (worker para EXPORTACIONES_EN_SEGUNDO_PLANO = False)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help="Sigue esperando nuevas solicitudes.")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos entre revisiones en modo continuo.")
+
+    def handle(self, *args, **options):
+        while True:
+            pendientes = list(Exportacion.objects.filter(estado='PENDIENTE')
+                              .order_by('fecha_solicitud').values_list('pk', flat=True))
+            for pk in pendientes:
+                try:
+                    exportacion = generar_exportacion(pk)
+                except Exception as e:
+                    self.stderr.write(f"Exportación #{pk} falló: {e}")
+                    continue
+                if exportacion:
+                    self.stdout.write(f"Exportación #{pk} lista: {exportacion.archivo.name} "
+                                      f"({exportacion.filas_procesadas} filas)")
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from bioapp.inventario import dar_de_baja_vencidos
+
+
+class Command(BaseCommand):
+    help = "Da de baja como MERMA los lotes vencidos (pensado para el cron nocturno). Se puede re-ejecutar sin efecto."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help="Usuario al que se atribuyen las mermas (por defecto, el primer superusuario activo).")
+
+    def handle(self, *args, **options):
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+        else:
+            usuario = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+            if usuario is None:
+                raise CommandError("No hay superusuario activo; indique --usuario.")
+
+        resultado = dar_de_baja_vencidos(usuario)
+        if not resultado['lotes']:
+            self.stdout.write("No hay lotes vencidos pendientes de baja.")
+            return
+        self.stdout.write(self.style.WARNING(
+            f"Se dieron de baja {resultado['lotes']} lotes ({resultado['unidades']} unidades, ${resultado['valor']})."))
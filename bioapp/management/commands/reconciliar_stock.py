@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bioapp.inventario import reconciliar_saldos, diferencias_lotes
+
+
+class Command(BaseCommand):
+    help = "Reconstruye Producto.stock_actual desde Lote/Movimiento e informa las diferencias."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solo-reportar', action='store_true',
+                            help="No corrige los saldos, solo informa las diferencias.")
+
+    def handle(self, *args, **options):
+        corregir = not options['solo_reportar']
+        with transaction.atomic():
+            diferencias = reconciliar_saldos(corregir=corregir)
+
+        for producto, registrado, calculado in diferencias:
+            self.stdout.write(f"{producto.codigo} {producto.nombre}: registrado {registrado}, "
+                              f"calculado {calculado} (diferencia {registrado - calculado})")
+
+        for lote, registrado, calculado in diferencias_lotes():
+            self.stdout.write(self.style.WARNING(
+                f"Lote #{lote.pk} ({lote.numero_lote}) de {lote.producto.codigo}: "
+                f"cantidad {registrado}, según movimientos {calculado}"))
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("Saldos de stock cuadrados."))
+        elif corregir:
+            self.stdout.write(self.style.SUCCESS(f"{len(diferencias)} saldos corregidos."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(diferencias)} saldos con diferencias."))
@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bioapp.resumen import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el resumen diario de movimientos (ResumenDiario) desde el historial."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Día inicial AAAA-MM-DD; por defecto se rehace todo.")
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError("--desde debe tener el formato AAAA-MM-DD.")
+        filas = reconstruir(desde)
+        self.stdout.write(self.style.SUCCESS(f"Resumen diario reconstruido: {filas} filas."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bioapp.busqueda import reindexar_todo
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda (productos, lotes, contenedores y lugares)."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = reindexar_todo()
+        self.stdout.write(self.style.SUCCESS(f"Índice reconstruido: {total} términos."))
@@ -0,0 +1,229 @@
+"""Métricas del proceso en formato de texto de Prometheus (ver la vista `metricas`).
+
+Los valores viven en memoria de cada proceso: con varios workers cada uno
+expone los suyos y el scraper los suma.
+"""
+import threading
+import time
+from contextlib import ExitStack
+
+from django.db import connection, transaction
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+BUCKETS_LOTES = (1, 2, 3, 5, 10, 20)
+
+_REGISTRO = []
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._bloqueo = threading.Lock()
+        _REGISTRO.append(self)
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+
+    def lineas(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} {self.tipo}"
+        with self._bloqueo:
+            valores = sorted(self._valores.items())
+        for clave, valor in valores:
+            yield from self._muestras(list(zip(self.etiquetas, clave)), valor)
+
+    def limpiar(self):
+        with self._bloqueo:
+            self._valores.clear()
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._bloqueo:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def valor(self, **etiquetas):
+        return self._valores.get(self._clave(etiquetas), 0)
+
+    def _muestras(self, pares, valor):
+        yield f"{self.nombre}{_etiquetas(pares)} {_numero(valor)}"
+
+
+class Indicador(Contador):
+    tipo = 'gauge'
+
+    def fijar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._bloqueo:
+            self._valores[clave] = valor
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._bloqueo:
+            serie = self._valores.get(clave)
+            if serie is None:
+                # [conteo por bucket (no acumulado), suma, total]
+                serie = self._valores[clave] = [[0] * len(self.buckets), 0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def total(self, **etiquetas):
+        serie = self._valores.get(self._clave(etiquetas))
+        return serie[2] if serie else 0
+
+    def _muestras(self, pares, serie):
+        acumulado = 0
+        for limite, cantidad in zip(self.buckets, serie[0]):
+            acumulado += cantidad
+            yield f"{self.nombre}_bucket{_etiquetas(pares + [('le', _numero(limite))])} {acumulado}"
+        yield f"{self.nombre}_bucket{_etiquetas(pares + [('le', '+Inf')])} {serie[2]}"
+        yield f"{self.nombre}_sum{_etiquetas(pares)} {_numero(serie[1])}"
+        yield f"{self.nombre}_count{_etiquetas(pares)} {serie[2]}"
+
+
+def exponer():
+    """Todas las métricas en el formato de texto 0.0.4 de Prometheus."""
+    return '\n'.join(linea for metrica in _REGISTRO for linea in metrica.lineas()) + '\n'
+
+
+SOLICITUDES = Contador('bioapp_http_solicitudes_total', "Solicitudes HTTP atendidas.",
+                       ('vista', 'metodo', 'estado'))
+DURACION = Histograma('bioapp_http_duracion_segundos', "Tiempo de respuesta por vista.", ('vista', 'metodo'))
+CONSULTAS_SQL = Histograma('bioapp_http_consultas_sql', "Consultas SQL por solicitud.", ('vista',),
+                           BUCKETS_CONSULTAS)
+TIEMPO_SQL = Histograma('bioapp_http_sql_segundos', "Tiempo en SQL por solicitud.", ('vista',))
+TAMANO_RESPUESTA = Histograma('bioapp_http_respuesta_bytes', "Tamaño del cuerpo de la respuesta.", ('vista',),
+                              BUCKETS_BYTES)
+
+MOVIMIENTOS = Contador('bioapp_movimientos_total', "Movimientos registrados.", ('tipo',))
+LOTES_POR_SALIDA = Histograma('bioapp_lotes_por_salida', "Lotes FIFO tocados por cada línea de venta o merma.",
+                              ('tipo',), BUCKETS_LOTES)
+LOTES_DADOS_DE_BAJA = Contador('bioapp_lotes_dados_de_baja_total', "Lotes vencidos pasados a merma.")
+UNIDADES_DADAS_DE_BAJA = Contador('bioapp_unidades_dadas_de_baja_total', "Unidades vencidas pasadas a merma.")
+
+POOL_CONEXIONES = Indicador('bioapp_db_pool_conexiones', "Conexiones a la base abiertas por el pool.",
+                            ('alias', 'estado'))
+POOL_EVENTOS = Contador('bioapp_db_pool_eventos_total',
+                        "Conexiones creadas, reutilizadas o descartadas y esperas agotadas.", ('alias', 'evento'))
+POOL_ESPERA = Histograma('bioapp_db_pool_espera_segundos', "Tiempo esperando una conexión del pool.", ('alias',))
+
+
+def al_confirmar(funcion, *args, **kwargs):
+    """Registra la métrica solo si la transacción en curso se confirma."""
+    transaction.on_commit(lambda: funcion(*args, **kwargs))
+
+
+class _MedidorSQL:
+    # concurrente.en_paralelo lo instala también en las conexiones de sus hilos:
+    # las consultas de un panel se suman aunque no corran en la de la solicitud,
+    # y los segundos son tiempo SQL total (puede superar la duración de la solicitud).
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+        self._bloqueo = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            transcurrido = time.perf_counter() - inicio
+            with self._bloqueo:
+                self.segundos += transcurrido
+                self.consultas += 1
+
+
+def _nombre_vista(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return 'sin_ruta'
+    return coincidencia.view_name or 'sin_nombre'
+
+
+class MetricasMiddleware:
+    """Mide latencia, consultas y tiempo SQL y tamaño de respuesta, por nombre de URL.
+
+    En las respuestas en streaming (exportaciones) la medición termina al
+    cerrarse la respuesta, después de enviado el último fragmento, que es
+    cuando se ejecutan sus consultas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medidor = _MedidorSQL()
+        pila = ExitStack()
+        pila.enter_context(connection.execute_wrapper(medidor))
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            pila.close()
+            raise
+        if not response.streaming:
+            pila.close()
+            self._registrar(request, response, medidor, inicio, len(response.content))
+            return response
+
+        enviados = [0]
+        # Los archivos se dejan sin envolver para que el servidor pueda usar sendfile.
+        if getattr(response, 'file_to_stream', None) is None:
+            original = response.streaming_content
+
+            def contar():
+                for parte in original:
+                    enviados[0] += len(parte)
+                    yield parte
+            response.streaming_content = contar()
+
+        def cerrar():
+            pila.close()
+            tamano = enviados[0] or int(response.headers.get('Content-Length') or 0)
+            self._registrar(request, response, medidor, inicio, tamano)
+        response._resource_closers.append(cerrar)
+        return response
+
+    def _registrar(self, request, response, medidor, inicio, tamano):
+        vista = _nombre_vista(request)
+        DURACION.observar(time.perf_counter() - inicio, vista=vista, metodo=request.method)
+        SOLICITUDES.inc(vista=vista, metodo=request.method, estado=response.status_code)
+        CONSULTAS_SQL.observar(medidor.consultas, vista=vista)
+        TIEMPO_SQL.observar(medidor.segundos, vista=vista)
+        TAMANO_RESPUESTA.observar(tamano, vista=vista)
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def calcular_stock_inicial(apps, schema_editor):
+    Producto = apps.get_model('bioapp', 'Producto')
+    Lote = apps.get_model('bioapp', 'Lote')
+    Movimiento = apps.get_model('bioapp', 'Movimiento')
+
+    por_lote = (Lote.objects.filter(producto__gestiona_lotes=True)
+                .values('producto').annotate(total=Sum('cantidad')))
+    for fila in por_lote:
+        Producto.objects.filter(pk=fila['producto']).update(stock_actual=fila['total'] or 0)
+
+    por_movimiento = (Movimiento.objects.filter(producto__gestiona_lotes=False)
+                      .values('producto')
+                      .annotate(entradas=Sum('cantidad', filter=Q(tipo='ENTRADA')),
+                                salidas=Sum('cantidad', filter=Q(tipo__in=['VENTA', 'MERMA']))))
+    for fila in por_movimiento:
+        saldo = (fila['entradas'] or 0) - (fila['salidas'] or 0)
+        Producto.objects.filter(pk=fila['producto']).update(stock_actual=saldo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0002_crear_roles_iniciales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_actual',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Stock Actual'),
+        ),
+        migrations.RunPython(calcular_stock_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0003_producto_stock_actual'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha', 'id'], name='movimiento_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['tipo', 'fecha', 'id'], name='movimiento_tipo_fecha_idx'),
+        ),
+    ]
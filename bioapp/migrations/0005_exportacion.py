@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0004_movimiento_indices_historial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Exportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reporte', models.CharField(choices=[('HISTORIAL', 'Historial de Movimientos'), ('UBICACIONES', 'Stock y Ubicaciones')], max_length=20)),
+                ('formato', models.CharField(choices=[('CSV', 'CSV'), ('XLSX', 'Excel (XLSX)')], default='CSV', max_length=4)),
+                ('huella', models.CharField(max_length=40, verbose_name='Huella de los datos')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', max_length=10)),
+                ('filas_totales', models.PositiveIntegerField(default=0)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('archivo', models.FileField(blank=True, upload_to='exportaciones/')),
+                ('error', models.TextField(blank=True)),
+                ('fecha_solicitud', models.DateTimeField(auto_now_add=True)),
+                ('fecha_termino', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('reporte', 'formato', 'huella'), name='exportacion_unica')],
+            },
+        ),
+    ]
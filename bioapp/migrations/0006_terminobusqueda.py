@@ -0,0 +1,69 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+MODELOS = {'PRODUCTO': 'Producto', 'LOTE': 'Lote', 'CONTENEDOR': 'Contenedor', 'LUGAR': 'Lugar'}
+
+# Copia de bioapp/busqueda.py tal como estaba al crear el índice; la migración
+# no debe cambiar si cambia el código de la app (reindexar_busqueda lo rehace).
+LARGO_TERMINO = 50
+_SEPARADORES = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return texto.lower().strip()
+
+
+def terminos(*textos, codigos=()):
+    resultado = set()
+    for texto in textos:
+        resultado.update(_SEPARADORES.split(normalizar(texto)))
+    for codigo in codigos:
+        partes = _SEPARADORES.split(normalizar(codigo))
+        resultado.update(partes)
+        resultado.add(''.join(partes))
+    return {t[:LARGO_TERMINO] for t in resultado if t}
+
+
+def terminos_de(tipo, objeto):
+    if tipo == 'PRODUCTO':
+        return terminos(objeto.nombre, codigos=[objeto.codigo])
+    if tipo == 'LOTE':
+        return terminos(codigos=[objeto.numero_lote])
+    return terminos(objeto.nombre)
+
+
+def indexar_existentes(apps, schema_editor):
+    TerminoBusqueda = apps.get_model('bioapp', 'TerminoBusqueda')
+    for tipo, nombre in MODELOS.items():
+        filas = [
+            TerminoBusqueda(tipo=tipo, objeto_id=objeto.pk, termino=termino)
+            for objeto in apps.get_model('bioapp', nombre).objects.all()
+            for termino in terminos_de(tipo, objeto)
+        ]
+        TerminoBusqueda.objects.bulk_create(filas, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0005_exportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('PRODUCTO', 'Producto'), ('LOTE', 'Lote'), ('CONTENEDOR', 'Contenedor'), ('LUGAR', 'Lugar')], max_length=10)),
+                ('objeto_id', models.BigIntegerField()),
+                ('termino', models.CharField(max_length=50)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo', 'termino', 'objeto_id'], name='busqueda_termino_idx'), models.Index(fields=['tipo', 'objeto_id'], name='busqueda_objeto_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def resumir_historial(apps, schema_editor):
+    Movimiento = apps.get_model('bioapp', 'Movimiento')
+    ResumenDiario = apps.get_model('bioapp', 'ResumenDiario')
+    grupos = defaultdict(lambda: [0, 0, 0])
+    filas = Movimiento.objects.values_list('fecha', 'producto_id', 'tipo', 'cantidad', 'total_movimiento')
+    for fecha, producto_id, tipo, cantidad, total in filas.iterator(chunk_size=2000):
+        grupo = grupos[(timezone.localdate(fecha), producto_id, tipo)]
+        grupo[0] += cantidad
+        grupo[1] += total
+        grupo[2] += 1
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(fecha=fecha, producto_id=producto_id, tipo=tipo, cantidad=c, valor=v, movimientos=n)
+         for (fecha, producto_id, tipo), (c, v, n) in grupos.items()],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0006_terminobusqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada de Stock'), ('VENTA', 'Venta (Salida)'), ('MERMA', 'Merma (Pérdida)')], max_length=20)),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('valor', models.BigIntegerField(default=0)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bioapp.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo', 'fecha'], name='resumen_tipo_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'tipo'), name='resumen_diario_unico')],
+            },
+        ),
+        migrations.RunPython(resumir_historial, migrations.RunPython.noop),
+    ]
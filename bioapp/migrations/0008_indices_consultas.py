@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0007_resumendiario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['producto', 'fecha_vencimiento', 'cantidad'], name='lote_producto_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['cantidad', 'fecha_vencimiento'], name='lote_cantidad_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lote',
+            index=models.Index(fields=['contenedor', 'fecha_vencimiento'], name='lote_contenedor_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['producto', 'tipo', 'fecha'], name='movimiento_producto_tipo_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0008_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoInicial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entradas', models.BigIntegerField(default=0)),
+                ('salidas', models.BigIntegerField(default=0)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('archivado_hasta', models.DateTimeField(blank=True, null=True)),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='saldo_inicial', to='bioapp.producto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovimientoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada de Stock'), ('VENTA', 'Venta (Salida)'), ('MERMA', 'Merma (Pérdida)')], max_length=20)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('fecha', models.DateTimeField()),
+                ('precio_unitario_snapshot', models.IntegerField()),
+                ('total_movimiento', models.IntegerField()),
+                ('observacion', models.TextField(blank=True, null=True)),
+                ('lote', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='bioapp.lote')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='bioapp.producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'id'], name='archivado_fecha_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0009_archivo_movimientos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='miniatura_de',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+    ]
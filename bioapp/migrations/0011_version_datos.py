@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0010_miniaturas_producto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDatos',
+            fields=[
+                ('nombre', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('numero', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
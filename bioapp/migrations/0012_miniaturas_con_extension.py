@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def marcar_pendientes(apps, schema_editor):
+    # Las miniaturas cambiaron de ruta (ver ruta_miniatura); generar_miniaturas las rehace.
+    apps.get_model('bioapp', 'Producto').objects.exclude(miniatura_de='').update(miniatura_de='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bioapp', '0011_version_datos'),
+    ]
+
+    operations = [
+        migrations.RunPython(marcar_pendientes, migrations.RunPython.noop),
+    ]
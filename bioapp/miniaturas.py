@@ -0,0 +1,117 @@
+"""Miniaturas WebP/JPEG de Producto.imagen.
+
+Al guardar un producto con imagen nueva se encolan (al confirmar la
+transacción) en un pool de hilos; cuando están listas se marca
+Producto.miniatura_de y las plantillas empiezan a usarlas (ver
+Producto.miniatura). `manage.py generar_miniaturas` cubre las imágenes que
+ya existían.
+"""
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import ANCHOS_MINIATURA, FORMATOS_MINIATURA, Producto, ruta_miniatura
+
+logger = logging.getLogger(__name__)
+
+OPCIONES_FORMATO = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+FONDO_JPEG = (255, 255, 255)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'MINIATURAS_HILOS', 2),
+                                       thread_name_prefix='miniatura')
+    return _executor
+
+
+def encolar(producto_id):
+    """Genera las miniaturas del producto al confirmarse la transacción en curso."""
+    if getattr(settings, 'MINIATURAS_EN_SEGUNDO_PLANO', True):
+        transaction.on_commit(lambda: _get_executor().submit(_generar_en_hilo, producto_id))
+    else:
+        transaction.on_commit(lambda: generar(producto_id))
+
+
+def _generar_en_hilo(producto_id):
+    close_old_connections()
+    try:
+        generar(producto_id)
+    except Exception:
+        logger.exception("Fallaron las miniaturas del producto %s", producto_id)
+    finally:
+        close_old_connections()
+
+
+def _escalas(imagen):
+    """{ancho: imagen cuadrada}; se recorta al centro una vez y se reduce desde la más grande."""
+    mayor = max(ANCHOS_MINIATURA)
+    # En JPEG decodifica directo a una escala menor: mucho más rápido con fotos grandes.
+    imagen.draft('RGB', (mayor * 2, mayor * 2))
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'transparency' in imagen.info or imagen.mode in ('LA', 'PA') else 'RGB')
+    base = ImageOps.fit(imagen, (mayor, mayor), Image.Resampling.LANCZOS)
+    return {ancho: base if ancho == mayor else base.resize((ancho, ancho), Image.Resampling.LANCZOS)
+            for ancho in ANCHOS_MINIATURA}
+
+
+def _codificar(imagen, extension):
+    formato, opciones = OPCIONES_FORMATO[extension]
+    if formato == 'JPEG' and imagen.mode == 'RGBA':
+        fondo = Image.new('RGB', imagen.size, FONDO_JPEG)
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        imagen = fondo
+    salida = io.BytesIO()
+    imagen.save(salida, formato, **opciones)
+    return salida.getvalue()
+
+
+def _guardar(ruta, datos):
+    if default_storage.exists(ruta):
+        default_storage.delete(ruta)
+    default_storage.save(ruta, ContentFile(datos))
+
+
+def borrar(original):
+    for ancho in ANCHOS_MINIATURA:
+        for extension in FORMATOS_MINIATURA:
+            ruta = ruta_miniatura(original, ancho, extension)
+            if default_storage.exists(ruta):
+                default_storage.delete(ruta)
+
+
+def generar(producto_id):
+    """Genera las miniaturas de la imagen actual del producto; devuelve los bytes escritos.
+
+    Si mientras tanto cambió la imagen, no marca nada: el guardado que la
+    cambió ya encoló las de la nueva.
+    """
+    producto = Producto.objects.filter(pk=producto_id).only('imagen', 'miniatura_de').first()
+    if producto is None or not producto.imagen:
+        return 0
+    original = producto.imagen.name
+    with producto.imagen.open('rb') as archivo, Image.open(archivo) as imagen:
+        escalas = _escalas(imagen)
+        escritos = 0
+        for ancho, escala in escalas.items():
+            for extension in FORMATOS_MINIATURA:
+                datos = _codificar(escala, extension)
+                _guardar(ruta_miniatura(original, ancho, extension), datos)
+                escritos += len(datos)
+    marcado = Producto.objects.filter(pk=producto_id, imagen=original).update(miniatura_de=original)
+    if marcado and producto.miniatura_de and producto.miniatura_de != original:
+        borrar(producto.miniatura_de)
+    return escritos
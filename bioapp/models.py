@@ -1,7 +1,82 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
 from django.db import models
+from django.db.models import Case, Count, OuterRef, Q, Subquery, Value, When
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+ESTADOS_ALERTA = ('VENCIDO', 'HOY', 'CRITICO', 'OK')
+DIAS_CRITICO = 7
+
+
+def condiciones_alerta(hoy):
+    """Condición sobre fecha_vencimiento de cada estado; rangos, para que usen el índice."""
+    return {
+        'VENCIDO': Q(fecha_vencimiento__lt=hoy),
+        'HOY': Q(fecha_vencimiento=hoy),
+        'CRITICO': Q(fecha_vencimiento__gt=hoy, fecha_vencimiento__lte=hoy + timedelta(days=DIAS_CRITICO)),
+        'OK': Q(fecha_vencimiento__gt=hoy + timedelta(days=DIAS_CRITICO)),
+    }
+
+# Miniaturas cuadradas de Producto.imagen (ver miniaturas.py), en píxeles de lado.
+ANCHOS_MINIATURA = (64, 128, 256)
+FORMATOS_MINIATURA = ('webp', 'jpg')
+
+
+def ruta_miniatura(original, ancho, extension):
+    """'productos/palta.png' -> 'miniaturas/productos/palta.png_128.webp'.
+
+    Se conserva el nombre completo: palta.png y palta.jpg son imágenes
+    distintas y no pueden compartir miniaturas.
+    """
+    return posixpath.join('miniaturas', f"{original}_{ancho}.{extension}")
+
+
+def alerta_de(fecha, hoy=None):
+    """Estado de alerta de una fecha de vencimiento, igual que condiciones_alerta."""
+    hoy = hoy or timezone.localdate()
+    if fecha < hoy: return 'VENCIDO'
+    if fecha == hoy: return 'HOY'
+    if (fecha - hoy).days <= DIAS_CRITICO: return 'CRITICO'
+    return 'OK'
+
+
+class LoteQuerySet(models.QuerySet):
+    def activos(self):
+        return self.filter(cantidad__gt=0)
+
+    def con_alerta(self, hoy=None):
+        """Anota `alerta` (VENCIDO/HOY/CRITICO/OK) con un CASE en la misma consulta."""
+        rangos = condiciones_alerta(hoy or timezone.localdate())
+        return self.annotate(alerta=Case(
+            *[When(rangos[estado], then=Value(estado)) for estado in ESTADOS_ALERTA[:-1]],
+            default=Value('OK'), output_field=models.CharField()))
+
+    def en_alerta(self, *estados, hoy=None):
+        rangos = condiciones_alerta(hoy or timezone.localdate())
+        condicion = Q()
+        for estado in estados:
+            condicion |= rangos[estado]
+        return self.filter(condicion)
+
+    def conteo_por_alerta(self, hoy=None):
+        """{estado: cantidad de lotes} en una sola consulta."""
+        rangos = condiciones_alerta(hoy or timezone.localdate())
+        return self.aggregate(**{estado: Count('id', filter=rangos[estado]) for estado in ESTADOS_ALERTA})
+
+
+class ProductoQuerySet(models.QuerySet):
+    def con_proximo_vencimiento(self):
+        """Anota `primer_vencimiento`: el vencimiento del lote con stock más próximo (subconsulta)."""
+        primero = (Lote.objects.filter(producto=OuterRef('pk'), cantidad__gt=0)
+                   .order_by('fecha_vencimiento').values('fecha_vencimiento')[:1])
+        return self.annotate(primer_vencimiento=Case(
+            When(gestiona_lotes=True, then=Subquery(primero)), default=None,
+            output_field=models.DateField()))
+
+
 class Producto(models.Model):
     UNIDADES = (
         ('KG', 'Kilogramos'),
@@ -31,21 +106,46 @@ class Producto(models.Model):
 
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
 
+    stock_actual = models.IntegerField(default=0, editable=False, verbose_name="Stock Actual")
+    # Imagen (nombre en el storage) de la que salieron las miniaturas actuales.
+    miniatura_de = models.CharField(max_length=100, blank=True, default='', editable=False)
+
+    objects = ProductoQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.nombre} ({self.codigo})"
 
+    def save(self, *args, **kwargs):
+        # El saldo solo se modifica con UPDATE atómicos (ver inventario.py) y
+        # miniatura_de lo marca el hilo que genera las miniaturas; un save() con
+        # la instancia desactualizada no debe pisarlos.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ('stock_actual', 'miniatura_de')
+            ]
+        super().save(*args, **kwargs)
+
     @property
-    def stock_actual(self):
-        if not self.gestiona_lotes:
-            entradas = self.movimiento_set.filter(tipo='ENTRADA').aggregate(total=models.Sum('cantidad'))['total'] or 0
-            salidas = self.movimiento_set.filter(tipo__in=['VENTA', 'MERMA']).aggregate(total=models.Sum('cantidad'))['total'] or 0
-            
-            return entradas - salidas
-        
-        return self.lote_set.aggregate(total=models.Sum('cantidad'))['total'] or 0
+    def miniatura(self):
+        """URLs de las miniaturas para <picture>, o None si no hay imagen o aún se están generando."""
+        if not self.imagen or self.miniatura_de != self.imagen.name:
+            return None
+
+        def srcset(extension):
+            return ', '.join(f"{default_storage.url(ruta_miniatura(self.imagen.name, ancho, extension))} {ancho}w"
+                             for ancho in ANCHOS_MINIATURA)
+        return {
+            'src': default_storage.url(ruta_miniatura(self.imagen.name, ANCHOS_MINIATURA[1], 'jpg')),
+            'srcset_webp': srcset('webp'),
+            'srcset_jpg': srcset('jpg'),
+        }
 
     @property
     def proximo_vencimiento(self):
+        # En listas usar Producto.objects.con_proximo_vencimiento(): esto es una consulta por producto.
+        if hasattr(self, 'primer_vencimiento'):
+            return self.primer_vencimiento
         if not self.gestiona_lotes:
             return None
         lote_mas_cercano = self.lote_set.filter(cantidad__gt=0).order_by('fecha_vencimiento').first()
@@ -79,8 +179,17 @@ class Lote(models.Model):
     
     contenedor = models.ForeignKey(Contenedor, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Ubicación Física")
 
+    objects = LoteQuerySet.as_manager()
+
     class Meta:
         ordering = ['fecha_vencimiento']
+        indexes = [
+            # FIFO: lotes con stock de un producto, del más próximo a vencer.
+            models.Index(fields=['producto', 'fecha_vencimiento', 'cantidad'], name='lote_producto_venc_idx'),
+            # Vencimientos y panel operativo: lotes con stock por fecha.
+            models.Index(fields=['cantidad', 'fecha_vencimiento'], name='lote_cantidad_venc_idx'),
+            models.Index(fields=['contenedor', 'fecha_vencimiento'], name='lote_contenedor_venc_idx'),
+        ]
 
     def __str__(self):
         ubicacion = self.contenedor.nombre if self.contenedor else "Sin Asignar"
@@ -88,12 +197,10 @@ class Lote(models.Model):
     
     @property
     def estado_alerta(self):
-        hoy = timezone.localdate()
-        if self.fecha_vencimiento < hoy: return 'VENCIDO'
-        if self.fecha_vencimiento == hoy: return 'HOY'
-        delta = self.fecha_vencimiento - hoy
-        if delta.days <= 7: return 'CRITICO'
-        return 'OK'
+        # Lo mismo que anota Lote.objects.con_alerta() en SQL.
+        if hasattr(self, 'alerta'):
+            return self.alerta
+        return alerta_de(self.fecha_vencimiento)
 
 class Movimiento(models.Model):
     TIPOS = (
@@ -115,9 +222,154 @@ class Movimiento(models.Model):
 
     observacion = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='movimiento_fecha_id_idx'),
+            models.Index(fields=['tipo', 'fecha', 'id'], name='movimiento_tipo_fecha_idx'),
+            models.Index(fields=['producto', 'tipo', 'fecha'], name='movimiento_producto_tipo_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         self.total_movimiento = self.cantidad * self.precio_unitario_snapshot
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.tipo} - {self.producto.nombre}"
\ No newline at end of file
+        return f"{self.tipo} - {self.producto.nombre}"
+
+
+class Exportacion(models.Model):
+    REPORTES = (
+        ('HISTORIAL', 'Historial de Movimientos'),
+        ('UBICACIONES', 'Stock y Ubicaciones'),
+    )
+    FORMATOS = (
+        ('CSV', 'CSV'),
+        ('XLSX', 'Excel (XLSX)'),
+    )
+    ESTADOS = (
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+    )
+
+    reporte = models.CharField(max_length=20, choices=REPORTES)
+    formato = models.CharField(max_length=4, choices=FORMATOS, default='CSV')
+    huella = models.CharField(max_length=40, verbose_name="Huella de los datos")
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='PENDIENTE')
+
+    filas_totales = models.PositiveIntegerField(default=0)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    archivo = models.FileField(upload_to='exportaciones/', blank=True)
+    error = models.TextField(blank=True)
+
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_solicitud = models.DateTimeField(auto_now_add=True)
+    fecha_termino = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reporte', 'formato', 'huella'], name='exportacion_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_reporte_display()} ({self.formato}) - {self.estado}"
+
+    @property
+    def progreso(self):
+        if self.estado == 'LISTO':
+            return 100
+        if not self.filas_totales:
+            return 0
+        return min(99, int(self.filas_procesadas * 100 / self.filas_totales))
+
+
+class VersionDatos(models.Model):
+    """Contador en la base que sube al editar o borrar datos que salen en las exportaciones.
+
+    A diferencia de versiones.py (caché de cada proceso) sobrevive a reinicios
+    y lo comparten todos los procesos, así que sirve dentro de Exportacion.huella.
+    """
+    nombre = models.CharField(max_length=30, primary_key=True)
+    numero = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.numero}"
+
+
+class TerminoBusqueda(models.Model):
+    """Índice invertido de palabras para búsquedas por prefijo (ver busqueda.py)."""
+    TIPOS = (
+        ('PRODUCTO', 'Producto'),
+        ('LOTE', 'Lote'),
+        ('CONTENEDOR', 'Contenedor'),
+        ('LUGAR', 'Lugar'),
+    )
+
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    objeto_id = models.BigIntegerField()
+    termino = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tipo', 'termino', 'objeto_id'], name='busqueda_termino_idx'),
+            models.Index(fields=['tipo', 'objeto_id'], name='busqueda_objeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}:{self.termino} -> {self.objeto_id}"
+
+
+class ResumenDiario(models.Model):
+    """Totales por día, producto y tipo de movimiento; se mantiene en resumen.py."""
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=20, choices=Movimiento.TIPOS)
+    cantidad = models.BigIntegerField(default=0)
+    valor = models.BigIntegerField(default=0)
+    movimientos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'tipo'], name='resumen_diario_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'fecha'], name='resumen_tipo_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} {self.producto_id}: {self.cantidad}"
+
+
+class MovimientoArchivado(models.Model):
+    """Movimiento antiguo sacado de Movimiento por archivo.py; conserva su id original."""
+    id = models.BigIntegerField(primary_key=True)
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT)
+    lote = models.ForeignKey(Lote, on_delete=models.SET_NULL, null=True, blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT)
+    tipo = models.CharField(max_length=20, choices=Movimiento.TIPOS)
+    cantidad = models.PositiveIntegerField()
+    fecha = models.DateTimeField()
+    precio_unitario_snapshot = models.IntegerField()
+    total_movimiento = models.IntegerField()
+    observacion = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='archivado_fecha_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} - {self.producto_id} ({self.fecha:%d/%m/%Y})"
+
+
+class SaldoInicial(models.Model):
+    """Lo que sumaban los movimientos archivados de un producto: el saldo de apertura del historial vivo."""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='saldo_inicial')
+    entradas = models.BigIntegerField(default=0)
+    salidas = models.BigIntegerField(default=0)
+    movimientos = models.PositiveIntegerField(default=0)
+    archivado_hasta = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.entradas - self.salidas} al {self.archivado_hasta}"
@@ -0,0 +1,90 @@
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Producto, Lote, Movimiento, MovimientoArchivado
+
+TAMANO_BLOQUE = 2000
+UNIDADES = dict(Producto.UNIDADES)
+
+CABECERA_HISTORIAL = ['ID', 'Fecha', 'Hora', 'Tipo', 'Producto', 'SKU', 'Cantidad', 'Unidad', 'Usuario', 'Total ($)', 'Observación', 'Lote', 'Vencimiento']
+CABECERA_UBICACIONES = ['Producto', 'Código SKU', 'N° Lote', 'Vencimiento', 'Cantidad', 'Unidad', 'Ubicación (Contenedor)', 'Zona (Lugar)']
+
+
+def condicion_keyset(orden, valores):
+    """Filtro "fila posterior a `valores`" según `orden` (p. ej. ['-fecha', '-id']).
+
+    La cota sobre el primer campo va aparte del OR para que el motor pueda
+    resolverla como un rango del índice en vez de recorrer la tabla.
+    """
+    primero = orden[0].lstrip('-')
+    cota = 'lte' if orden[0].startswith('-') else 'gte'
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f"{nombre}__{operador}": valor})
+        iguales[nombre] = valor
+    return Q(**{f"{primero}__{cota}": valores[0]}) & condicion
+
+
+def recorrer_por_bloques(queryset, orden, tamano=TAMANO_BLOQUE):
+    """Itera un queryset `values_list(named=True)` en bloques por clave (keyset).
+
+    El backend MySQL no tiene cursores de servidor, así que `iterator()` igual
+    trae el resultado completo a memoria; con bloques por clave la memoria
+    queda acotada a `tamano` filas y cada bloque es un rango del índice.
+    """
+    queryset = queryset.order_by(*orden)
+    ultimos = None
+    while True:
+        bloque = queryset
+        if ultimos is not None:
+            bloque = bloque.filter(condicion_keyset(orden, ultimos))
+        bloque = list(bloque[:tamano])
+        if not bloque:
+            return
+        yield from bloque
+        if len(bloque) < tamano:
+            return
+        ultimos = [getattr(bloque[-1], campo.lstrip('-')) for campo in orden]
+
+
+def _historial_completo():
+    """Movimiento y después MovimientoArchivado: todo lo archivado es anterior, así que sigue el orden."""
+    for modelo in (Movimiento, MovimientoArchivado):
+        yield from _filas_movimientos(modelo.objects.all())
+
+
+def _filas_movimientos(movimientos):
+    movimientos = movimientos.values_list(
+        'id', 'fecha', 'tipo', 'producto__nombre', 'producto__codigo', 'cantidad', 'producto__unidad_medida',
+        'usuario__username', 'total_movimiento', 'observacion', 'lote__numero_lote', 'lote__fecha_vencimiento',
+        named=True)
+    return recorrer_por_bloques(movimientos, ['-fecha', '-id'])
+
+
+def filas_historial(movimientos=None):
+    """Filas del historial, del más nuevo al más antiguo; sin `movimientos` incluye lo archivado."""
+    origen = _historial_completo() if movimientos is None else _filas_movimientos(movimientos)
+    for m in origen:
+        fecha = timezone.localtime(m.fecha)
+        if m.lote__fecha_vencimiento:
+            lote_str = m.lote__numero_lote
+            venc_str = m.lote__fecha_vencimiento.strftime("%d/%m/%Y")
+        else:
+            lote_str = venc_str = "N/A"
+        yield [m.id, fecha.strftime("%d/%m/%Y"), fecha.strftime("%H:%M"), m.tipo, m.producto__nombre, m.producto__codigo,
+               m.cantidad, UNIDADES[m.producto__unidad_medida], m.usuario__username, m.total_movimiento,
+               m.observacion, lote_str, venc_str]
+
+
+def filas_ubicaciones():
+    lotes = Lote.objects.filter(cantidad__gt=0).values_list(
+        'id', 'producto__nombre', 'producto__codigo', 'numero_lote', 'fecha_vencimiento', 'cantidad',
+        'producto__unidad_medida', 'contenedor__nombre', 'contenedor__lugar__nombre', named=True)
+    for lote in recorrer_por_bloques(lotes, ['producto__nombre', 'id']):
+        yield [lote.producto__nombre, lote.producto__codigo, lote.numero_lote,
+               lote.fecha_vencimiento.strftime("%d/%m/%Y"), lote.cantidad,
+               UNIDADES[lote.producto__unidad_medida],
+               lote.contenedor__nombre or "Sin Asignar", lote.contenedor__lugar__nombre or "-"]
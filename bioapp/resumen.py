@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Movimiento, MovimientoArchivado, ResumenDiario
+from .reportes import recorrer_por_bloques
+
+TAMANO_ESCRITURA = 1000
+
+
+def _agrupar(filas):
+    """[(fecha, producto_id, tipo, cantidad, total)] -> {(día local, producto_id, tipo): [cantidad, valor, n]}."""
+    grupos = defaultdict(lambda: [0, 0, 0])
+    for fecha, producto_id, tipo, cantidad, total in filas:
+        grupo = grupos[(timezone.localdate(fecha), producto_id, tipo)]
+        grupo[0] += cantidad
+        grupo[1] += total
+        grupo[2] += 1
+    return grupos
+
+
+def acumular(movimientos):
+    """Suma movimientos recién guardados al resumen diario (3 consultas, sin importar cuántos sean)."""
+    grupos = _agrupar((m.fecha, m.producto_id, m.tipo, m.cantidad, m.total_movimiento) for m in movimientos)
+    if not grupos:
+        return
+    # Primero se asegura que exista la fila de cada clave y luego se suma con
+    # un UPDATE relativo, así dos transacciones simultáneas no se pisan.
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(fecha=fecha, producto_id=producto_id, tipo=tipo) for fecha, producto_id, tipo in grupos],
+        ignore_conflicts=True)
+    ids = {}
+    existentes = ResumenDiario.objects.filter(
+        fecha__in={c[0] for c in grupos}, producto_id__in={c[1] for c in grupos}, tipo__in={c[2] for c in grupos},
+    ).values_list('pk', 'fecha', 'producto_id', 'tipo')
+    for pk, *clave in existentes:
+        if tuple(clave) in grupos:
+            ids[pk] = grupos[tuple(clave)]
+
+    def suma(posicion):
+        return Case(*[When(pk=pk, then=Value(valores[posicion])) for pk, valores in ids.items()],
+                    default=Value(0), output_field=IntegerField())
+
+    ResumenDiario.objects.filter(pk__in=sorted(ids)).update(
+        cantidad=F('cantidad') + suma(0), valor=F('valor') + suma(1), movimientos=F('movimientos') + suma(2))
+
+
+def _escribir(grupos):
+    filas = [ResumenDiario(fecha=fecha, producto_id=producto_id, tipo=tipo, cantidad=c, valor=v, movimientos=n)
+             for (fecha, producto_id, tipo), (c, v, n) in grupos.items()]
+    ResumenDiario.objects.bulk_create(filas, batch_size=TAMANO_ESCRITURA)
+    return len(filas)
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def reconstruir(desde=None):
+    """Rehace el resumen desde los movimientos (todo o a partir del día `desde`). Devuelve las filas escritas."""
+    resumen = ResumenDiario.objects.all()
+    if desde:
+        resumen = resumen.filter(fecha__gte=desde)
+    with transaction.atomic():
+        resumen.delete()
+        filas = []
+        # Movimiento y lo ya archivado (archivo.py).
+        for modelo in (MovimientoArchivado, Movimiento):
+            movimientos = modelo.objects.all()
+            if desde:
+                movimientos = movimientos.filter(fecha__gte=_inicio_dia(desde))
+            filas.append(recorrer_por_bloques(movimientos.values_list(
+                'id', 'fecha', 'producto_id', 'tipo', 'cantidad', 'total_movimiento', named=True), ['fecha', 'id']))
+        grupos = _agrupar((m.fecha, m.producto_id, m.tipo, m.cantidad, m.total_movimiento)
+                          for m in chain(*filas))
+        return _escribir(grupos)
+
+
+def recalcular_dia(fecha, producto_id):
+    """Rehace un día de un producto; para correcciones manuales de movimientos."""
+    filas = [modelo.objects
+             .filter(producto_id=producto_id, fecha__gte=_inicio_dia(fecha),
+                     fecha__lt=_inicio_dia(fecha + timedelta(days=1)))
+             .values_list('fecha', 'producto_id', 'tipo', 'cantidad', 'total_movimiento')
+             for modelo in (MovimientoArchivado, Movimiento)]
+    with transaction.atomic():
+        ResumenDiario.objects.filter(fecha=fecha, producto_id=producto_id).delete()
+        _escribir(_agrupar(chain(*filas)))
+
+
+def totales(desde=None):
+    """{tipo: {'cantidad', 'valor', 'movimientos'}} desde el día `desde` (todo si es None)."""
+    resumen = ResumenDiario.objects.all()
+    if desde:
+        resumen = resumen.filter(fecha__gte=desde)
+    resultado = {tipo: {'cantidad': 0, 'valor': 0, 'movimientos': 0} for tipo, _ in Movimiento.TIPOS}
+    for fila in resumen.values('tipo').annotate(cantidad=Sum('cantidad'), valor=Sum('valor'),
+                                                movimientos=Sum('movimientos')).order_by():
+        resultado[fila['tipo']] = {k: fila[k] or 0 for k in ('cantidad', 'valor', 'movimientos')}
+    return resultado
+
+
+def serie_diaria(desde, hasta):
+    """Valor por día y tipo entre `desde` y `hasta` (incluidos), con ceros en los días sin movimientos."""
+    dias = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    series = {tipo: dict.fromkeys(dias, 0) for tipo, _ in Movimiento.TIPOS}
+    filas = (ResumenDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+             .values('fecha', 'tipo').annotate(valor=Sum('valor')).order_by())
+    for fila in filas:
+        series[fila['tipo']][fila['fecha']] = fila['valor'] or 0
+    return dias, {tipo: list(valores.values()) for tipo, valores in series.items()}
@@ -0,0 +1,65 @@
+from django.core.cache import cache
+
+ROLES_TIMEOUT = 300
+
+
+def _clave(user_id):
+    return f"bioapp:roles:{user_id}"
+
+
+class RolesUsuario:
+    """Grupos del usuario cargados una vez; lo usan los chequeos de permisos y el menú."""
+
+    def __init__(self, user, nombres):
+        self.nombres = frozenset(nombres)
+        self.principal = nombres[0] if nombres else None
+        self.is_superuser = user.is_superuser
+        self.is_staff = user.is_staff
+
+    @property
+    def es_bodeguero(self):
+        return 'Bodeguero' in self.nombres or self.is_superuser
+
+    @property
+    def es_administrador(self):
+        return 'Administrador' in self.nombres
+
+    @property
+    def es_gerente(self):
+        return 'Gerente' in self.nombres or self.is_superuser
+
+    @property
+    def es_admin_bodega(self):
+        return self.es_administrador or self.es_gerente
+
+    @property
+    def puede_ver_ubicaciones(self):
+        return self.is_staff or bool(self.nombres & {'Bodeguero', 'Administrador'})
+
+
+def roles_de(user):
+    """Roles del usuario, memorizados en la instancia (una vez por request) y en el cache.
+
+    El cache se invalida al cambiar los grupos del usuario (ver signals.py); con
+    un backend local por proceso, los demás workers lo ven a más tardar en
+    ROLES_TIMEOUT segundos.
+    """
+    if not user.is_authenticated:
+        return RolesUsuario(user, ())
+    roles = getattr(user, '_roles_usuario', None)
+    if roles is None:
+        nombres = cache.get(_clave(user.pk))
+        if nombres is None:
+            nombres = tuple(user.groups.order_by('pk').values_list('name', flat=True))
+            cache.set(_clave(user.pk), nombres, ROLES_TIMEOUT)
+        roles = user._roles_usuario = RolesUsuario(user, nombres)
+    return roles
+
+
+def invalidar_roles(*user_ids):
+    cache.delete_many([_clave(pk) for pk in user_ids])
+
+
+def roles(request):
+    """Context processor: expone `roles` a las plantillas."""
+    return {'roles': roles_de(request.user)}
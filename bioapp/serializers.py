@@ -0,0 +1,13 @@
+from rest_framework import serializers
+
+
+class LineaTicketSerializer(serializers.Serializer):
+    codigo = serializers.CharField(max_length=50)
+    tipo = serializers.ChoiceField(choices=[('VENTA', 'Venta (Salida)'), ('MERMA', 'Merma (Pérdida)')])
+    cantidad = serializers.IntegerField(min_value=1)
+    observacion = serializers.CharField(required=False, allow_blank=True, default="")
+
+
+class TicketSerializer(serializers.Serializer):
+    lineas = LineaTicketSerializer(many=True, allow_empty=False, max_length=200)
+    observacion = serializers.CharField(required=False, allow_blank=True, default="")
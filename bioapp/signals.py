@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import busqueda, exportaciones, miniaturas
+from .models import Producto, Lote, Movimiento, MovimientoArchivado, Contenedor, Lugar
+from .indicadores import invalidar_operativo
+from .roles import invalidar_roles
+from .versiones import nueva_version
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def grupos_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if not reverse:
+        invalidar_roles(instance.pk)
+    elif action == 'pre_clear':
+        invalidar_roles(*instance.user_set.values_list('pk', flat=True))
+    elif pk_set:
+        invalidar_roles(*pk_set)
+
+
+TIPOS_INDEXADOS = {
+    Producto: 'PRODUCTO',
+    Lote: 'LOTE',
+    Contenedor: 'CONTENEDOR',
+    Lugar: 'LUGAR',
+}
+
+
+def indexar_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busqueda.indexar(TIPOS_INDEXADOS[sender], instance)
+
+
+def desindexar_borrado(sender, instance, **kwargs):
+    busqueda.desindexar(TIPOS_INDEXADOS[sender], instance.pk)
+
+
+for _modelo in TIPOS_INDEXADOS:
+    post_save.connect(indexar_guardado, sender=_modelo, dispatch_uid=f"indexar_{_modelo.__name__}")
+    post_delete.connect(desindexar_borrado, sender=_modelo, dispatch_uid=f"desindexar_{_modelo.__name__}")
+
+
+def contenedores_cambiados(sender, **kwargs):
+    nueva_version('contenedores')
+
+
+for _modelo in (Lugar, Contenedor):
+    post_save.connect(contenedores_cambiados, sender=_modelo, dispatch_uid=f"contenedores_{_modelo.__name__}")
+    post_delete.connect(contenedores_cambiados, sender=_modelo, dispatch_uid=f"contenedores_borrado_{_modelo.__name__}")
+
+
+def productos_cambiados(sender, **kwargs):
+    nueva_version('productos')
+
+
+post_save.connect(productos_cambiados, sender=Producto, dispatch_uid="productos_guardado")
+post_delete.connect(productos_cambiados, sender=Producto, dispatch_uid="productos_borrado")
+
+
+def imagen_guardada(sender, instance, raw=False, **kwargs):
+    if not raw and instance.imagen and instance.imagen.name != instance.miniatura_de:
+        miniaturas.encolar(instance.pk)
+
+
+post_save.connect(imagen_guardada, sender=Producto, dispatch_uid="miniaturas_producto")
+
+
+def operativo_cambiado(sender, **kwargs):
+    invalidar_operativo()
+
+
+for _modelo in (Lote, Movimiento, Contenedor):
+    post_save.connect(operativo_cambiado, sender=_modelo, dispatch_uid=f"operativo_{_modelo.__name__}")
+    post_delete.connect(operativo_cambiado, sender=_modelo, dispatch_uid=f"operativo_borrado_{_modelo.__name__}")
+
+
+def exportables_editados(sender, created=False, raw=False, update_fields=None, **kwargs):
+    # Las altas ya cambian los conteos de huella_datos; iniciar sesión solo toca last_login.
+    if raw or created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    exportaciones.datos_editados()
+
+
+for _modelo in (Producto, Lote, Movimiento, MovimientoArchivado, Contenedor, Lugar, User):
+    post_save.connect(exportables_editados, sender=_modelo, dispatch_uid=f"exportables_{_modelo.__name__}")
+    post_delete.connect(exportables_editados, sender=_modelo, dispatch_uid=f"exportables_borrado_{_modelo.__name__}")
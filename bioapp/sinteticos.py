@@ -0,0 +1,234 @@
+"""Datos sintéticos con forma de bodega real, para medir cómo escala el sistema.
+
+La popularidad de los productos sigue una curva de Zipf (pocos productos
+concentran la mayoría de las ventas), cada producto tiene su vida útil y los
+movimientos se simulan día a día: se repone cuando el stock no alcanza, las
+salidas consumen los lotes por FIFO como en inventario.registrar_salidas y lo
+que vence sin venderse pasa a MERMA como en dar_de_baja_vencidos.
+"""
+import random
+from collections import defaultdict, deque
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .busqueda import reindexar_todo
+from .inventario import asignar_fifo, reconciliar_saldos
+from .models import Producto, Lote, Movimiento, MovimientoArchivado, Lugar, Contenedor
+from .resumen import reconstruir
+from .versiones import nueva_version
+
+BASES = ('Manzana', 'Pera', 'Palta', 'Tomate', 'Lechuga', 'Zanahoria', 'Papa', 'Cebolla', 'Naranja',
+         'Limón', 'Plátano', 'Frutilla', 'Arándano', 'Uva', 'Pimentón', 'Zapallo', 'Brócoli', 'Espinaca',
+         'Kiwi', 'Durazno', 'Ciruela', 'Pepino', 'Choclo', 'Cilantro', 'Acelga', 'Betarraga')
+VARIEDADES = ('Orgánica', 'Premium', 'Granel', 'Hidropónica', 'Seleccionada', 'Nacional', 'Importada')
+USUARIO = 'datos_sinteticos'
+TAMANO_BLOQUE = 5000
+
+
+def limpiar(prefijo):
+    """Borra lo generado antes con `prefijo`. Devuelve la cantidad de productos borrados."""
+    with transaction.atomic():
+        Movimiento.objects.filter(producto__codigo__startswith=prefijo).delete()
+        MovimientoArchivado.objects.filter(producto__codigo__startswith=prefijo).delete()
+        borrados = Producto.objects.filter(codigo__startswith=prefijo).delete()[1].get('bioapp.Producto', 0)
+        Lugar.objects.filter(nombre__startswith=f"{prefijo} ").delete()
+    return borrados
+
+
+class _Simulacion:
+    def __init__(self, azar, productos, contenedores, hoy, dias, movimientos):
+        self.azar = azar
+        self.productos = productos
+        self.contenedores = contenedores
+        # La historia termina ayer: así ningún movimiento queda con hora futura.
+        self.inicio = hoy - timedelta(days=dias)
+        self.dias = dias
+        self.objetivo = movimientos
+        # Zipf con s=1.1 sobre un orden al azar: el producto en el puesto k vende ~1/k^1.1.
+        orden = list(range(len(productos)))
+        azar.shuffle(orden)
+        pesos = [0.0] * len(productos)
+        for puesto, i in enumerate(orden, start=1):
+            pesos[i] = 1 / puesto ** 1.1
+        total = sum(pesos)
+        self.pesos = [p / total for p in pesos]
+        self.acumulados = []
+        suma = 0
+        for p in self.pesos:
+            suma += p
+            self.acumulados.append(suma)
+        self.vida_util = [azar.randint(3, 60) for _ in productos]
+
+        self.lotes = []  # [producto_idx, numero, vencimiento, ingreso, contenedor, cantidad restante]
+        self.abiertos = defaultdict(deque)  # producto_idx -> índices de lotes con stock, por vencimiento
+        self.saldo_sin_lotes = defaultdict(int)
+        self.movimientos = []  # (producto_idx, lote_idx, tipo, cantidad, fecha, observacion)
+        self.reloj = None
+        self.paso = 0
+
+    def _momento(self):
+        # Reloj del día simulado: los eventos avanzan de 8:00 a 20:00 en orden.
+        self.reloj += timedelta(seconds=self.paso * self.azar.uniform(0.5, 1.5))
+        return self.reloj
+
+    def _reponer(self, i, dia, minimo):
+        producto = self.productos[i]
+        por_dia = self.objetivo / self.dias * self.pesos[i] * 3
+        cantidad = max(minimo, int(por_dia * self.vida_util[i] * self.azar.uniform(0.5, 1.2)), 10)
+        fecha = self._momento()
+        lote_idx = None
+        if producto.gestiona_lotes:
+            vencimiento = dia + timedelta(days=self.vida_util[i] + self.azar.randint(-2, 2))
+            lote_idx = len(self.lotes)
+            self.lotes.append([i, f"{producto.codigo}-{lote_idx}", vencimiento, fecha,
+                               self.azar.choice(self.contenedores), cantidad])
+            # Las entradas casi siempre vencen después que lo ya abierto; si no, se reordena.
+            abiertos = self.abiertos[i]
+            abiertos.append(lote_idx)
+            if len(abiertos) > 1 and self.lotes[abiertos[-2]][2] > vencimiento:
+                self.abiertos[i] = deque(sorted(abiertos, key=lambda l: (self.lotes[l][2], l)))
+        else:
+            self.saldo_sin_lotes[i] += cantidad
+        self.movimientos.append((i, lote_idx, 'ENTRADA', cantidad, fecha, "Reposición"))
+
+    def _salida(self, i, dia, tipo, cantidad, observacion):
+        if not self.productos[i].gestiona_lotes:
+            if self.saldo_sin_lotes[i] < cantidad:
+                self._reponer(i, dia, cantidad)
+            self.saldo_sin_lotes[i] -= cantidad
+            self.movimientos.append((i, None, tipo, cantidad, self._momento(), observacion))
+            return
+        disponible = sum(self.lotes[l][5] for l in self.abiertos[i])
+        if disponible < cantidad:
+            self._reponer(i, dia, cantidad - disponible)
+        abiertos = self.abiertos[i]
+        fecha = self._momento()
+        for lote_idx, n in asignar_fifo([(l, self.lotes[l][5]) for l in abiertos], cantidad):
+            self.lotes[lote_idx][5] -= n
+            self.movimientos.append((i, lote_idx, tipo, n, fecha, observacion))
+        while abiertos and not self.lotes[abiertos[0]][5]:
+            abiertos.popleft()
+
+    def _vencer(self, dia):
+        for i, abiertos in self.abiertos.items():
+            while abiertos and self.lotes[abiertos[0]][2] < dia:
+                lote_idx = abiertos.popleft()
+                lote = self.lotes[lote_idx]
+                if lote[5]:
+                    self.movimientos.append((i, lote_idx, 'MERMA', lote[5], self._momento(),
+                                             f"BAJA AUTOMÁTICA POR VENCIMIENTO (Venció el {lote[2]})"))
+                    lote[5] = 0
+
+    def ejecutar(self):
+        for d in range(self.dias):
+            dia = self.inicio + timedelta(days=d)
+            self._vencer(dia)
+            # Más movimiento los fines de semana y algo de ruido entre días.
+            factor = (1.4 if dia.weekday() >= 5 else 1.0) * self.azar.uniform(0.8, 1.2)
+            pendientes = self.objetivo - len(self.movimientos)
+            restantes = self.dias - d
+            eventos = pendientes if restantes == 1 else min(pendientes, max(1, int(pendientes / restantes * factor)))
+            self.reloj = timezone.make_aware(datetime.combine(dia, time(8)))
+            self.paso = 12 * 3600 / (eventos * 1.3 + 1)
+            elegidos = self.azar.choices(range(len(self.productos)), cum_weights=self.acumulados, k=eventos)
+            for i in elegidos:
+                if self.azar.random() < 0.03:
+                    self._salida(i, dia, 'MERMA', self.azar.randint(1, 3), "Producto dañado")
+                else:
+                    self._salida(i, dia, 'VENTA', min(20, 1 + int(self.azar.expovariate(0.5))), "")
+        return self
+
+
+def _en_bloques(filas, modelo):
+    for inicio in range(0, len(filas), TAMANO_BLOQUE):
+        with transaction.atomic():
+            modelo.objects.bulk_create(filas[inicio:inicio + TAMANO_BLOQUE])
+
+
+def _con_fechas(filas, modelo, campo):
+    """Como _en_bloques para filas [(objeto, fecha simulada)] de un campo auto_now_add.
+
+    bulk_create deja `campo` en la hora actual; la simulada se escribe después
+    con un UPDATE en la misma transacción. Los objetos traen su id (MySQL no lo
+    devuelve en bulk_create).
+    """
+    for inicio in range(0, len(filas), TAMANO_BLOQUE):
+        bloque = filas[inicio:inicio + TAMANO_BLOQUE]
+        objetos = [objeto for objeto, _ in bloque]
+        with transaction.atomic():
+            modelo.objects.bulk_create(objetos)
+            for objeto, fecha in bloque:
+                setattr(objeto, campo, fecha)
+            modelo.objects.bulk_update(objetos, [campo], batch_size=1000)
+
+
+def _primer_id(*modelos):
+    return max(modelo.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0 for modelo in modelos) + 1
+
+
+def generar(productos=500, lugares=5, contenedores=60, movimientos=100_000, dias=180, semilla=1,
+            prefijo='SIN', con_lotes=0.8):
+    """Crea lugares, contenedores, productos y lotes, y al menos `movimientos` movimientos en los `dias` días
+    previos a hoy.
+
+    Los códigos de producto y los nombres de lugar empiezan con `prefijo` (ver limpiar).
+    Devuelve la cantidad creada de cada cosa.
+    """
+    azar = random.Random(semilla)
+    hoy = timezone.localdate()
+    usuario, _ = User.objects.get_or_create(username=USUARIO, defaults={'is_active': False})
+
+    Lugar.objects.bulk_create([Lugar(nombre=f"{prefijo} Zona {i + 1}") for i in range(lugares)])
+    zonas = list(Lugar.objects.filter(nombre__startswith=f"{prefijo} Zona ").order_by('pk'))
+    Contenedor.objects.bulk_create([
+        Contenedor(nombre=f"{prefijo}-C{i + 1:04d}", lugar=zonas[i % lugares]) for i in range(contenedores)])
+    # MySQL no devuelve las PK en bulk_create: se releen las filas creadas.
+    ids_contenedores = list(Contenedor.objects.filter(lugar__in=zonas).values_list('pk', flat=True))
+
+    nuevos = []
+    for i in range(productos):
+        costo = azar.randrange(200, 5000, 10)
+        nuevos.append(Producto(
+            codigo=f"{prefijo}{i:06d}", nombre=f"{azar.choice(BASES)} {azar.choice(VARIEDADES)} {i}",
+            unidad_medida=azar.choice(Producto.UNIDADES)[0], tipo_origen=azar.choice(Producto.ORIGENES)[0],
+            precio_costo=costo, precio_venta=int(costo * azar.uniform(1.3, 1.8)),
+            stock_minimo=azar.choice((5, 10, 20, 50)), gestiona_lotes=azar.random() < con_lotes))
+    _en_bloques(nuevos, Producto)
+    creados = list(Producto.objects.filter(codigo__startswith=prefijo).order_by('codigo'))
+
+    simulacion = _Simulacion(azar, creados, ids_contenedores, hoy, dias, movimientos).ejecutar()
+
+    primer_lote = _primer_id(Lote)
+    _con_fechas([
+        (Lote(pk=primer_lote + n, producto=creados[i], numero_lote=numero, fecha_vencimiento=vencimiento,
+              contenedor_id=contenedor, cantidad=cantidad), ingreso)
+        for n, (i, numero, vencimiento, ingreso, contenedor, cantidad) in enumerate(simulacion.lotes)],
+        Lote, 'fecha_ingreso')
+
+    # Los archivados conservan su id: los nuevos van después también de esos.
+    primer_movimiento = _primer_id(Movimiento, MovimientoArchivado)
+    filas = []
+    for n, (i, lote_idx, tipo, cantidad, fecha, observacion) in enumerate(simulacion.movimientos):
+        producto = creados[i]
+        precio = producto.precio_venta if tipo == 'VENTA' else producto.precio_costo
+        filas.append((Movimiento(
+            pk=primer_movimiento + n, producto=producto,
+            lote_id=None if lote_idx is None else primer_lote + lote_idx, usuario=usuario, tipo=tipo,
+            cantidad=cantidad, precio_unitario_snapshot=precio, total_movimiento=cantidad * precio,
+            observacion=observacion), fecha))
+        if len(filas) == TAMANO_BLOQUE:
+            _con_fechas(filas, Movimiento, 'fecha')
+            filas = []
+    _con_fechas(filas, Movimiento, 'fecha')
+
+    reconciliar_saldos()
+    reindexar_todo()
+    reconstruir()
+    for nombre in ('contenedores', 'productos', 'operativo'):
+        nueva_version(nombre)
+    return {'lugares': lugares, 'contenedores': contenedores, 'productos': productos,
+            'lotes': len(simulacion.lotes), 'movimientos': len(simulacion.movimientos)}
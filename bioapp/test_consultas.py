@@ -0,0 +1,140 @@
+"""Chequeos de EXPLAIN: las consultas de las vistas de más tráfico deben usar índices.
+
+Se piden las páginas, se capturan los SELECT que ejecutan y se pasa cada uno
+por EXPLAIN; falla si alguno recorre completa una de las tablas grandes.
+"""
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .busqueda import reindexar_todo
+from .models import Producto, Lote, Movimiento, Lugar, Contenedor
+from .resumen import reconstruir
+
+TABLAS_GRANDES = {'bioapp_movimiento', 'bioapp_lote', 'bioapp_producto', 'bioapp_resumendiario',
+                  'bioapp_terminobusqueda'}
+
+# (método, url, datos, recorridos permitidos y por qué). Un permitido es una tabla
+# (cualquier recorrido) o (tabla, índice): recorrer ese índice en orden, solo en
+# consultas con LIMIT, que cortan ahí sin leerlo completo.
+CONSULTAS = [
+    # Primera página sin filtros: ORDER BY fecha DESC, id DESC LIMIT sobre el índice (fecha, id).
+    ('get', '/gerencia/historial/', {}, {('bioapp_movimiento', 'movimiento_fecha_id_idx')}),
+    ('get', '/gerencia/historial/', {'tipo': 'VENTA'}, set()),
+    ('get', '/gerencia/historial/', {'buscar': 'palta'}, set()),
+    ('get', '/gerencia/historial/', {'desde': '{hoy}', 'hasta': '{hoy}'}, set()),
+    ('get', '/gerencia/tendencia/', {'dias': 30}, set()),
+    # Comparar stock_actual con stock_minimo (dos columnas) no se resuelve con un índice.
+    ('get', '/gerencia/dashboard/', {'periodo': 'mes'}, {'bioapp_producto'}),
+    ('get', '/administracion/dashboard/', {}, set()),
+    ('get', '/administracion/catalogo/', {'buscar': 'palta'}, set()),
+    ('get', '/administracion/reporte-ubicaciones/', {'buscar': 'palta'}, set()),
+    ('get', '/mapa/lugar/{lugar}/', {}, set()),
+    ('get', '/mapa/contenedor/{contenedor}/', {}, set()),
+    ('get', '/api/buscar/', {'q': 'pal'}, set()),
+    ('post', '/administracion/procesar-vencidos/', {}, set()),
+]
+
+_ALIAS = re.compile(r'[`"](\w+)[`"]\s+(?:AS\s+)?[`"]?([A-Z]\d+)\b')
+
+
+def recorridos_completos(sql):
+    """(tabla, índice) que el plan de `sql` recorre completos; índice None si recorre la tabla."""
+    alias = {a: tabla for tabla, a in _ALIAS.findall(sql)}
+    tablas = set()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            for *_, detalle in cursor.fetchall():
+                # SCAN recorre la tabla o un índice completo (con o sin USING INDEX);
+                # solo SEARCH es un acceso por rango o clave.
+                m = re.match(r'SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?', detalle)
+                if m:
+                    tablas.add((alias.get(m.group(1), m.group(1)), m.group(2)))
+        elif connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columnas = [c[0] for c in cursor.description]
+            for fila in cursor.fetchall():
+                fila = dict(zip(columnas, fila))
+                # 'index' recorre el índice completo: tan caro como 'ALL' en una tabla grande.
+                if fila['type'] in ('ALL', 'index') and fila['table']:
+                    indice = fila['key'] if fila['type'] == 'index' else None
+                    tablas.add((alias.get(fila['table'], fila['table']), indice))
+    return tablas
+
+
+class PlanesDeConsultaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('gerente')
+        cls.usuario.groups.add(Group.objects.get(name='Gerente'))
+        cls.lugar = Lugar.objects.create(nombre='Cámara')
+        Contenedor.objects.bulk_create([Contenedor(nombre=f"B{i}", lugar=cls.lugar) for i in range(40)])
+        contenedores = list(Contenedor.objects.all())
+        cls.contenedor = contenedores[0]
+        Producto.objects.bulk_create([
+            Producto(codigo=f"P{i:04d}", nombre=('Palta' if i % 10 == 0 else 'Manzana') + f" {i}",
+                     precio_costo=100, precio_venta=150, stock_minimo=5)
+            for i in range(400)])
+        productos = list(Producto.objects.all())
+        hoy = timezone.localdate()
+        # Como en una bodega con historia: la mayoría de los lotes ya se agotó
+        # y los movimientos se reparten en varios meses.
+        Lote.objects.bulk_create([
+            Lote(producto=p, numero_lote=f"L{p.pk}-{j}", cantidad=(10 if j == 9 else 0),
+                 fecha_vencimiento=hoy + timedelta(days=j * 5 - 40), contenedor=contenedores[(i + j) % 40])
+            for i, p in enumerate(productos) for j in range(10)])
+        lotes = list(Lote.objects.all())
+        Movimiento.objects.bulk_create([
+            Movimiento(producto_id=lote.producto_id, lote=lote, usuario=cls.usuario, tipo=('ENTRADA', 'VENTA', 'MERMA')[i % 3],
+                       cantidad=1, precio_unitario_snapshot=100, total_movimiento=100)
+            for i, lote in enumerate(lotes * 3)])
+        ids = list(Movimiento.objects.order_by('pk').values_list('pk', flat=True))
+        for dia in range(90):
+            Movimiento.objects.filter(pk__in=ids[dia::90]).update(fecha=timezone.now() - timedelta(days=dia))
+        reindexar_todo()
+        reconstruir()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'mysql':
+                cursor.execute('ANALYZE TABLE bioapp_movimiento, bioapp_lote, bioapp_producto, '
+                               'bioapp_resumendiario, bioapp_terminobusqueda')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_consultas_usan_indices(self):
+        reemplazos = {'{hoy}': timezone.localdate().isoformat(), '{lugar}': str(self.lugar.pk),
+                      '{contenedor}': str(self.contenedor.pk)}
+        for metodo, url, datos, permitidas in CONSULTAS:
+            for clave, valor in reemplazos.items():
+                url = url.replace(clave, valor)
+                datos = {k: str(v).replace(clave, valor) for k, v in datos.items()}
+            with self.subTest(url=url, datos=datos), CaptureQueriesContext(connection) as consultas:
+                respuesta = getattr(self.client, metodo)(url, datos)
+                self.assertLess(respuesta.status_code, 400)
+                for consulta in consultas:
+                    sql = consulta['sql']
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    recorridas = {
+                        (tabla, indice) for tabla, indice in recorridos_completos(sql)
+                        if tabla in TABLAS_GRANDES and tabla not in permitidas
+                        and not (indice and (tabla, indice) in permitidas and ' LIMIT ' in sql)
+                    }
+                    self.assertFalse(recorridas, f"Recorrido completo de {recorridas}:\n{sql}")
+
+    def test_recorrer_un_indice_completo_cuenta_como_recorrido(self):
+        q = connection.ops.quote_name
+        tabla = q('bioapp_movimiento')
+        recorridos = recorridos_completos(f"SELECT {q('id')} FROM {tabla} ORDER BY {q('fecha')}, {q('id')}")
+        self.assertEqual({t for t, _ in recorridos}, {'bioapp_movimiento'})
+        self.assertEqual(recorridos_completos(f"SELECT * FROM {tabla} WHERE {q('id')} = 1"), set())
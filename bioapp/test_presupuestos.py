@@ -0,0 +1,158 @@
+"""Presupuesto de consultas y de tiempo por vista.
+
+Cada URL de bioapp/urls.py se pide con cada rol, con un set de datos chico y
+otra vez después de triplicarlo: la cantidad de consultas no puede crecer con
+las filas (N+1) ni pasar del presupuesto de la tabla. Los tiempos dependen de
+la máquina, así que solo se exigen con BIOFRESCO_PRESUPUESTO_TIEMPOS=1.
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .busqueda import reindexar_todo
+from .models import Producto, Lote, Movimiento, Lugar, Contenedor, Exportacion
+from .resumen import reconstruir
+
+ROLES = ('Bodeguero', 'Administrador', 'Gerente', 'superusuario')
+EXIGIR_TIEMPOS = os.environ.get('BIOFRESCO_PRESUPUESTO_TIEMPOS') == '1'
+
+# nombre de la URL: (argumentos, método, datos, máximo de consultas, máximo de milisegundos)
+# Los argumentos que empiezan con ':' se toman del set de datos sembrado.
+PRESUPUESTOS = {
+    'home': ((), 'get', {}, 3, 200),
+    # Vista async: los decoradores cargan el usuario con request.auser(), una consulta más.
+    'dashboard_gerencia': ((), 'get', {}, 7, 300),
+    'tendencia_movimientos': ((), 'get', {'dias': 30}, 4, 200),
+    'historial_movimientos': ((), 'get', {}, 4, 300),
+    'exportar_historial': ((), 'get', {}, 4, 500),
+    'lista_colaboradores': ((), 'get', {}, 4, 300),
+    'crear_colaborador': ((), 'get', {}, 3, 300),
+    'editar_colaborador': ((':usuario',), 'get', {}, 5, 300),
+    'eliminar_colaborador': ((':usuario',), 'get', {}, 3, 300),
+    'dashboard_operativo': ((), 'get', {}, 6, 300),
+    'procesar_vencimientos': ((), 'post', {}, 12, 500),
+    'catalogo': ((), 'get', {}, 4, 500),
+    'gestionar_productos': ((), 'get', {}, 3, 300),
+    'editar_producto': ((':producto',), 'get', {}, 4, 300),
+    'eliminar_producto': ((':producto',), 'get', {}, 4, 300),
+    'reporte_ubicaciones': ((), 'get', {}, 4, 500),
+    'exportar_ubicaciones': ((), 'get', {}, 4, 500),
+    'solicitar_exportacion': (('historial',), 'post', {'formato': 'CSV'}, 9, 300),
+    'detalle_exportacion': ((':exportacion',), 'get', {}, 4, 300),
+    'estado_exportacion': ((':exportacion',), 'get', {}, 4, 200),
+    'descargar_exportacion': ((':exportacion',), 'get', {}, 4, 200),
+    'gestion_bodega': ((), 'get', {}, 4, 300),
+    'detalle_lugar': ((':lugar',), 'get', {}, 6, 300),
+    'inventario_contenedor': ((':contenedor',), 'get', {}, 5, 300),
+    'dashboard_bodega': ((), 'get', {}, 3, 200),
+    'registrar_movimiento': ((), 'get', {}, 4, 300),
+    'contenedores_por_lugar': ((), 'get', {}, 4, 200),
+    'autocompletar': ((), 'get', {'q': 'pro'}, 4, 200),
+    'api_ticket': ((), 'post', {'lineas': [{'codigo': 'S0-0', 'tipo': 'VENTA', 'cantidad': 1}]}, 14, 500),
+    'metricas': ((), 'get', {}, 3, 200),
+    'exit': ((), 'post', {}, 4, 200),
+}
+
+
+def nombre_api(url):
+    return url.startswith('/api/') and not url.startswith('/api/buscar/')
+
+
+def sembrar(ronda, usuario):
+    """Agrega una zona con contenedores, productos con lotes y movimientos, y un usuario por rol."""
+    hoy = timezone.localdate()
+    lugar = Lugar.objects.create(nombre=f"Zona {ronda}")
+    Contenedor.objects.bulk_create([Contenedor(nombre=f"R{ronda}-{i}", lugar=lugar) for i in range(6)])
+    contenedores = list(lugar.contenedores.all())
+    Producto.objects.bulk_create([
+        Producto(codigo=f"S{ronda}-{i}", nombre=f"Producto {ronda} {i}", precio_costo=100, precio_venta=150,
+                 stock_minimo=20, stock_actual=30, gestiona_lotes=i % 5 != 0)
+        for i in range(15)])
+    productos = list(Producto.objects.filter(codigo__startswith=f"S{ronda}-"))
+    Lote.objects.bulk_create([
+        Lote(producto=p, numero_lote=f"L{ronda}-{p.pk}-{j}", cantidad=10, contenedor=contenedores[(i + j) % 6],
+             fecha_vencimiento=hoy + timedelta(days=j * 4 - 2))
+        for i, p in enumerate(productos) for j in range(3)])
+    Movimiento.objects.bulk_create([
+        Movimiento(producto=p, usuario=usuario, tipo=tipo, cantidad=1, precio_unitario_snapshot=100,
+                   total_movimiento=100, observacion='semilla')
+        for p in productos for tipo in ('ENTRADA', 'VENTA', 'MERMA')])
+    for rol in ('Bodeguero', 'Administrador', 'Gerente'):
+        User.objects.create_user(f"{rol.lower()}{ronda}").groups.add(Group.objects.get(name=rol))
+    reindexar_todo()
+    reconstruir()
+
+
+class PresupuestoVistasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = {'superusuario': User.objects.create_superuser('root', is_staff=True)}
+        for rol in ROLES[:-1]:
+            cls.usuarios[rol] = User.objects.create_user(f"rol_{rol.lower()}", is_staff=rol == 'Gerente')
+            cls.usuarios[rol].groups.add(Group.objects.get(name=rol))
+        sembrar(0, cls.usuarios['superusuario'])
+        cls.datos = {
+            ':usuario': User.objects.filter(username='bodeguero0').get().pk,
+            ':producto': Producto.objects.get(codigo='S0-1').pk,
+            ':lugar': Lugar.objects.get(nombre='Zona 0').pk,
+            ':contenedor': Contenedor.objects.get(nombre='R0-0').pk,
+            ':exportacion': Exportacion.objects.create(reporte='HISTORIAL', formato='CSV', huella='x').pk,
+        }
+
+    def medir(self, rol, nombre):
+        argumentos, metodo, datos, _, _ = PRESUPUESTOS[nombre]
+        url = reverse(nombre, args=[self.datos.get(a, a) for a in argumentos])
+        cache.clear()
+        self.client.force_login(self.usuarios[rol])
+        # Primera pasada para calentar cachés de proceso (roles, plantillas). Lo
+        # que escriben ambas pasadas se deshace para que cada medida parta de los
+        # datos sembrados y no tome el camino sin trabajo (p. ej.
+        # procesar_vencimientos sin lotes vencidos).
+        with transaction.atomic():
+            self._pedir(metodo, url, datos)
+            transaction.set_rollback(True)
+        with transaction.atomic():
+            self.client.force_login(self.usuarios[rol])
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                respuesta = self._pedir(metodo, url, datos)
+                milisegundos = (time.perf_counter() - inicio) * 1000
+            transaction.set_rollback(True)
+        self.assertLess(respuesta.status_code, 500)
+        return len(consultas), milisegundos
+
+    def _pedir(self, metodo, url, datos):
+        if metodo == 'post' and nombre_api(url):
+            respuesta = self.client.post(url, datos, content_type='application/json')
+        else:
+            respuesta = getattr(self.client, metodo)(url, datos)
+        if getattr(respuesta, 'streaming', False):
+            b''.join(respuesta.streaming_content)
+        return respuesta
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        from .urls import urlpatterns
+        self.assertEqual({p.name for p in urlpatterns}, set(PRESUPUESTOS))
+
+    def test_consultas_acotadas_y_constantes(self):
+        casos = [(rol, nombre) for nombre in PRESUPUESTOS for rol in ROLES]
+        antes = {caso: self.medir(*caso) for caso in casos}
+        for ronda in (1, 2):
+            sembrar(ronda, self.usuarios['superusuario'])
+        for rol, nombre in casos:
+            _, _, _, maximo, maximo_ms = PRESUPUESTOS[nombre]
+            consultas, milisegundos = self.medir(rol, nombre)
+            with self.subTest(vista=nombre, rol=rol):
+                self.assertEqual(consultas, antes[(rol, nombre)][0],
+                                 "La cantidad de consultas crece con los datos (N+1).")
+                self.assertLessEqual(consultas, maximo)
+                if EXIGIR_TIEMPOS:
+                    self.assertLessEqual(milisegundos, maximo_ms)
@@ -1,3 +1,1366 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import load_workbook
+from PIL import Image
+
+from . import exportaciones, metricas, miniaturas
+from .management.commands import benchmark_vistas
+from .backends.mysql_pool.pool import PoolAgotado, PoolConexiones
+from .archivo import archivar
+from .codigos import SEGUNDOS_EN_MEMORIA, _recientes, producto_por_codigo
+from . import concurrente
+from .concurrente import en_paralelo
+from .estaticos import CACHE_INMUTABLE
+from .forms import ContenedorForm
+from .indicadores import kpis_operativos, mapa_ocupacion
+from .inventario import (StockInsuficiente, asignar_fifo, dar_de_baja_vencidos, diferencias_lotes,
+                         recalcular_stock, reconciliar_saldos, registrar_entrada, registrar_salida)
+from .models import (ANCHOS_MINIATURA, FORMATOS_MINIATURA, Exportacion, Producto, Lote, Movimiento,
+                     MovimientoArchivado, Lugar, Contenedor, ResumenDiario, SaldoInicial, ruta_miniatura)
+from .reportes import CABECERA_UBICACIONES, TAMANO_BLOQUE, filas_ubicaciones, recorrer_por_bloques
+from .exportaciones import generar_exportacion, huella_datos, solicitar_exportacion
+from .resumen import reconstruir, totales
+from .roles import roles_de
+from .versiones import nueva_version, version
+from .sinteticos import generar
+
+
+class AsignarFifoTests(SimpleTestCase):
+    def test_reparte_en_orden(self):
+        self.assertEqual(asignar_fifo([(1, 3), (2, 5), (3, 4)], 6), [(1, 3), (2, 3)])
+
+    def test_cantidad_exacta(self):
+        self.assertEqual(asignar_fifo([(1, 3), (2, 5)], 8), [(1, 3), (2, 5)])
+
+    def test_stock_insuficiente(self):
+        with self.assertRaises(StockInsuficiente):
+            asignar_fifo([(1, 3), (2, 5)], 9)
+
+
+class RegistrarSalidaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('bodega')
+        cls.contenedor = Contenedor.objects.create(nombre='B1', lugar=Lugar.objects.create(nombre='Cámara'))
+        cls.producto = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+        cls.rapido = Producto.objects.create(codigo='200', nombre='Pan', precio_costo=100, precio_venta=150,
+                                             gestiona_lotes=False)
+
+    def entrada(self, cantidad, dias):
+        registrar_entrada(self.producto, cantidad, self.usuario, numero_lote=f"L{dias}",
+                          fecha_vencimiento=timezone.localdate() + timedelta(days=dias), contenedor=self.contenedor)
+
+    def test_consume_primero_el_lote_mas_proximo_a_vencer(self):
+        self.entrada(10, 9)
+        self.entrada(4, 2)
+        registrar_salida(self.producto, 'VENTA', 6, self.usuario)
+
+        cantidades = dict(Lote.objects.values_list('numero_lote', 'cantidad'))
+        self.assertEqual(cantidades, {'L2': 0, 'L9': 8})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 8)
+        ventas = Movimiento.objects.filter(tipo='VENTA').order_by('cantidad')
+        self.assertEqual([(m.lote.numero_lote, m.cantidad, m.total_movimiento) for m in ventas],
+                         [('L9', 2, 1800), ('L2', 4, 3600)])
+
+    def test_no_sobrevende(self):
+        self.entrada(3, 5)
+        with self.assertRaises(StockInsuficiente):
+            registrar_salida(self.producto, 'MERMA', 4, self.usuario)
+        self.assertEqual(Lote.objects.get().cantidad, 3)
+        self.assertFalse(Movimiento.objects.filter(tipo='MERMA').exists())
+
+    def test_producto_sin_lotes(self):
+        registrar_entrada(self.rapido, 5, self.usuario)
+        registrar_salida(self.rapido, 'VENTA', 5, self.usuario)
+        with self.assertRaises(StockInsuficiente):
+            registrar_salida(self.rapido, 'VENTA', 1, self.usuario)
+        self.rapido.refresh_from_db()
+        self.assertEqual(self.rapido.stock_actual, 0)
+
+
+class ReconciliacionStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('bodega')
+        cls.palta = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+        cls.pan = Producto.objects.create(codigo='200', nombre='Pan', precio_costo=100, precio_venta=150,
+                                          gestiona_lotes=False)
+        vence = timezone.localdate() + timedelta(days=10)
+        registrar_entrada(cls.palta, 10, cls.usuario, numero_lote='L1', fecha_vencimiento=vence)
+        registrar_salida(cls.palta, 'VENTA', 3, cls.usuario)
+        registrar_entrada(cls.pan, 20, cls.usuario)
+        registrar_salida(cls.pan, 'MERMA', 5, cls.usuario)
+
+    def reconciliar(self, *args):
+        salida = io.StringIO()
+        call_command('reconciliar_stock', *args, stdout=salida)
+        return salida.getvalue()
+
+    def stock(self, producto):
+        return Producto.objects.values_list('stock_actual', flat=True).get(pk=producto.pk)
+
+    def test_saldos_cuadrados(self):
+        self.assertEqual((self.stock(self.palta), self.stock(self.pan)), (7, 15))
+        self.assertEqual(reconciliar_saldos(), [])
+        self.assertIn('Saldos de stock cuadrados', self.reconciliar())
+
+    def test_recalcular_stock(self):
+        Producto.objects.filter(pk__in=[self.palta.pk, self.pan.pk]).update(stock_actual=99)
+        self.assertEqual((recalcular_stock(self.palta.pk), recalcular_stock(self.pan.pk)), (7, 15))
+        self.assertEqual((self.stock(self.palta), self.stock(self.pan)), (7, 15))
+
+    def test_comando_informa_y_corrige(self):
+        Producto.objects.filter(pk=self.palta.pk).update(stock_actual=4)
+        Producto.objects.filter(pk=self.pan.pk).update(stock_actual=18)
+
+        salida = self.reconciliar('--solo-reportar')
+        self.assertIn('100 Palta: registrado 4, calculado 7 (diferencia -3)', salida)
+        self.assertIn('200 Pan: registrado 18, calculado 15 (diferencia 3)', salida)
+        self.assertIn('2 saldos con diferencias', salida)
+        self.assertEqual((self.stock(self.palta), self.stock(self.pan)), (4, 18))
+
+        self.assertIn('2 saldos corregidos', self.reconciliar())
+        self.assertEqual((self.stock(self.palta), self.stock(self.pan)), (7, 15))
+        self.assertIn('Saldos de stock cuadrados', self.reconciliar())
+
+    def test_comando_avisa_lotes_descuadrados(self):
+        lote = Lote.objects.get(producto=self.palta)
+        Lote.objects.filter(pk=lote.pk).update(cantidad=9)
+        self.assertEqual([(l.pk, r, c) for l, r, c in diferencias_lotes()], [(lote.pk, 9, 7)])
+        self.assertIn(f'Lote #{lote.pk} (L1) de 100: cantidad 9, según movimientos 7', self.reconciliar())
+
+    def test_save_con_instancia_vieja_no_pisa_el_saldo(self):
+        vieja = Producto.objects.get(pk=self.pan.pk)
+        registrar_salida(self.pan, 'VENTA', 4, self.usuario)
+        vieja.nombre = 'Pan amasado'
+        vieja.save()
+        self.assertEqual(Producto.objects.values_list('nombre', 'stock_actual').get(pk=self.pan.pk),
+                         ('Pan amasado', 11))
+
+
+@mock.patch('bioapp.views.MOVIMIENTOS_POR_PAGINA', 4)
+class HistorialCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('gerente')
+        cls.pan = Producto.objects.create(codigo='200', nombre='Pan', precio_costo=100, precio_venta=150,
+                                          gestiona_lotes=False)
+        registrar_entrada(cls.pan, 100, cls.usuario)
+        for _ in range(10):
+            registrar_salida(cls.pan, 'VENTA', 1, cls.usuario)
+        registrar_salida(cls.pan, 'MERMA', 1, cls.usuario)
+        # Varios movimientos con la misma fecha: el id desempata.
+        ahora = timezone.now().replace(microsecond=0)
+        for i, pk in enumerate(Movimiento.objects.order_by('pk').values_list('pk', flat=True)):
+            Movimiento.objects.filter(pk=pk).update(fecha=ahora - timedelta(minutes=i // 3))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def pagina(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return [m.pk for m in respuesta.context['movimientos']], respuesta.context
+
+    def recorrer(self, url):
+        paginas = []
+        while url:
+            ids, contexto = self.pagina(url)
+            paginas.append(ids)
+            url = contexto['url_siguiente'] and '/gerencia/historial/' + contexto['url_siguiente']
+        return paginas
+
+    def test_siguientes_y_anteriores_con_fechas_iguales(self):
+        esperado = list(Movimiento.objects.order_by('-fecha', '-id').values_list('pk', flat=True))
+        paginas = self.recorrer('/gerencia/historial/')
+        self.assertEqual([pk for pagina in paginas for pk in pagina], esperado)
+        self.assertEqual([len(p) for p in paginas], [4, 4, 4])
+
+        # Desde la última página, "anterior" devuelve exactamente las mismas páginas.
+        _, contexto = self.pagina('/gerencia/historial/' + self.pagina('/gerencia/historial/')[1]['url_siguiente'])
+        _, contexto = self.pagina('/gerencia/historial/' + contexto['url_siguiente'])
+        self.assertIsNone(contexto['url_siguiente'])
+        atras = []
+        while contexto['url_anterior']:
+            ids, contexto = self.pagina('/gerencia/historial/' + contexto['url_anterior'])
+            atras.append(ids)
+        self.assertEqual(atras, paginas[:-1][::-1])
+
+    def test_filtros_se_mantienen_con_el_cursor(self):
+        ventas = list(Movimiento.objects.filter(tipo='VENTA').order_by('-fecha', '-id').values_list('pk', flat=True))
+        paginas = self.recorrer('/gerencia/historial/?tipo=VENTA')
+        self.assertEqual([pk for pagina in paginas for pk in pagina], ventas)
+        _, contexto = self.pagina('/gerencia/historial/?tipo=VENTA')
+        self.assertIn('tipo=VENTA', contexto['url_siguiente'])
+
+    def test_cursor_invalido_no_falla(self):
+        primera, _ = self.pagina('/gerencia/historial/')
+        for cursor in ('basura', '_', '2024-13-45T00:00:00_1', 'x_1', '2024-01-01T00:00:00_abc',
+                       '2024-01-01T00:00:00+00:00_99999999999999999999999', '2024-01-01_5'):
+            for parametro in ('antes', 'despues'):
+                respuesta = self.client.get('/gerencia/historial/', {parametro: cursor})
+                self.assertEqual(respuesta.status_code, 200, (parametro, cursor))
+        self.assertEqual(self.pagina('/gerencia/historial/?antes=basura')[0], primera)
+
+
+class RecorridoPorBloquesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('gerente')
+        cls.pan = Producto.objects.create(codigo='200', nombre='Pan', precio_costo=100, precio_venta=150,
+                                          gestiona_lotes=False)
+        total = 2 * TAMANO_BLOQUE + 5
+        Movimiento.objects.bulk_create(
+            Movimiento(producto=cls.pan, usuario=cls.usuario, tipo='VENTA', cantidad=1, precio_unitario_snapshot=150,
+                       total_movimiento=150)
+            for _ in range(total))
+        # Grupos de 600 con la misma fecha: los empates cruzan el borde de cada bloque.
+        ids = list(Movimiento.objects.order_by('pk').values_list('pk', flat=True))
+        ahora = timezone.now().replace(microsecond=0)
+        for n, inicio in enumerate(range(0, total, 600)):
+            Movimiento.objects.filter(pk__in=ids[inicio:inicio + 600]).update(fecha=ahora - timedelta(hours=n % 4))
+
+    def test_sin_repetir_ni_saltar_en_ambos_sentidos(self):
+        filas = Movimiento.objects.values_list('id', 'fecha', named=True)
+        for orden in (['-fecha', '-id'], ['fecha', 'id']):
+            esperado = list(Movimiento.objects.order_by(*orden).values_list('id', flat=True))
+            for tamano in (7, 600, TAMANO_BLOQUE):
+                recorrido = [f.id for f in recorrer_por_bloques(filas, orden, tamano=tamano)]
+                self.assertEqual(recorrido, esperado, (orden, tamano))
+
+    def test_csv_del_historial_con_mas_de_un_bloque(self):
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            contenido = b''.join(self.client.get('/gerencia/exportar/').streaming_content).decode('utf-8-sig')
+        ids = [int(linea.split(';')[0]) for linea in contenido.strip().splitlines()[1:]]
+        self.assertEqual(ids, list(Movimiento.objects.order_by('-fecha', '-id').values_list('id', flat=True)))
+        tabla = f"FROM {connection.ops.quote_name('bioapp_movimiento')}"
+        bloques = [q for q in consultas if tabla in q['sql']]
+        self.assertEqual(len(bloques), 3)
+
+    def test_ubicaciones_con_empates_en_el_nombre(self):
+        vence = timezone.localdate() + timedelta(days=30)
+        for nombre, lotes in (('Palta', 5), ('Manzana', 4), ('Palta', 3)):
+            producto = Producto.objects.create(codigo=f"{nombre}{lotes}", nombre=nombre, precio_costo=1,
+                                               precio_venta=2)
+            Lote.objects.bulk_create(Lote(producto=producto, numero_lote=f"{nombre}-{i}", cantidad=1,
+                                          fecha_vencimiento=vence) for i in range(lotes))
+        lotes = Lote.objects.values_list('id', 'producto__nombre', named=True)
+        esperado = list(Lote.objects.order_by('producto__nombre', 'id').values_list('id', flat=True))
+        for tamano in (1, 2, 4):
+            self.assertEqual([l.id for l in recorrer_por_bloques(lotes, ['producto__nombre', 'id'], tamano=tamano)],
+                             esperado)
+        self.assertEqual([fila[2] for fila in filas_ubicaciones()],
+                         list(Lote.objects.order_by('producto__nombre', 'id').values_list('numero_lote', flat=True)))
+
+
+class VencimientosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin')
+        cls.palta = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+        cls.manzana = Producto.objects.create(codigo='300', nombre='Manzana', precio_costo=200, precio_venta=350)
+        hoy = timezone.localdate()
+        for producto, dias, cantidad in ((cls.palta, -3, 4), (cls.palta, 0, 2), (cls.palta, 1, 5),
+                                         (cls.manzana, -1, 3)):
+            registrar_entrada(producto, cantidad, cls.usuario, numero_lote=f"L{dias}",
+                              fecha_vencimiento=hoy + timedelta(days=dias))
+        registrar_entrada(cls.palta, 2, cls.usuario, numero_lote='AGOTADO', fecha_vencimiento=hoy - timedelta(days=5))
+        # FIFO: la venta agota el lote ya vencido, que no debe volver a darse de baja.
+        registrar_salida(cls.palta, 'VENTA', 2, cls.usuario)
+
+    def stock(self):
+        return dict(Producto.objects.values_list('codigo', 'stock_actual'))
+
+    def test_baja_y_segunda_ejecucion_sin_efecto(self):
+        self.assertEqual(self.stock(), {'100': 11, '300': 3})
+        self.assertEqual(dar_de_baja_vencidos(self.usuario, tamano=2), {'lotes': 3, 'unidades': 9, 'valor': 3600})
+
+        mermas = Movimiento.objects.filter(tipo='MERMA')
+        self.assertEqual(sorted(mermas.values_list('lote__numero_lote', 'cantidad', 'total_movimiento')),
+                         [('L-1', 3, 600), ('L-3', 4, 2000), ('L0', 2, 1000)])
+        self.assertEqual(self.stock(), {'100': 5, '300': 0})
+        self.assertEqual(dict(Lote.objects.filter(cantidad__gt=0).values_list('numero_lote', 'cantidad')), {'L1': 5})
+        self.assertEqual(totales()['MERMA'], {'cantidad': 9, 'valor': 3600, 'movimientos': 3})
+        self.assertEqual(reconciliar_saldos(corregir=False), [])
+        self.assertEqual(diferencias_lotes(), [])
+
+        self.assertEqual(dar_de_baja_vencidos(self.usuario), {'lotes': 0, 'unidades': 0, 'valor': 0})
+        self.assertEqual(mermas.count(), 3)
+        self.assertEqual(self.stock(), {'100': 5, '300': 0})
+
+    def test_comando(self):
+        salida = io.StringIO()
+        call_command('procesar_vencimientos', stdout=salida)
+        self.assertIn('Se dieron de baja 3 lotes (9 unidades, $3600).', salida.getvalue())
+        self.assertEqual(set(Movimiento.objects.filter(tipo='MERMA').values_list('usuario', flat=True)),
+                         {self.usuario.pk})
+
+        salida = io.StringIO()
+        call_command('procesar_vencimientos', stdout=salida)
+        self.assertIn('No hay lotes vencidos pendientes de baja.', salida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('procesar_vencimientos', usuario='nadie')
+
+
+class ResumenDiarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('bodega')
+        cls.producto = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+
+    def filas(self):
+        return sorted(ResumenDiario.objects.values_list('fecha', 'producto_id', 'tipo', 'cantidad', 'valor', 'movimientos'))
+
+    def test_se_mantiene_al_registrar_y_coincide_con_la_reconstruccion(self):
+        registrar_entrada(self.producto, 10, self.usuario, fecha_vencimiento=timezone.localdate() + timedelta(days=3))
+        registrar_entrada(self.producto, 5, self.usuario, fecha_vencimiento=timezone.localdate() + timedelta(days=1))
+        registrar_salida(self.producto, 'VENTA', 12, self.usuario)
+
+        hoy = timezone.localdate()
+        incremental = self.filas()
+        self.assertEqual(incremental, [(hoy, self.producto.pk, 'ENTRADA', 15, 7500, 2),
+                                       (hoy, self.producto.pk, 'VENTA', 12, 10800, 2)])
+        reconstruir()
+        self.assertEqual(self.filas(), incremental)
+        self.assertEqual(totales(hoy)['VENTA']['valor'], 10800)
+        self.assertEqual(totales(hoy + timedelta(days=1))['VENTA']['valor'], 0)
+
+    def test_dashboard_lee_el_resumen(self):
+        gerente = User.objects.create_user('gerente')
+        gerente.groups.add(Group.objects.get(name='Gerente'))
+        self.client.force_login(gerente)
+        registrar_entrada(self.producto, 4, self.usuario, fecha_vencimiento=timezone.localdate())
+        registrar_salida(self.producto, 'MERMA', 1, self.usuario, observacion='golpeada')
+        respuesta = self.client.get('/gerencia/dashboard/', {'periodo': 'semana'})
+        self.assertEqual(respuesta.context['total_mermas'], 500)
+        serie = self.client.get('/gerencia/tendencia/', {'dias': 7}).json()
+        self.assertEqual(serie['series']['MERMA'][-1], 500)
+        self.assertEqual(len(serie['fechas']), 7)
+
+
+class KpisOperativosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_bodega')
+        cls.usuario.groups.add(Group.objects.get(name='Administrador'))
+        cls.contenedor = Contenedor.objects.create(nombre='B1', lugar=Lugar.objects.create(nombre='Cámara'))
+        Contenedor.objects.create(nombre='B2', lugar=cls.contenedor.lugar)
+        cls.producto = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_cachea_y_se_invalida_con_movimientos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_entrada(self.producto, 5, self.usuario, fecha_vencimiento=timezone.localdate() + timedelta(days=3),
+                              contenedor=self.contenedor)
+        respuesta = self.client.get('/administracion/dashboard/')
+        self.assertEqual((respuesta.context['lotes_por_vencer'], respuesta.context['ocupacion'],
+                          respuesta.context['movimientos_hoy']), (1, 50, 1))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/administracion/dashboard/')
+        self.assertFalse([q for q in consultas if 'bioapp_' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_salida(self.producto, 'VENTA', 5, self.usuario)
+        respuesta = self.client.get('/administracion/dashboard/')
+        self.assertEqual((respuesta.context['lotes_por_vencer'], respuesta.context['ocupacion'],
+                          respuesta.context['movimientos_hoy']), (0, 0, 2))
+
+
+class CodigoBarrasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('bodega')
+        cls.usuario.groups.add(Group.objects.get(name='Bodeguero'))
+        cls.producto = Producto.objects.create(codigo='780100', nombre='Pan', precio_costo=100, precio_venta=150,
+                                               gestiona_lotes=False)
+
+    def setUp(self):
+        cache.clear()
+        _recientes.clear()
+
+    def test_resuelve_una_vez_y_se_invalida_al_guardar(self):
+        self.assertEqual(producto_por_codigo('780100').precio_venta, 150)
+        self.assertIsNone(producto_por_codigo('999'))
+        with self.assertNumQueries(0):
+            self.assertEqual(producto_por_codigo('780100').pk, self.producto.pk)
+            self.assertIsNone(producto_por_codigo('999'))
+        self.producto.precio_venta = 170
+        self.producto.save()
+        self.assertEqual(producto_por_codigo('780100').precio_venta, 170)
+
+    def test_memoria_del_proceso_caduca(self):
+        # Cambio hecho por otro worker con su propio LocMem: la versión de este
+        # no se mueve y solo caduca el snapshot.
+        reloj = mock.Mock()
+        with mock.patch('bioapp.codigos.time', reloj):
+            reloj.monotonic.return_value = 100
+            self.assertEqual(producto_por_codigo('780100').precio_venta, 150)
+            Producto.objects.filter(pk=self.producto.pk).update(precio_venta=170)
+            cache.delete(f"bioapp:codigo:{version('productos')}:780100")
+            self.assertEqual(producto_por_codigo('780100').precio_venta, 150)
+            reloj.monotonic.return_value = 100 + SEGUNDOS_EN_MEMORIA + 1
+            self.assertEqual(producto_por_codigo('780100').precio_venta, 170)
+
+    def test_escaneo_no_consulta_el_producto(self):
+        self.client.force_login(self.usuario)
+        datos = {'codigo_barra': '780100', 'tipo': 'ENTRADA', 'cantidad': 3}
+        self.client.post('/bodega/movimiento/', datos)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post('/bodega/movimiento/', datos)
+        self.assertFalse([q for q in consultas if q['sql'].startswith('SELECT') and 'bioapp_producto' in q['sql']])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 6)
+
+    def test_producto_manual_invalido_es_error_del_formulario(self):
+        self.client.force_login(self.usuario)
+        for valor in ('abc', '999999'):
+            respuesta = self.client.post('/bodega/movimiento/', {'producto_manual': valor, 'tipo': 'ENTRADA',
+                                                                 'cantidad': 3})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertTrue(respuesta.context['form'].errors)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual, 0)
+
+
+class TicketAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('caja')
+        contenedor = Contenedor.objects.create(nombre='B1', lugar=Lugar.objects.create(nombre='Sala'))
+        cls.productos = []
+        for i in range(12):
+            producto = Producto.objects.create(codigo=f"T{i}", nombre=f"Producto {i}", precio_costo=100,
+                                               precio_venta=250, gestiona_lotes=i % 3 != 0)
+            for dias in (3, 8):
+                registrar_entrada(producto, 5, cls.usuario, numero_lote=f"L{dias}", contenedor=contenedor,
+                                  fecha_vencimiento=timezone.localdate() + timedelta(days=dias))
+            cls.productos.append(producto)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def enviar(self, lineas, **extra):
+        return self.client.post('/api/ticket/', {'lineas': lineas, **extra}, content_type='application/json')
+
+    def test_resultados_por_linea(self):
+        respuesta = self.enviar([
+            {'codigo': 'T1', 'tipo': 'VENTA', 'cantidad': 7},
+            {'codigo': 'T1', 'tipo': 'VENTA', 'cantidad': 4},
+            {'codigo': 'NOEXISTE', 'tipo': 'VENTA', 'cantidad': 1},
+            {'codigo': 'T2', 'tipo': 'MERMA', 'cantidad': 1},
+            {'codigo': 'T3', 'tipo': 'VENTA', 'cantidad': 2},
+        ])
+        self.assertEqual(respuesta.status_code, 200)
+        lineas = respuesta.json()['lineas']
+        self.assertEqual([l['ok'] for l in lineas], [True, False, False, False, True])
+        self.assertEqual(lineas[0]['total'], 7 * 250)
+        self.assertEqual([l['cantidad'] for l in lineas[0]['lotes']], [5, 2])
+        self.assertEqual(lineas[1]['disponible'], 3)
+        self.assertEqual(Producto.objects.get(codigo='T1').stock_actual, 3)
+        self.assertEqual(Producto.objects.get(codigo='T3').stock_actual, 8)
+
+    def test_consultas_constantes(self):
+        def ticket(n):
+            return [{'codigo': p.codigo, 'tipo': 'VENTA', 'cantidad': 1} for p in self.productos[:n]]
+        with CaptureQueriesContext(connection) as corto:
+            self.enviar(ticket(3))
+        with CaptureQueriesContext(connection) as largo:
+            self.enviar(ticket(12))
+        self.assertEqual(len(corto), len(largo))
+
+    def test_ticket_vacio(self):
+        self.assertEqual(self.enviar([]).status_code, 400)
+
+
+class RolesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana')
+        self.usuario.groups.add(Group.objects.get(name='Bodeguero'))
+
+    def test_grupos_se_consultan_una_vez(self):
+        self.client.force_login(self.usuario)
+        self.client.get('/bodega/dashboard/')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/bodega/dashboard/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse([q for q in consultas if 'auth_group' in q['sql']])
+
+    def test_cambio_de_grupo_invalida_el_cache(self):
+        self.assertTrue(roles_de(User.objects.get(pk=self.usuario.pk)).es_bodeguero)
+        self.usuario.groups.clear()
+        self.usuario.groups.add(Group.objects.get(name='Gerente'))
+        roles = roles_de(User.objects.get(pk=self.usuario.pk))
+        self.assertFalse(roles.es_bodeguero)
+        self.assertTrue(roles.es_gerente)
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_bodega')
+        cls.admin.groups.add(Group.objects.get(name='Administrador'))
+        cls.camara = Lugar.objects.create(nombre='Cámara Fría')
+        cls.palta = Producto.objects.create(codigo='780-100', nombre='Palta Hass', precio_costo=500, precio_venta=900)
+        cls.pan = Producto.objects.create(codigo='780-200', nombre='Pan amasado', precio_costo=100, precio_venta=150)
+        Lote.objects.create(producto=cls.palta, numero_lote='L-2025-07', cantidad=5,
+                            fecha_vencimiento=timezone.localdate(),
+                            contenedor=Contenedor.objects.create(nombre='Rack 3', lugar=cls.camara))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def autocompletar(self, q, tipo='producto'):
+        return self.client.get('/api/buscar/', {'q': q, 'tipo': tipo}).json()['resultados']
+
+    def test_prefijo_sin_tildes_ni_mayusculas(self):
+        self.assertEqual([r['id'] for r in self.autocompletar('PAL')], [self.palta.pk])
+        self.assertEqual(len(self.autocompletar('camara', 'lugar')), 1)
+
+    def test_codigo_completo_y_por_partes(self):
+        self.assertEqual([r['id'] for r in self.autocompletar('780-2')], [self.pan.pk])
+        self.assertEqual(len(self.autocompletar('780')), 2)
+
+    def test_todas_las_palabras_deben_coincidir(self):
+        self.assertEqual([r['id'] for r in self.autocompletar('pa has')], [self.palta.pk])
+        self.assertEqual(self.autocompletar('pan hass'), [])
+
+    def test_indice_sigue_los_cambios(self):
+        self.pan.nombre = 'Marraqueta'
+        self.pan.save()
+        self.assertEqual(self.autocompletar('pan'), [])
+        self.assertEqual(len(self.autocompletar('marra')), 1)
+        self.pan.delete()
+        self.assertEqual(self.autocompletar('marra'), [])
+
+    def test_paginado_y_cacheado(self):
+        for i in range(25):
+            Producto.objects.create(codigo=f"P{i:02d}", nombre=f"Pera {i:02d}", precio_costo=1, precio_venta=2)
+        primera = self.client.get('/api/buscar/', {'q': 'pera'}).json()
+        segunda = self.client.get('/api/buscar/', {'q': 'pera', 'pagina': 2}).json()
+        self.assertEqual((len(primera['resultados']), primera['mas']), (20, True))
+        self.assertEqual((len(segunda['resultados']), segunda['mas']), (5, False))
+        with self.assertNumQueries(2):  # solo sesión y usuario
+            self.client.get('/api/buscar/', {'q': 'pera'})
+        Producto.objects.create(codigo='P99', nombre='Pera 99', precio_costo=1, precio_venta=2)
+        self.assertEqual(len(self.client.get('/api/buscar/', {'q': 'pera', 'pagina': 2}).json()['resultados']), 6)
+
+    def test_guardar_un_lote_no_invalida_otros_tipos(self):
+        self.autocompletar('pal')
+        self.autocompletar('rack', 'contenedor')
+        lote = Lote.objects.get()
+        lote.cantidad = 4
+        lote.save()
+        with self.assertNumQueries(4):
+            self.autocompletar('pal')
+            self.autocompletar('rack', 'contenedor')
+        self.pan.nombre = 'Pan batido'
+        self.pan.save()
+        self.assertEqual([r['texto'] for r in self.autocompletar('l-2025', 'lote')], ['L-2025-07 (Palta Hass)'])
+        self.palta.nombre = 'Palta Negra'
+        self.palta.save()
+        self.assertEqual([r['texto'] for r in self.autocompletar('l-2025', 'lote')], ['L-2025-07 (Palta Negra)'])
+
+    def test_formulario_no_dibuja_el_catalogo(self):
+        bodeguero = User.objects.create_user('bodeguero')
+        bodeguero.groups.add(Group.objects.get(name='Bodeguero'))
+        self.client.force_login(bodeguero)
+        respuesta = self.client.get('/bodega/movimiento/')
+        self.assertNotContains(respuesta, 'Palta Hass')
+
+    def test_reporte_ubicaciones_busca_por_lugar_y_lote(self):
+        for texto in ('fria', 'l-2025', 'rack palta'):
+            respuesta = self.client.get('/administracion/reporte-ubicaciones/', {'buscar': texto})
+            self.assertEqual(len(respuesta.context['lotes']), 1, texto)
+
+
+class ContenedoresPorLugarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('bodega')
+        self.client.force_login(self.usuario)
+        self.camara = Lugar.objects.create(nombre='Cámara')
+        Contenedor.objects.create(nombre='B1', lugar=self.camara)
+        Lugar.objects.create(nombre='Patio')
+
+    def test_agrupa_por_lugar(self):
+        datos = self.client.get('/api/contenedores/').json()
+        self.assertEqual([(l['nombre'], [c['nombre'] for c in l['contenedores']]) for l in datos['lugares']],
+                         [('Cámara', ['B1']), ('Patio', [])])
+
+    def test_revalidacion_y_cambios(self):
+        etag = self.client.get('/api/contenedores/')['ETag']
+        with self.assertNumQueries(2):  # solo sesión y usuario
+            respuesta = self.client.get('/api/contenedores/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+        form = ContenedorForm({'nombre': 'B2', 'lugar': self.camara.pk})
+        self.assertTrue(form.is_valid())
+        form.save()
+        respuesta = self.client.get('/api/contenedores/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['lugares'][0]['contenedores']), 2)
+
+    def test_etag_depende_de_los_datos_y_no_del_contador(self):
+        etag = self.client.get('/api/contenedores/')['ETag']
+        # Reinicio del proceso o caché desalojada: el contador vuelve a empezar.
+        cache.clear()
+        self.assertEqual(self.client.get('/api/contenedores/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Contenedor.objects.filter(lugar=self.camara).update(nombre='B9')
+        cache.clear()
+        respuesta = self.client.get('/api/contenedores/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+
+class VersionesTests(SimpleTestCase):
+    def test_desalojar_el_contador_no_repite_versiones(self):
+        cache.clear()
+        vistas = {version('prueba')}
+        nueva_version('prueba')
+        vistas.add(version('prueba'))
+        cache.clear()  # la caché desaloja el contador
+        self.assertNotIn(version('prueba'), vistas)
+        vistas.add(version('prueba'))
+        cache.clear()
+        nueva_version('prueba')
+        self.assertNotIn(version('prueba'), vistas)
+
+
+@skipUnless(connection.features.has_select_for_update, "Requiere bloqueo de filas (MySQL/MariaDB).")
+class VentasConcurrentesTests(TransactionTestCase):
+    HILOS = 8
+    VENTAS_POR_HILO = 25
+
+    def test_ventas_simultaneas_no_sobrevenden(self):
+        usuario = User.objects.create_user('caja')
+        contenedor = Contenedor.objects.create(nombre='B1', lugar=Lugar.objects.create(nombre='Sala'))
+        producto = Producto.objects.create(codigo='300', nombre='Manzana', precio_costo=100, precio_venta=200)
+        for dias in range(10):
+            registrar_entrada(producto, 15, usuario, numero_lote=f"L{dias}",
+                              fecha_vencimiento=timezone.localdate() + timedelta(days=dias), contenedor=contenedor)
+        stock_inicial = 150
+
+        vendidas, rechazadas = [], []
+        inicio = threading.Barrier(self.HILOS)
+
+        def caja():
+            inicio.wait()
+            try:
+                for _ in range(self.VENTAS_POR_HILO):
+                    try:
+                        registrar_salida(producto, 'VENTA', 1, usuario)
+                        vendidas.append(1)
+                    except StockInsuficiente:
+                        rechazadas.append(1)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=caja) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        total = self.HILOS * self.VENTAS_POR_HILO
+        self.assertEqual(len(vendidas), stock_inicial)
+        self.assertEqual(len(rechazadas), total - stock_inicial)
+        self.assertFalse(Lote.objects.filter(cantidad__lt=0).exists())
+        self.assertEqual(sum(Lote.objects.values_list('cantidad', flat=True)), 0)
+        self.assertEqual(sum(Movimiento.objects.filter(tipo='VENTA').values_list('cantidad', flat=True)), stock_inicial)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 0)
+
+
+class DatosSinteticosTests(TestCase):
+    def test_genera_historia_consistente(self):
+        creados = generar(productos=30, lugares=2, contenedores=6, movimientos=2000, dias=30, semilla=7)
+        self.assertEqual(Producto.objects.count(), 30)
+        self.assertEqual(Contenedor.objects.count(), 6)
+        self.assertEqual(Movimiento.objects.count(), creados['movimientos'])
+        self.assertGreaterEqual(creados['movimientos'], 2000)
+        self.assertEqual(reconciliar_saldos(corregir=False), [])
+        self.assertEqual(diferencias_lotes(), [])
+        # Lo vencido antes del último día simulado ya se dio de baja.
+        ayer = timezone.localdate() - timedelta(days=1)
+        self.assertFalse(Lote.objects.filter(cantidad__gt=0, fecha_vencimiento__lt=ayer).exists())
+        self.assertTrue(Movimiento.objects.filter(tipo='MERMA', observacion__startswith='BAJA AUTOMÁTICA').exists())
+        # Popularidad sesgada: el producto más vendido vende mucho más que la mediana.
+        ventas = sorted(Movimiento.objects.filter(tipo='VENTA').values('producto').annotate(n=Count('id'))
+                        .values_list('n', flat=True))
+        self.assertGreater(ventas[-1], 5 * ventas[len(ventas) // 2])
+        self.assertEqual(sum(ResumenDiario.objects.values_list('movimientos', flat=True)), creados['movimientos'])
+        # Las fechas son las simuladas, sin tocar auto_now_add de los modelos.
+        hoy = timezone.localdate()
+        fechas = Movimiento.objects.aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        self.assertEqual(timezone.localtime(fechas['primera']).date(), hoy - timedelta(days=30))
+        self.assertLess(timezone.localtime(fechas['ultima']).date(), hoy)
+        self.assertFalse(Lote.objects.filter(fecha_ingreso__date__gte=hoy).exists())
+        self.assertTrue(Movimiento._meta.get_field('fecha').auto_now_add)
+        nuevo = registrar_entrada(Producto.objects.first(), 1, User.objects.create_user('caja'),
+                                  fecha_vencimiento=hoy + timedelta(days=5))
+        self.assertEqual(timezone.localtime(nuevo.fecha).date(), hoy)
+
+
+class BenchmarkVistasTests(TransactionTestCase):
+    def test_informe_json(self):
+        User.objects.create_superuser('bench')
+        generar(productos=10, lugares=1, contenedores=2, movimientos=200, dias=10)
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'informe.json')
+            call_command('benchmark_vistas', hilos=2, solicitudes=3, solicitudes_exportacion=1,
+                         vistas=['catalogo', 'exportar_historial'], salida=salida, stdout=io.StringIO())
+            with open(salida, encoding='utf-8') as f:
+                informe = json.load(f)
+        self.assertEqual(informe['datos']['producto'], 10)
+        self.assertEqual(set(informe['vistas']), {'catalogo', 'exportar_historial'})
+        catalogo = informe['vistas']['catalogo']
+        self.assertEqual((catalogo['solicitudes'], catalogo['errores']), (3, 0))
+        self.assertLessEqual(catalogo['p50_ms'], catalogo['p95_ms'])
+        self.assertGreater(catalogo['consultas_max'], 0)
+
+
+class PanelesAsyncTests(TransactionTestCase):
+    def test_consultas_en_hilos_del_pool(self):
+        def hilo():
+            return threading.current_thread().name
+
+        resultado = async_to_sync(en_paralelo)({'a': hilo, 'b': hilo})
+        self.assertTrue(all(nombre.startswith('panel') for nombre in resultado.values()))
+        with transaction.atomic():
+            resultado = async_to_sync(en_paralelo)({'a': hilo})
+        self.assertFalse(resultado['a'].startswith('panel'))
+
+    def test_benchmark_paneles(self):
+        User.objects.create_superuser('bench')
+        generar(productos=10, lugares=1, contenedores=2, movimientos=200, dias=10)
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'paneles.json')
+            call_command('benchmark_paneles', solicitudes=2, salida=salida, stdout=io.StringIO())
+            with open(salida, encoding='utf-8') as f:
+                informe = json.load(f)
+        self.assertEqual(set(informe['paneles']), {'dashboard_gerencia', 'dashboard_operativo'})
+        for modos in informe['paneles'].values():
+            self.assertEqual(set(modos), {'wsgi_serie', 'asgi_serie', 'asgi_paralelo'})
+
+
+class PanelesParalelosTests(TransactionTestCase):
+    """Fuera de TestCase no hay transacción abierta y en_paralelo usa de verdad el pool."""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('gerente')
+        generar(productos=15, lugares=2, contenedores=4, movimientos=300, dias=20, semilla=3)
+        self.client.force_login(self.usuario)
+        for metrica in metricas._REGISTRO:
+            metrica.limpiar()
+
+    def contexto(self, url, paralelo):
+        cache.clear()
+        with override_settings(PANELES_EN_PARALELO=paralelo), \
+                mock.patch.object(concurrente, '_en_hilo', wraps=concurrente._en_hilo) as en_hilo:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(en_hilo.called, paralelo)
+        return respuesta.context
+
+    def test_mismo_contexto_en_serie_y_en_paralelo(self):
+        for url, claves in (('/gerencia/dashboard/', ['productos_bajo_stock', 'total_ventas', 'total_mermas',
+                                                      'ganancia_neta', 'ultimos_colaboradores']),
+                            ('/administracion/dashboard/', list(kpis_operativos()))):
+            serie, paralelo = self.contexto(url, False), self.contexto(url, True)
+            for clave in claves:
+                self.assertEqual(paralelo[clave], serie[clave], f"{url} {clave}")
+
+    def test_metricas_cuentan_las_consultas_de_los_hilos(self):
+        self.contexto('/gerencia/dashboard/', False)
+        serie = metricas.CONSULTAS_SQL._valores[('dashboard_gerencia',)][1]
+        metricas.CONSULTAS_SQL.limpiar()
+        self.contexto('/gerencia/dashboard/', True)
+        self.assertEqual(metricas.CONSULTAS_SQL._valores[('dashboard_gerencia',)][1], serie)
+
+    def test_benchmark_cuenta_las_consultas_de_los_hilos(self):
+        conteos = []
+        for paralelo in (False, True):
+            cache.clear()
+            with override_settings(PANELES_EN_PARALELO=paralelo):
+                estado, _, consultas = benchmark_vistas._pedir(self.client, '/gerencia/dashboard/', {})
+            self.assertEqual(estado, 200)
+            conteos.append(consultas)
+        self.assertEqual(conteos[1], conteos[0])
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff')
+        cls.bodeguero = User.objects.create_user('bodega')
+        cls.bodeguero.groups.add(Group.objects.get(name='Bodeguero'))
+        cls.contenedor = Contenedor.objects.create(nombre='B1', lugar=Lugar.objects.create(nombre='Cámara'))
+        cls.producto = Producto.objects.create(codigo='900', nombre='Palta', precio_costo=500, precio_venta=900)
+
+    def setUp(self):
+        for metrica in metricas._REGISTRO:
+            metrica.limpiar()
+
+    def entrada(self, cantidad, dias):
+        registrar_entrada(self.producto, cantidad, self.staff, numero_lote=f"L{dias}",
+                          fecha_vencimiento=timezone.localdate() + timedelta(days=dias), contenedor=self.contenedor)
+
+    def test_solo_staff_o_token(self):
+        self.assertEqual(self.client.get('/metricas/').status_code, 403)
+        self.client.force_login(self.bodeguero)
+        self.assertEqual(self.client.get('/metricas/').status_code, 403)
+        self.client.logout()
+        with override_settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metricas/', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+            respuesta = self.client.get('/metricas/', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_latencia_y_sql_por_vista(self):
+        self.client.force_login(self.staff)
+        self.client.get('/administracion/catalogo/')
+        b''.join(self.client.get('/gerencia/exportar/').streaming_content)
+        texto = self.client.get('/metricas/').content.decode()
+        self.assertIn('bioapp_http_duracion_segundos_count{vista="catalogo",metodo="GET"} 1', texto)
+        self.assertIn('bioapp_http_solicitudes_total{vista="catalogo",metodo="GET",estado="200"} 1', texto)
+        self.assertIn('bioapp_http_duracion_segundos_bucket{vista="catalogo",metodo="GET",le="+Inf"} 1', texto)
+        self.assertEqual(metricas.CONSULTAS_SQL.total(vista='exportar_historial'), 1)
+        self.assertGreater(metricas.TAMANO_RESPUESTA._valores[('exportar_historial',)][1], 0)
+        self.assertGreater(metricas.CONSULTAS_SQL._valores[('catalogo',)][1], 0)
+
+    def test_contadores_de_negocio(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entrada(4, 2)
+            self.entrada(10, 9)
+            self.entrada(3, -1)
+        with self.captureOnCommitCallbacks(execute=True):
+            dar_de_baja_vencidos(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_salida(self.producto, 'VENTA', 6, self.staff)
+        self.assertEqual(metricas.MOVIMIENTOS.valor(tipo='ENTRADA'), 3)
+        self.assertEqual(metricas.MOVIMIENTOS.valor(tipo='MERMA'), 1)
+        self.assertEqual(metricas.MOVIMIENTOS.valor(tipo='VENTA'), 2)
+        self.assertEqual(metricas.LOTES_DADOS_DE_BAJA.valor(), 1)
+        self.assertEqual(metricas.UNIDADES_DADAS_DE_BAJA.valor(), 3)
+        self.assertIn('bioapp_lotes_por_salida_bucket{tipo="VENTA",le="2"} 1', metricas.exponer())
+
+    def test_transaccion_revertida_no_cuenta(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(StockInsuficiente), transaction.atomic():
+                self.entrada(2, 5)
+                registrar_salida(self.producto, 'VENTA', 3, self.staff)
+        self.assertEqual(metricas.MOVIMIENTOS.valor(tipo='ENTRADA'), 0)
+
+
+class ArchivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('gerente')
+        cls.palta = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+        cls.pan = Producto.objects.create(codigo='200', nombre='Pan', precio_costo=100, precio_venta=150,
+                                          gestiona_lotes=False)
+        hoy = timezone.localdate()
+        registrar_entrada(cls.palta, 10, cls.usuario, numero_lote='L1', fecha_vencimiento=hoy + timedelta(days=5))
+        registrar_entrada(cls.pan, 20, cls.usuario)
+        registrar_salida(cls.pan, 'VENTA', 8, cls.usuario)
+        registrar_salida(cls.palta, 'VENTA', 3, cls.usuario)
+        # Los primeros tres movimientos quedan de hace 400 días.
+        antiguos = list(Movimiento.objects.order_by('pk').values_list('pk', flat=True)[:3])
+        Movimiento.objects.filter(pk__in=antiguos).update(fecha=timezone.now() - timedelta(days=400))
+        reconstruir()
+        registrar_salida(cls.pan, 'MERMA', 2, cls.usuario)
+
+    def test_archiva_y_deja_saldo_inicial(self):
+        antes_totales = totales()
+        antes_huella = huella_datos('HISTORIAL')
+        self.assertEqual(archivar(tamano=2), 3)
+        self.assertEqual(Movimiento.objects.count(), 2)
+        self.assertEqual(MovimientoArchivado.objects.count(), 3)
+        self.assertEqual(archivar(), 0)
+
+        saldo = SaldoInicial.objects.get(producto=self.pan)
+        self.assertEqual((saldo.entradas, saldo.salidas, saldo.movimientos), (20, 8, 2))
+        self.assertEqual(reconciliar_saldos(corregir=False), [])
+        self.assertEqual(diferencias_lotes(), [])
+        self.assertEqual(totales(), antes_totales)
+        self.assertEqual(huella_datos('HISTORIAL'), antes_huella)
+
+        # El resumen se rehace igual con lo archivado y las salidas siguen funcionando.
+        reconstruir()
+        self.assertEqual(totales(), antes_totales)
+        registrar_salida(self.pan, 'VENTA', 10, self.usuario)
+        with self.assertRaises(StockInsuficiente):
+            registrar_salida(self.pan, 'VENTA', 1, self.usuario)
+        self.assertEqual(reconciliar_saldos(corregir=False), [])
+
+    def test_lotes_con_entrada_archivada_siguen_controlados(self):
+        lote = Lote.objects.get(producto=self.palta)
+        archivar()
+        self.assertTrue(MovimientoArchivado.objects.filter(lote=lote, tipo='ENTRADA').exists())
+        self.assertEqual(diferencias_lotes(), [])
+        Lote.objects.filter(pk=lote.pk).update(cantidad=99)
+        self.assertEqual([(l.pk, r, c) for l, r, c in diferencias_lotes()], [(lote.pk, 99, 7)])
+
+    def test_archivar_no_emite_senales_ni_cambia_las_exportaciones(self):
+        huella = huella_datos('HISTORIAL')
+        with mock.patch('bioapp.signals.invalidar_operativo') as invalidar:
+            archivar()
+        invalidar.assert_not_called()
+        self.assertEqual(huella_datos('HISTORIAL'), huella)
+
+    def test_exportacion_incluye_lo_archivado(self):
+        archivar()
+        self.client.force_login(self.usuario)
+        contenido = b''.join(self.client.get('/gerencia/exportar/').streaming_content).decode('utf-8-sig')
+        lineas = contenido.strip().splitlines()
+        self.assertEqual(len(lineas), 1 + 5)
+        ids = [int(linea.split(';')[0]) for linea in lineas[1:]]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+
+class AlertaVencimientoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin')
+        cls.palta = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+        cls.pan = Producto.objects.create(codigo='200', nombre='Pan', precio_costo=100, precio_venta=150,
+                                          gestiona_lotes=False)
+        hoy = timezone.localdate()
+        for dias in (-1, 0, 3, 7, 8, 30):
+            Lote.objects.create(producto=cls.palta, numero_lote=f"L{dias}", cantidad=5,
+                                fecha_vencimiento=hoy + timedelta(days=dias))
+        Lote.objects.create(producto=cls.palta, numero_lote='AGOTADO', cantidad=0,
+                            fecha_vencimiento=hoy - timedelta(days=5))
+
+    def test_case_sql_coincide_con_la_propiedad(self):
+        anotados = {l.numero_lote: l.alerta for l in Lote.objects.con_alerta()}
+        calculados = {l.numero_lote: l.estado_alerta for l in Lote.objects.all()}
+        self.assertEqual(anotados, calculados)
+        self.assertEqual(anotados['L7'], 'CRITICO')
+        self.assertEqual(anotados['L8'], 'OK')
+
+    def test_filtrar_y_contar_por_estado(self):
+        activos = Lote.objects.activos()
+        self.assertEqual(activos.conteo_por_alerta(), {'VENCIDO': 1, 'HOY': 1, 'CRITICO': 2, 'OK': 2})
+        self.assertEqual(sorted(activos.en_alerta('VENCIDO', 'HOY').values_list('numero_lote', flat=True)),
+                         ['L-1', 'L0'])
+
+    def test_primer_vencimiento_en_la_misma_consulta(self):
+        with self.assertNumQueries(1):
+            productos = {p.codigo: p.proximo_vencimiento for p in Producto.objects.con_proximo_vencimiento()}
+        self.assertEqual(productos, {'100': timezone.localdate() - timedelta(days=1), '200': None})
+
+    def test_reporte_filtra_por_estado(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get('/administracion/reporte-ubicaciones/', {'alerta': 'CRITICO'})
+        self.assertEqual([l.numero_lote for l in respuesta.context['lotes']], ['L3', 'L7'])
+        self.assertIn(('CRITICO', 'Próximos 7 días', 2), respuesta.context['alertas'])
+
+
+class OcupacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin')
+        cls.camara = Lugar.objects.create(nombre='Cámara')
+        cls.patio = Lugar.objects.create(nombre='Patio')
+        cls.b1 = Contenedor.objects.create(nombre='B1', lugar=cls.camara)
+        cls.b2 = Contenedor.objects.create(nombre='B2', lugar=cls.camara)
+        Contenedor.objects.create(nombre='B3', lugar=cls.camara)
+        cls.palta = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+        hoy = timezone.localdate()
+        for contenedor, cantidad, dias in ((cls.b1, 10, -2), (cls.b1, 30, 20), (cls.b2, 5, 3), (None, 7, 1)):
+            Lote.objects.create(producto=cls.palta, contenedor=contenedor, cantidad=cantidad,
+                                fecha_vencimiento=hoy + timedelta(days=dias))
+        Lote.objects.create(producto=cls.palta, contenedor=cls.b2, cantidad=0, fecha_vencimiento=hoy)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_agregados_por_contenedor_y_lugar(self):
+        hoy = timezone.localdate()
+        with self.assertNumQueries(1):
+            mapa = mapa_ocupacion()
+        self.assertEqual(mapa['contenedores'][self.b1.pk], {
+            'lotes': 2, 'unidades': 40, 'primer_vencimiento': hoy - timedelta(days=2), 'vencidos': 1})
+        self.assertEqual(mapa['contenedores'][self.b2.pk]['unidades'], 5)
+        self.assertEqual(mapa['lugares'][self.camara.pk], {
+            'contenedores_ocupados': 2, 'lotes': 3, 'unidades': 45,
+            'primer_vencimiento': hoy - timedelta(days=2), 'vencidos': 1})
+        self.assertNotIn(self.patio.pk, mapa['lugares'])
+        with self.assertNumQueries(0):
+            mapa_ocupacion()
+
+    def test_se_invalida_con_movimientos(self):
+        mapa_ocupacion()
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_salida(self.palta, 'VENTA', 12, self.usuario)
+        self.assertEqual(mapa_ocupacion()['contenedores'][self.b1.pk]['unidades'], 30)
+
+    def test_mapa_de_calor_en_consultas_constantes(self):
+        respuesta = self.client.get(f'/mapa/lugar/{self.camara.pk}/')
+        niveles = {c.nombre: (c.ocupacion['nivel'], c.ocupacion['alerta']) for c in respuesta.context['contenedores']}
+        self.assertEqual(niveles, {'B1': (4, 'VENCIDO'), 'B2': (1, 'CRITICO'), 'B3': (0, None)})
+        respuesta = self.client.get('/mapa/')
+        lugares = {l.nombre: l.ocupacion['porcentaje'] for l in respuesta.context['lugares']}
+        self.assertEqual(lugares, {'Cámara': 66, 'Patio': 0})
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as antes:
+            self.client.get(f'/mapa/lugar/{self.camara.pk}/')
+        Contenedor.objects.bulk_create([Contenedor(nombre=f'X{i}', lugar=self.camara) for i in range(20)])
+        Lote.objects.bulk_create([Lote(producto=self.palta, contenedor=c, cantidad=1,
+                                       fecha_vencimiento=timezone.localdate())
+                                  for c in Contenedor.objects.filter(nombre__startswith='X')])
+        cache.clear()
+        with CaptureQueriesContext(connection) as despues:
+            self.client.get(f'/mapa/lugar/{self.camara.pk}/')
+        self.assertEqual(len(antes), len(despues))
+
+
+class _ConexionFalsa:
+    def __init__(self):
+        self.cerrada = False
+        self.rollbacks = 0
+        self.viva = True
+
+    def ping(self):
+        if not self.viva:
+            raise OSError("conexión perdida")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.cerrada = True
+
+
+class PoolConexionesTests(SimpleTestCase):
+    def test_reutiliza_y_deshace_al_devolver(self):
+        pool = PoolConexiones('prueba', tamano=2)
+        primera = pool.tomar(_ConexionFalsa)
+        pool.devolver(primera)
+        self.assertEqual(primera.rollbacks, 1)
+        self.assertIs(pool.tomar(_ConexionFalsa), primera)
+        self.assertEqual(pool.estado(), {'abiertas': 1, 'en_uso': 1, 'libres': 0})
+
+    def test_acotado_espera_y_se_agota(self):
+        pool = PoolConexiones('prueba', tamano=1, espera=0.05)
+        conexion = pool.tomar(_ConexionFalsa)
+        with self.assertRaises(PoolAgotado):
+            pool.tomar(_ConexionFalsa)
+        threading.Timer(0.01, pool.devolver, args=(conexion,)).start()
+        pool.espera = 1
+        self.assertIs(pool.tomar(_ConexionFalsa), conexion)
+
+    def test_descarta_las_que_no_responden_o_vencieron(self):
+        pool = PoolConexiones('prueba', tamano=2, vida_maxima=60)
+        muerta = pool.tomar(_ConexionFalsa)
+        pool.devolver(muerta)
+        muerta.viva = False
+        nueva = pool.tomar(_ConexionFalsa)
+        self.assertIsNot(nueva, muerta)
+        self.assertTrue(muerta.cerrada)
+
+        pool.vida_maxima = 0
+        pool.devolver(nueva)
+        self.assertTrue(nueva.cerrada)
+        self.assertEqual(pool.estado(), {'abiertas': 0, 'en_uso': 0, 'libres': 0})
+
+
+@skipUnless(connection.vendor == 'mysql', "Requiere MySQL/MariaDB (ver BIOFRESCO_DB_HOST).")
+class PoolMySQLTests(TransactionTestCase):
+    def test_cerrar_devuelve_la_conexion_al_pool(self):
+        if connection._pool() is None:
+            self.skipTest("Pool desactivado (BIOFRESCO_DB_POOL=0).")
+        connection.close()
+        connection.ensure_connection()
+        cruda = connection.connection
+        connection.close()
+        connection.ensure_connection()
+        self.assertIs(connection.connection, cruda)
+
+    def test_benchmark_conexiones(self):
+        salida = io.StringIO()
+        call_command('benchmark_conexiones', hilos=2, ciclos=5, stdout=salida)
+        self.assertIn('Mejora p50 con pool', salida.getvalue())
+
+
+class EstaticosTests(TestCase):
+    def test_plantillas_sin_cdn(self):
+        externos = re.compile(r'cdn\.jsdelivr\.net|code\.jquery\.com|fonts\.googleapis\.com|unpkg\.com')
+        for carpeta, _, archivos in os.walk(settings.TEMPLATES[0]['DIRS'][0]):
+            for archivo in archivos:
+                with open(os.path.join(carpeta, archivo), encoding='utf-8') as f:
+                    self.assertIsNone(externos.search(f.read()), archivo)
+
+    def test_collectstatic_con_hash_precomprimido_y_cache_larga(self):
+        with tempfile.TemporaryDirectory() as origen, tempfile.TemporaryDirectory() as destino:
+            with open(os.path.join(origen, 'app.css'), 'w') as f:
+                f.write('.icono { background: url("icono.svg"); }\n' * 200)
+            with open(os.path.join(origen, 'icono.svg'), 'w') as f:
+                f.write('<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+            with override_settings(STATICFILES_DIRS=[origen], STATIC_ROOT=destino,
+                                   STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder']):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                nombre = staticfiles_storage.stored_name('app.css')
+                self.assertRegex(nombre, r'^app\.[0-9a-f]{12}\.css$')
+                with open(os.path.join(destino, nombre), 'rb') as f:
+                    contenido = f.read()
+                self.assertIn(staticfiles_storage.stored_name('icono.svg').encode(), contenido)
+
+                respuesta = self.client.get(f'/static/{nombre}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+                self.assertEqual((respuesta['Content-Encoding'], respuesta['Content-Type']), ('gzip', 'text/css'))
+                self.assertEqual(respuesta['Cache-Control'], CACHE_INMUTABLE)
+                self.assertEqual(gzip.decompress(b''.join(respuesta.streaming_content)), contenido)
+
+                respuesta = self.client.get('/static/app.css')
+                self.assertFalse(respuesta.has_header('Content-Encoding'))
+                self.assertNotEqual(respuesta['Cache-Control'], CACHE_INMUTABLE)
+                respuesta.close()
+
+
+def imagen_subida(nombre, tamano=(1200, 800), color=(200, 120, 40)):
+    salida = io.BytesIO()
+    Image.new('RGB', tamano, color).save(salida, 'PNG')
+    return SimpleUploadedFile(nombre, salida.getvalue(), content_type='image/png')
+
+
+@override_settings(MINIATURAS_EN_SEGUNDO_PLANO=False)
+class MiniaturasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('admin_bodega')
+        cls.usuario.groups.add(Group.objects.get(name='Administrador'))
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(self.usuario)
+
+    def crear(self, codigo, imagen):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Producto.objects.create(codigo=codigo, nombre='Palta', precio_costo=500, precio_venta=900,
+                                           imagen=imagen)
+
+    def test_subida_genera_miniaturas_y_catalogo_usa_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/administracion/producto/nuevo/', {
+                'codigo': '100', 'nombre': 'Palta', 'unidad_medida': 'KG', 'tipo_origen': 'COMPRA',
+                'precio_costo': 500, 'precio_venta': 900, 'stock_minimo': 5,
+                'imagen': imagen_subida('palta.png')})
+        self.assertEqual(respuesta.status_code, 302)
+        producto = Producto.objects.get(codigo='100')
+        self.assertEqual(producto.miniatura_de, producto.imagen.name)
+        for ancho in ANCHOS_MINIATURA:
+            for extension in FORMATOS_MINIATURA:
+                with default_storage.open(ruta_miniatura(producto.imagen.name, ancho, extension)) as f:
+                    self.assertEqual(Image.open(f).size, (ancho, ancho))
+        self.assertLess(default_storage.size(ruta_miniatura(producto.imagen.name, 64, 'webp')),
+                        default_storage.size(producto.imagen.name))
+
+        respuesta = self.client.get('/administracion/catalogo/')
+        self.assertContains(respuesta, '<source type="image/webp"')
+        self.assertContains(respuesta, f"{ruta_miniatura(producto.imagen.name, 256, 'webp')} 256w")
+        self.assertContains(respuesta, 'loading="lazy"')
+
+    def test_sin_miniaturas_listas_muestra_marcador(self):
+        with override_settings(MINIATURAS_EN_SEGUNDO_PLANO=True):
+            producto = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900,
+                                               imagen=imagen_subida('palta.png'))
+        self.assertIsNone(producto.miniatura)
+        self.assertNotContains(self.client.get('/administracion/catalogo/'), '<picture>')
+
+    def test_cambiar_imagen_regenera_y_borra_las_anteriores(self):
+        producto = self.crear('100', imagen_subida('palta.png'))
+        anterior = producto.imagen.name
+        producto.imagen = imagen_subida('palta_nueva.png', color=(40, 160, 60))
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+        producto.refresh_from_db()
+        self.assertEqual(producto.miniatura_de, producto.imagen.name)
+        self.assertTrue(default_storage.exists(ruta_miniatura(producto.imagen.name, 128, 'jpg')))
+        self.assertFalse(default_storage.exists(ruta_miniatura(anterior, 128, 'jpg')))
+
+        # Un save() con la instancia vieja no borra la marca ni vuelve a encolar.
+        with self.captureOnCommitCallbacks() as callbacks:
+            Producto.objects.get(pk=producto.pk).save()
+        self.assertEqual(callbacks, [])
+
+    def test_mismo_nombre_con_otra_extension_no_comparte_miniaturas(self):
+        png = self.crear('100', SimpleUploadedFile('palta.png', imagen_subida('x.png').read()))
+        salida = io.BytesIO()
+        Image.new('RGB', (400, 400), (10, 200, 10)).save(salida, 'JPEG')
+        jpg = self.crear('200', SimpleUploadedFile('palta.jpg', salida.getvalue()))
+        self.assertEqual((png.imagen.name, jpg.imagen.name), ('productos/palta.png', 'productos/palta.jpg'))
+        png.refresh_from_db()
+        jpg.refresh_from_db()
+        self.assertNotEqual(png.miniatura['src'], jpg.miniatura['src'])
+
+        with default_storage.open(ruta_miniatura(png.imagen.name, 64, 'jpg')) as f:
+            self.assertGreater(Image.open(f).getpixel((32, 32))[0], 150)
+        miniaturas.borrar(jpg.imagen.name)
+        self.assertTrue(default_storage.exists(ruta_miniatura(png.imagen.name, 64, 'webp')))
+
+    def test_png_con_transparencia_queda_sobre_blanco_en_jpeg(self):
+        salida = io.BytesIO()
+        Image.new('RGBA', (300, 300), (0, 0, 0, 0)).save(salida, 'PNG')
+        producto = self.crear('100', SimpleUploadedFile('logo.png', salida.getvalue()))
+        with default_storage.open(ruta_miniatura(producto.imagen.name, 64, 'jpg')) as f:
+            self.assertEqual(Image.open(f).getpixel((32, 32)), (255, 255, 255))
+
+    def test_comando_completa_las_pendientes(self):
+        with override_settings(MINIATURAS_EN_SEGUNDO_PLANO=True):
+            producto = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900,
+                                               imagen=imagen_subida('palta.png'))
+        Producto.objects.create(codigo='200', nombre='Pan', precio_costo=100, precio_venta=150)
+        salida = io.StringIO()
+        call_command('generar_miniaturas', hilos=1, stdout=salida)
+        self.assertIn('Miniaturas generadas para 1 productos', salida.getvalue())
+        producto.refresh_from_db()
+        self.assertIsNotNone(producto.miniatura)
+
+        salida = io.StringIO()
+        call_command('generar_miniaturas', stdout=salida)
+        self.assertIn('No hay imágenes pendientes', salida.getvalue())
+
+
+@override_settings(EXPORTACIONES_EN_SEGUNDO_PLANO=False)
+class ExportacionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gerente')
+        cls.palta = Producto.objects.create(codigo='100', nombre='Palta', precio_costo=500, precio_venta=900)
+        registrar_entrada(cls.palta, 10, cls.usuario, fecha_vencimiento=timezone.localdate() + timedelta(days=20))
+        registrar_salida(cls.palta, 'VENTA', 4, cls.usuario)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def generar(self, reporte='HISTORIAL', formato='CSV'):
+        return generar_exportacion(solicitar_exportacion(reporte, formato, self.usuario).pk)
+
+    def lineas(self, exportacion):
+        with default_storage.open(exportacion.archivo.name) as f:
+            return f.read().decode('utf-8-sig').strip().splitlines()
+
+    def test_reutiliza_el_archivo_mientras_no_cambien_los_datos(self):
+        exportacion = self.generar()
+        self.assertEqual(exportacion.estado, 'LISTO')
+        self.assertEqual(len(self.lineas(exportacion)), 1 + 2)
+        with self.assertNumQueries(4):  # huella (3) y get_or_create
+            self.assertEqual(solicitar_exportacion('HISTORIAL', 'CSV', self.usuario).pk, exportacion.pk)
+        self.assertIsNone(generar_exportacion(exportacion.pk))
+
+        # Iniciar sesión no cambia nada de lo exportado.
+        self.client.force_login(self.usuario)
+        self.assertEqual(solicitar_exportacion('HISTORIAL', 'CSV', self.usuario).pk, exportacion.pk)
+
+    def test_ediciones_cambian_la_huella(self):
+        lote = Lote.objects.get(producto=self.palta)
+        lote.numero_lote = 'L-2'
+        usuario = User.objects.get(pk=self.usuario.pk)
+        usuario.username = 'bodega'
+        for instancia in (self.palta, usuario, lote, Movimiento.objects.first()):
+            huella = huella_datos('HISTORIAL')
+            instancia.save()
+            self.assertNotEqual(huella_datos('HISTORIAL'), huella, instancia)
+        huella = huella_datos('HISTORIAL')
+        Movimiento.objects.first().delete()
+        self.assertNotEqual(huella_datos('HISTORIAL'), huella)
+
+    def test_ediciones_regeneran_y_borran_el_archivo_anterior(self):
+        exportacion = self.generar()
+        self.palta.nombre = 'Palta Hass'
+        self.palta.save()
+        movimiento = Movimiento.objects.get(tipo='VENTA')
+        movimiento.observacion = 'Corregida'
+        movimiento.save()
+
+        nueva = self.generar()
+        self.assertNotEqual(nueva.pk, exportacion.pk)
+        contenido = '\n'.join(self.lineas(nueva))
+        self.assertIn('Palta Hass', contenido)
+        self.assertIn('Corregida', contenido)
+        self.assertFalse(Exportacion.objects.filter(pk=exportacion.pk).exists())
+        self.assertFalse(default_storage.exists(exportacion.archivo.name))
+
+    def test_error_se_registra_y_se_reintenta(self):
+        def fallar():
+            yield ['1']
+            raise RuntimeError("disco lleno")
+
+        pendiente = solicitar_exportacion('HISTORIAL', 'CSV', self.usuario)
+        reporte = exportaciones.REPORTES['HISTORIAL']
+        with mock.patch.dict(exportaciones.REPORTES, {'HISTORIAL': (*reporte[:2], fallar, reporte[3])}):
+            with self.assertRaises(RuntimeError):
+                generar_exportacion(pendiente.pk)
+        pendiente.refresh_from_db()
+        self.assertEqual((pendiente.estado, pendiente.error), ('ERROR', 'disco lleno'))
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'exportaciones')), [])
+
+        reintento = solicitar_exportacion('HISTORIAL', 'CSV', self.usuario)
+        self.assertEqual((reintento.pk, reintento.estado, reintento.error), (pendiente.pk, 'PENDIENTE', ''))
+        self.assertEqual(generar_exportacion(reintento.pk).estado, 'LISTO')
+
+    def test_xlsx(self):
+        exportacion = self.generar('UBICACIONES', 'XLSX')
+        self.assertTrue(exportacion.archivo.name.endswith('.xlsx'))
+        with default_storage.open(exportacion.archivo.name) as f:
+            hoja = load_workbook(f, read_only=True).active
+            filas = [list(fila) for fila in hoja.iter_rows(values_only=True)]
+        self.assertEqual(filas[0], CABECERA_UBICACIONES)
+        self.assertEqual([fila[0] for fila in filas[1:]], ['Palta'])
+        self.assertEqual(filas[1][4], 6)
+        self.assertEqual((exportacion.filas_totales, exportacion.filas_procesadas, exportacion.progreso), (1, 1, 100))
+
+    def test_comando_procesa_las_pendientes(self):
+        historial = solicitar_exportacion('HISTORIAL', 'CSV', self.usuario)
+        ubicaciones = solicitar_exportacion('UBICACIONES', 'XLSX', self.usuario)
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('procesar_exportaciones', stdout=salida, stderr=errores)
+        self.assertEqual(salida.getvalue().count(' lista: '), 2)
+        self.assertEqual(errores.getvalue(), '')
+        self.assertEqual(set(Exportacion.objects.values_list('pk', 'estado')),
+                         {(historial.pk, 'LISTO'), (ubicaciones.pk, 'LISTO')})
+
+        salida = io.StringIO()
+        call_command('procesar_exportaciones', stdout=salida)
+        self.assertEqual(salida.getvalue(), '')
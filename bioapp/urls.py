@@ -1,10 +1,11 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', views.home_redirect, name='home'),
     path('gerencia/dashboard/', views.dashboard_gerencia, name='dashboard_gerencia'),
+    path('gerencia/tendencia/', views.tendencia_movimientos, name='tendencia_movimientos'),
     path('gerencia/historial/', views.historial_movimientos, name='historial_movimientos'),
     path('gerencia/exportar/', views.exportar_historial_csv, name='exportar_historial'),
     path('gerencia/equipo/', views.lista_colaboradores, name='lista_colaboradores'),
@@ -19,10 +20,18 @@ urlpatterns = [
     path('administracion/producto/eliminar/<int:pk>/', views.eliminar_producto, name='eliminar_producto'),
     path('administracion/reporte-ubicaciones/', views.reporte_ubicaciones, name='reporte_ubicaciones'),
     path('administracion/reporte-ubicaciones/exportar/', views.exportar_ubicaciones_csv, name='exportar_ubicaciones'),
+    path('reportes/exportar/<str:reporte>/', views.solicitar_exportacion, name='solicitar_exportacion'),
+    path('reportes/exportacion/<int:pk>/', views.detalle_exportacion, name='detalle_exportacion'),
+    path('reportes/exportacion/<int:pk>/estado/', views.estado_exportacion, name='estado_exportacion'),
+    path('reportes/exportacion/<int:pk>/descargar/', views.descargar_exportacion, name='descargar_exportacion'),
     path('mapa/', views.gestion_bodega, name='gestion_bodega'),
     path('mapa/lugar/<int:lugar_id>/', views.detalle_lugar, name='detalle_lugar'),
     path('mapa/contenedor/<int:contenedor_id>/', views.inventario_contenedor, name='inventario_contenedor'),
     path('bodega/dashboard/', views.dashboard_bodega, name='dashboard_bodega'),
     path('bodega/movimiento/', views.registrar_movimiento, name='registrar_movimiento'),
+    path('api/contenedores/', views.contenedores_por_lugar, name='contenedores_por_lugar'),
+    path('api/buscar/', views.autocompletar, name='autocompletar'),
+    path('api/ticket/', api.TicketAPIView.as_view(), name='api_ticket'),
+    path('metricas/', views.metricas, name='metricas'),
     path('salir/', auth_views.LogoutView.as_view(), name='exit'),
 ]
\ No newline at end of file
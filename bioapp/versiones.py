@@ -0,0 +1,26 @@
+import time
+
+from django.core.cache import cache
+
+
+def _clave(nombre):
+    return f"bioapp:version:{nombre}"
+
+
+def _semilla():
+    # Si la caché desaloja el contador, empezar de nuevo en 1 revalidaría las
+    # entradas viejas que sobrevivieron con la versión 1; la hora en ns no se repite.
+    return time.time_ns()
+
+
+def version(nombre):
+    """Versión actual de un conjunto de datos cacheados; forma parte de las claves de caché."""
+    return cache.get_or_set(_clave(nombre), _semilla, None)
+
+
+def nueva_version(nombre):
+    """Invalida todo lo cacheado bajo `nombre` sin tener que conocer sus claves."""
+    try:
+        cache.incr(_clave(nombre))
+    except ValueError:
+        cache.set(_clave(nombre), _semilla(), None)
@@ -1,97 +1,235 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, Q, ProtectedError, Count
+from django.db.models import Count, F, ProtectedError
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from .models import Producto, Lote, Movimiento, Lugar, Contenedor
+from django.core.cache import cache
+from django.conf import settings
+from .models import DIAS_CRITICO, Producto, Lote, Movimiento, Lugar, Contenedor, Exportacion
 from .forms import (
     MovimientoForm, ProductoForm, RegistroEmpleadoForm, 
-    EditarEmpleadoForm, LugarForm, ContenedorForm
+    EditarEmpleadoForm, LugarForm, ContenedorForm, HistorialFiltroForm
+)
+from .roles import roles_de
+from .inventario import StockInsuficiente, dar_de_baja_vencidos, registrar_entrada, registrar_salida
+from . import exportaciones, metricas as metricas_proceso, resumen
+from . import busqueda as busqueda_indexada
+from .versiones import version
+from .indicadores import akpis_operativos, mapa_ocupacion, ocupacion_contenedores, ocupacion_lugares
+from .concurrente import en_paralelo
+from .reportes import (
+    CABECERA_HISTORIAL, CABECERA_UBICACIONES, condicion_keyset, filas_historial, filas_ubicaciones
 )
 import csv
-from django.http import HttpResponse
-from datetime import timedelta
+import hashlib
+import hmac
+import json
+import os
+from django.http import StreamingHttpResponse, JsonResponse, FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import condition
+from datetime import datetime, time, timedelta
+
+MOVIMIENTOS_POR_PAGINA = 50
+TENDENCIA_MAXIMO_DIAS = 366
+ETIQUETAS_ALERTA = {
+    'VENCIDO': 'Vencidos',
+    'HOY': 'Vencen hoy',
+    'CRITICO': 'Próximos 7 días',
+    'OK': 'Al día',
+}
+
+# periodo -> (etiqueta, días hacia atrás incluyendo hoy; None = todo el historial)
+PERIODOS = {
+    '': ('Todo', None),
+    'dia': ('Hoy', 1),
+    'semana': ('7 días', 7),
+    'mes': ('30 días', 30),
+}
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+def _cursor(movimiento):
+    return f"{movimiento.fecha.isoformat()}_{movimiento.pk}"
+
+def _leer_cursor(valor):
+    """(fecha, id) de un cursor armado por _cursor; None si viene alterado."""
+    if not valor:
+        return None
+    try:
+        fecha, pk = valor.rsplit('_', 1)
+        fecha, pk = datetime.fromisoformat(fecha), int(pk)
+    except ValueError:
+        return None
+    if timezone.is_naive(fecha) or not 0 < pk < 2 ** 63:
+        return None
+    return fecha, pk
+
+class _Eco:
+    def write(self, valor):
+        return valor
+
+def _respuesta_csv(nombre_archivo, cabecera, filas):
+    writer = csv.writer(_Eco(), delimiter=';')
+    def contenido():
+        buffer = ['\ufeff', writer.writerow(cabecera)]
+        for fila in filas:
+            buffer.append(writer.writerow(fila))
+            if len(buffer) >= 500:
+                yield ''.join(buffer)
+                buffer = []
+        yield ''.join(buffer)
+    response = StreamingHttpResponse(contenido(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
 
 def es_bodeguero(user):
-    return user.groups.filter(name='Bodeguero').exists() or user.is_superuser
+    return roles_de(user).es_bodeguero
 
 def es_admin_bodega(user):
-    return user.groups.filter(name='Administrador').exists() or user.groups.filter(name='Gerente').exists() or user.is_superuser
+    return roles_de(user).es_admin_bodega
 
 def es_gerente(user):
-    return user.groups.filter(name='Gerente').exists() or user.is_superuser
+    return roles_de(user).es_gerente
+
+def puede_ver_ubicaciones(user):
+    return roles_de(user).puede_ver_ubicaciones
+
+PERMISOS_EXPORTACION = {
+    'HISTORIAL': es_gerente,
+    'UBICACIONES': puede_ver_ubicaciones,
+}
 
 @login_required
 def home_redirect(request):
-    user = request.user
-    if es_bodeguero(user) and not es_admin_bodega(user):
+    roles = roles_de(request.user)
+    if roles.es_bodeguero and not roles.es_admin_bodega:
         return redirect('dashboard_bodega')
-    elif user.groups.filter(name='Administrador').exists():
+    elif roles.es_administrador:
         return redirect('dashboard_operativo')
-    elif es_gerente(user):
+    elif roles.es_gerente:
         return redirect('dashboard_gerencia')
     return redirect('dashboard_operativo')
 
 @login_required
 def dashboard_bodega(request):
-    if not (request.user.groups.filter(name='Bodeguero').exists() or request.user.is_superuser):
+    if not es_bodeguero(request.user):
         return redirect('home')
     return render(request, 'bodega/dashboard.html')
 
 @login_required
 @user_passes_test(es_gerente, login_url='home')
-def dashboard_gerencia(request):
-    productos = Producto.objects.all()
-    productos_bajo_stock = [p for p in productos if p.stock_actual <= p.stock_minimo]
-    total_ventas = Movimiento.objects.filter(tipo='VENTA').aggregate(Sum('total_movimiento'))['total_movimiento__sum'] or 0
-    total_mermas = Movimiento.objects.filter(tipo='MERMA').aggregate(Sum('total_movimiento'))['total_movimiento__sum'] or 0
+async def dashboard_gerencia(request):
+    periodo = request.GET.get('periodo', '')
+    if periodo not in PERIODOS:
+        periodo = ''
+    dias = PERIODOS[periodo][1]
+    desde = timezone.localdate() - timedelta(days=dias - 1) if dias else None
+
+    # Consultas independientes: corren a la vez y la latencia es la de la más lenta.
+    datos = await en_paralelo({
+        'totales': lambda: resumen.totales(desde),
+        'bajo_stock': lambda: Producto.objects.filter(stock_actual__lte=F('stock_minimo')).count(),
+        'colaboradores': lambda: list(User.objects.filter(is_superuser=False).prefetch_related('groups')
+                                      .order_by('-date_joined')[:5]),
+    })
+    totales = datos['totales']
+    total_ventas = totales['VENTA']['valor']
+    total_mermas = totales['MERMA']['valor']
     ganancia_neta = total_ventas - total_mermas
-    ultimos_colaboradores = User.objects.filter(is_superuser=False).order_by('-date_joined')[:5]
 
     context = {
-        'productos_bajo_stock': productos_bajo_stock,
+        'productos_bajo_stock': datos['bajo_stock'],
         'total_ventas': total_ventas,
         'total_mermas': total_mermas,
         'ganancia_neta': ganancia_neta,
-        'ultimos_colaboradores': ultimos_colaboradores,
+        'ultimos_colaboradores': datos['colaboradores'],
+        'periodo': periodo,
+        'periodos': [(clave, nombre) for clave, (nombre, _) in PERIODOS.items()],
     }
-    return render(request, 'gerencia/dashboard.html', context)
+    return await sync_to_async(render)(request, 'gerencia/dashboard.html', context)
+
+@login_required
+@user_passes_test(es_gerente, login_url='home')
+def tendencia_movimientos(request):
+    """Serie diaria de valor vendido, mermado e ingresado para el gráfico del dashboard."""
+    try:
+        dias = min(max(int(request.GET.get('dias', 30)), 1), TENDENCIA_MAXIMO_DIAS)
+    except ValueError:
+        dias = 30
+    hasta = timezone.localdate()
+    fechas, series = resumen.serie_diaria(hasta - timedelta(days=dias - 1), hasta)
+    return JsonResponse({'fechas': [f.isoformat() for f in fechas], 'series': series})
 
 @login_required
 @user_passes_test(es_gerente, login_url='home')
 def historial_movimientos(request):
-    movimientos = Movimiento.objects.all().order_by('-fecha')
+    movimientos = Movimiento.objects.select_related('producto', 'usuario')
+    filtros = HistorialFiltroForm(request.GET)
+    if filtros.is_valid():
+        tipo = filtros.cleaned_data['tipo']
+        desde = filtros.cleaned_data['desde']
+        hasta = filtros.cleaned_data['hasta']
+        if tipo:
+            movimientos = movimientos.filter(tipo=tipo)
+        if desde:
+            movimientos = movimientos.filter(fecha__gte=_inicio_dia(desde))
+        if hasta:
+            movimientos = movimientos.filter(fecha__lt=_inicio_dia(hasta + timedelta(days=1)))
+
     busqueda = request.GET.get('buscar')
     if busqueda:
-        movimientos = movimientos.filter(
-            Q(producto__nombre__icontains=busqueda) |
-            Q(producto__codigo__icontains=busqueda) |
-            Q(tipo__icontains=busqueda)
-        )
-    return render(request, 'gerencia/historial.html', {'movimientos': movimientos})
+        movimientos = busqueda_indexada.filtrar(movimientos, busqueda, {'PRODUCTO': 'producto_id'})
+
+    # Paginación por cursor sobre (fecha, id): cada página es un rango del
+    # índice, así que la página N cuesta lo mismo que la primera.
+    antes = _leer_cursor(request.GET.get('antes'))
+    despues = _leer_cursor(request.GET.get('despues'))
+    if despues:
+        pagina = list(movimientos.filter(condicion_keyset(['fecha', 'id'], despues))
+                      .order_by('fecha', 'id')[:MOVIMIENTOS_POR_PAGINA + 1])
+        hay_anterior = len(pagina) > MOVIMIENTOS_POR_PAGINA
+        pagina = pagina[:MOVIMIENTOS_POR_PAGINA][::-1]
+        hay_siguiente = True
+    else:
+        if antes:
+            movimientos = movimientos.filter(condicion_keyset(['-fecha', '-id'], antes))
+        pagina = list(movimientos.order_by('-fecha', '-id')[:MOVIMIENTOS_POR_PAGINA + 1])
+        hay_siguiente = len(pagina) > MOVIMIENTOS_POR_PAGINA
+        pagina = pagina[:MOVIMIENTOS_POR_PAGINA]
+        hay_anterior = antes is not None
+
+    parametros = request.GET.copy()
+    parametros.pop('antes', None)
+    parametros.pop('despues', None)
+    url_siguiente = url_anterior = None
+    if pagina and hay_siguiente:
+        parametros['antes'] = _cursor(pagina[-1])
+        url_siguiente = '?' + parametros.urlencode()
+        parametros.pop('antes')
+    if pagina and hay_anterior:
+        parametros['despues'] = _cursor(pagina[0])
+        url_anterior = '?' + parametros.urlencode()
+
+    return render(request, 'gerencia/historial.html', {
+        'movimientos': pagina,
+        'filtros': filtros,
+        'url_siguiente': url_siguiente,
+        'url_anterior': url_anterior,
+    })
 
 @login_required
 @user_passes_test(es_gerente, login_url='home')
 def exportar_historial_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="historial_movimientos.csv"'
-    response.write(u'\ufeff'.encode('utf8')) 
-    writer = csv.writer(response, delimiter=';') 
-    writer.writerow(['ID', 'Fecha', 'Hora', 'Tipo', 'Producto', 'SKU', 'Cantidad', 'Unidad', 'Usuario', 'Total ($)', 'Observación', 'Lote', 'Vencimiento'])
-    movimientos = Movimiento.objects.all().order_by('-fecha')
-    for m in movimientos:
-        fecha_str = m.fecha.strftime("%d/%m/%Y")
-        hora_str = m.fecha.strftime("%H:%M")
-        lote_str = m.lote.numero_lote if m.lote else "N/A"
-        venc_str = m.lote.fecha_vencimiento.strftime("%d/%m/%Y") if m.lote else "N/A"
-        writer.writerow([m.id, fecha_str, hora_str, m.tipo, m.producto.nombre, m.producto.codigo, m.cantidad, m.producto.get_unidad_medida_display(), m.usuario.username, m.total_movimiento, m.observacion, lote_str, venc_str])
-    return response
+    return _respuesta_csv('historial_movimientos.csv', CABECERA_HISTORIAL, filas_historial())
 
 @login_required
 @user_passes_test(es_gerente, login_url='home')
 def lista_colaboradores(request):
-    colaboradores = User.objects.filter(is_superuser=False)
+    colaboradores = User.objects.filter(is_superuser=False).prefetch_related('groups')
     return render(request, 'gerencia/colaboradores.html', {'colaboradores': colaboradores})
 
 @login_required
@@ -144,54 +282,28 @@ def eliminar_colaborador(request, pk):
 
 @login_required
 @user_passes_test(es_admin_bodega, login_url='home')
-def dashboard_operativo(request):
-    lotes_vencidos = Lote.objects.filter(cantidad__gt=0, fecha_vencimiento__lte=timezone.now().date()).count()
-    lotes_por_vencer = Lote.objects.filter(cantidad__gt=0, fecha_vencimiento__lte=timezone.now().date() + timezone.timedelta(days=7)).count()
-    total_contenedores = Contenedor.objects.count()
-    contenedores_usados = Lote.objects.filter(cantidad__gt=0).values('contenedor').distinct().count()
-    ocupacion = int((contenedores_usados / total_contenedores * 100)) if total_contenedores > 0 else 0
-    movimientos_hoy = Movimiento.objects.filter(fecha__date=timezone.now().date()).count()
-
-    context = {
-        'lotes_vencidos': lotes_vencidos,
-        'lotes_por_vencer': lotes_por_vencer,
-        'ocupacion': ocupacion,
-        'movimientos_hoy': movimientos_hoy,
-    }
-    return render(request, 'administracion/dashboard.html', context)
+async def dashboard_operativo(request):
+    context = await akpis_operativos()
+    return await sync_to_async(render)(request, 'administracion/dashboard.html', context)
 
 @login_required
 @user_passes_test(es_admin_bodega, login_url='home')
 def procesar_vencimientos(request):
-    manana = timezone.now().date() + timezone.timedelta(days=1)
-    lotes_vencidos = Lote.objects.filter(fecha_vencimiento__lt=manana, cantidad__gt=0)
-    cantidad_procesada = 0
-    if not lotes_vencidos.exists():
+    resultado = dar_de_baja_vencidos(request.user)
+    if not resultado['lotes']:
         messages.info(request, "No hay lotes vencidos pendientes de baja.")
         return redirect('dashboard_operativo')
 
-    for lote in lotes_vencidos:
-        cantidad_a_bajar = lote.cantidad
-        producto = lote.producto
-        Movimiento.objects.create(
-            producto=producto, lote=lote, usuario=request.user, tipo='MERMA',
-            cantidad=cantidad_a_bajar, precio_unitario_snapshot=producto.precio_costo,
-            observacion=f"BAJA AUTOMÁTICA POR VENCIMIENTO (Venció el {lote.fecha_vencimiento})"
-        )
-        lote.cantidad = 0
-        lote.save()
-        cantidad_procesada += 1
-
-    messages.warning(request, f"¡Listo! Se dieron de baja {cantidad_procesada} lotes.")
+    messages.warning(request, f"¡Listo! Se dieron de baja {resultado['lotes']} lotes (${resultado['valor']}).")
     return redirect('dashboard_operativo')
 
 @login_required
 @user_passes_test(es_admin_bodega, login_url='home')
 def lista_productos(request):
     busqueda = request.GET.get('buscar')
-    productos = Producto.objects.all().order_by('nombre')
+    productos = Producto.objects.con_proximo_vencimiento().order_by('nombre')
     if busqueda:
-        productos = productos.filter(Q(nombre__icontains=busqueda) | Q(codigo__icontains=busqueda))
+        productos = busqueda_indexada.filtrar(productos, busqueda, {'PRODUCTO': 'pk'})
     return render(request, 'administracion/catalogo.html', {'productos': productos})
 
 @login_required
@@ -240,7 +352,6 @@ def eliminar_producto(request, pk):
 @login_required
 @user_passes_test(es_admin_bodega, login_url='home')
 def gestion_bodega(request):
-    lugares = Lugar.objects.all()
     if request.method == 'POST':
         form = LugarForm(request.POST)
         if form.is_valid():
@@ -249,14 +360,16 @@ def gestion_bodega(request):
             return redirect('gestion_bodega')
     else:
         form = LugarForm()
+    lugares = ocupacion_lugares(Lugar.objects.annotate(total_contenedores=Count('contenedores')), mapa_ocupacion())
     return render(request, 'mapa/mapa_gestion.html', {'lugares': lugares, 'form': form})
 
 @login_required
 @user_passes_test(es_admin_bodega, login_url='home')
 def detalle_lugar(request, lugar_id):
     lugar = get_object_or_404(Lugar, pk=lugar_id)
-    contenedores = lugar.contenedores.all()
-    proximo_lote_vencer = Lote.objects.filter(contenedor__lugar=lugar, cantidad__gt=0).order_by('fecha_vencimiento').first()
+    contenedores = ocupacion_contenedores(lugar.contenedores.all(), mapa_ocupacion())
+    proximo_lote_vencer = (Lote.objects.filter(contenedor__lugar=lugar, cantidad__gt=0)
+                           .select_related('producto', 'contenedor').order_by('fecha_vencimiento').first())
     if request.method == 'POST':
         form = ContenedorForm(request.POST)
         if form.is_valid():
@@ -265,72 +378,187 @@ def detalle_lugar(request, lugar_id):
             return redirect('detalle_lugar', lugar_id=lugar.id)
     else:
         form = ContenedorForm(initial={'lugar': lugar})
-    return render(request, 'mapa/detalle_lugar.html', {'lugar': lugar, 'contenedores': contenedores, 'form': form, 'proximo_lote_vencer': proximo_lote_vencer})
+    return render(request, 'mapa/detalle_lugar.html', {'lugar': lugar, 'contenedores': contenedores, 'form': form, 'proximo_lote_vencer': proximo_lote_vencer,
+                                                       'dias_critico': DIAS_CRITICO})
 
 @login_required
 def inventario_contenedor(request, contenedor_id):
-    contenedor = get_object_or_404(Contenedor, pk=contenedor_id)
-    lotes_en_contenedor = Lote.objects.filter(contenedor=contenedor, cantidad__gt=0).order_by('fecha_vencimiento')
-    return render(request, 'mapa/inventario_contenedor.html', {'contenedor': contenedor, 'lotes': lotes_en_contenedor, 'today': timezone.now().date()})
+    contenedor = get_object_or_404(Contenedor.objects.select_related('lugar'), pk=contenedor_id)
+    lotes_en_contenedor = (Lote.objects.activos().filter(contenedor=contenedor).con_alerta()
+                           .select_related('producto').order_by('fecha_vencimiento'))
+    return render(request, 'mapa/inventario_contenedor.html', {'contenedor': contenedor, 'lotes': lotes_en_contenedor})
+def _contenedores():
+    """(datos, etag) de los lugares con sus contenedores, cacheados bajo la versión 'contenedores'.
+
+    El ETag es un hash del contenido y no la versión: el contador vive en la
+    caché de cada proceso y vuelve a empezar al reiniciar, así que no sirve
+    para decirle a un navegador que lo que tiene sigue vigente.
+    """
+    clave = f"bioapp:contenedores:{version('contenedores')}"
+    guardado = cache.get(clave)
+    if guardado is None:
+        lugares = {}
+        filas = (Lugar.objects.order_by('nombre', 'id', 'contenedores__nombre', 'contenedores__id')
+                 .values_list('id', 'nombre', 'contenedores__id', 'contenedores__nombre'))
+        for lugar_id, lugar_nombre, contenedor_id, contenedor_nombre in filas:
+            lugar = lugares.setdefault(lugar_id, {'id': lugar_id, 'nombre': lugar_nombre, 'contenedores': []})
+            if contenedor_id is not None:
+                lugar['contenedores'].append({'id': contenedor_id, 'nombre': contenedor_nombre})
+        datos = {'lugares': list(lugares.values())}
+        huella = hashlib.sha1(json.dumps(datos, sort_keys=True).encode()).hexdigest()
+        guardado = (datos, f'"contenedores-{huella}"')
+        cache.set(clave, guardado, None)
+    return guardado
+
+def _etag_contenedores(request):
+    return _contenedores()[1]
+
+@login_required
+@condition(etag_func=_etag_contenedores)
+def contenedores_por_lugar(request):
+    """Lugares con sus contenedores para los selectores del formulario de entrada.
+
+    Se cachea bajo la versión 'contenedores' (cambia al guardar o borrar un
+    Lugar o Contenedor) y el navegador revalida con If-None-Match.
+    """
+    respuesta = JsonResponse(_contenedores()[0])
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
 @login_required
 def reporte_ubicaciones(request):
-    if not (request.user.is_staff or 
-            request.user.groups.filter(name='Bodeguero').exists() or 
-            request.user.groups.filter(name='Administrador').exists()): 
+    if not puede_ver_ubicaciones(request.user):
         return redirect('home')
     
-    lotes_activos = Lote.objects.filter(cantidad__gt=0).order_by('producto__nombre', 'fecha_vencimiento')
+    lotes_activos = Lote.objects.activos()
     
     busqueda = request.GET.get('buscar')
     if busqueda:
-        lotes_activos = lotes_activos.filter(
-            Q(producto__nombre__icontains=busqueda) |
-            Q(numero_lote__icontains=busqueda) |
-            Q(contenedor__nombre__icontains=busqueda) |
-            Q(contenedor__lugar__nombre__icontains=busqueda)
-        )
-
-    hoy = timezone.now().date()
-    proxima_semana = hoy + timedelta(days=7)
+        lotes_activos = busqueda_indexada.filtrar(lotes_activos, busqueda, {
+            'PRODUCTO': 'producto_id',
+            'LOTE': 'pk',
+            'CONTENEDOR': 'contenedor_id',
+            'LUGAR': 'contenedor__lugar_id',
+        })
+
+    conteo = lotes_activos.conteo_por_alerta()
+    alerta = request.GET.get('alerta')
+    if alerta in ETIQUETAS_ALERTA:
+        lotes_activos = lotes_activos.en_alerta(alerta)
+    lotes_activos = (lotes_activos.con_alerta().select_related('producto', 'contenedor__lugar')
+                     .order_by('producto__nombre', 'fecha_vencimiento'))
 
     return render(request, 'administracion/reporte_ubicaciones.html', {
-        'lotes': lotes_activos, 
-        'hoy': hoy,
-        'proxima_semana': proxima_semana
+        'lotes': lotes_activos,
+        'alertas': [(estado, nombre, conteo[estado]) for estado, nombre in ETIQUETAS_ALERTA.items()],
+        'alerta': alerta,
     })
 
 @login_required
 def exportar_ubicaciones_csv(request):
-    if not (request.user.is_staff or 
-            request.user.groups.filter(name='Bodeguero').exists() or 
-            request.user.groups.filter(name='Administrador').exists()): 
+    if not puede_ver_ubicaciones(request.user):
         return redirect('home')
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="reporte_stock_ubicaciones.csv"'
-    response.write(u'\ufeff'.encode('utf8')) 
-
-    writer = csv.writer(response, delimiter=';')
-    writer.writerow(['Producto', 'Código SKU', 'N° Lote', 'Vencimiento', 'Cantidad', 'Unidad', 'Ubicación (Contenedor)', 'Zona (Lugar)'])
-
-    lotes = Lote.objects.filter(cantidad__gt=0).order_by('producto__nombre')
-
-    for lote in lotes:
-        ubicacion = lote.contenedor.nombre if lote.contenedor else "Sin Asignar"
-        zona = lote.contenedor.lugar.nombre if lote.contenedor and lote.contenedor.lugar else "-"
-        
-        writer.writerow([
-            lote.producto.nombre,
-            lote.producto.codigo,
-            lote.numero_lote,
-            lote.fecha_vencimiento.strftime("%d/%m/%Y"),
-            lote.cantidad,
-            lote.producto.get_unidad_medida_display(),
-            ubicacion,
-            zona
-        ])
+    return _respuesta_csv('reporte_stock_ubicaciones.csv', CABECERA_UBICACIONES, filas_ubicaciones())
+@login_required
+def solicitar_exportacion(request, reporte):
+    reporte = reporte.upper()
+    formato = request.POST.get('formato', 'CSV').upper()
+    permiso = PERMISOS_EXPORTACION.get(reporte)
+    if permiso is None or formato not in dict(Exportacion.FORMATOS):
+        raise Http404
+    if not permiso(request.user):
+        return redirect('home')
+    if request.method != 'POST':
+        return redirect('home')
+    exportacion = exportaciones.solicitar_exportacion(reporte, formato, request.user)
+    return redirect('detalle_exportacion', pk=exportacion.pk)
+
+def _exportacion_permitida(request, pk):
+    exportacion = get_object_or_404(Exportacion, pk=pk)
+    if not PERMISOS_EXPORTACION[exportacion.reporte](request.user):
+        raise Http404
+    return exportacion
+
+@login_required
+def detalle_exportacion(request, pk):
+    exportacion = _exportacion_permitida(request, pk)
+    return render(request, 'reportes/exportacion.html', {'exportacion': exportacion})
+
+@login_required
+def estado_exportacion(request, pk):
+    exportacion = _exportacion_permitida(request, pk)
+    return JsonResponse({
+        'estado': exportacion.estado,
+        'progreso': exportacion.progreso,
+        'filas_procesadas': exportacion.filas_procesadas,
+        'filas_totales': exportacion.filas_totales,
+        'error': exportacion.error,
+        'url_descarga': reverse('descargar_exportacion', args=[exportacion.pk]) if exportacion.estado == 'LISTO' else None,
+    })
+
+@login_required
+def descargar_exportacion(request, pk):
+    exportacion = _exportacion_permitida(request, pk)
+    if exportacion.estado != 'LISTO' or not exportacion.archivo:
+        return redirect('detalle_exportacion', pk=exportacion.pk)
+    try:
+        archivo = exportacion.archivo.open('rb')
+    except FileNotFoundError:
+        raise Http404
+    return FileResponse(archivo, as_attachment=True, filename=os.path.basename(exportacion.archivo.name))
+
+AUTOCOMPLETAR_POR_PAGINA = 20
+AUTOCOMPLETAR_TIMEOUT = 300
+
+# tipo -> (queryset base, campos filtrados por el índice, orden, columnas, armado del texto)
+AUTOCOMPLETAR = {
+    'producto': (lambda: Producto.objects.all(), {'PRODUCTO': 'pk'}, ('nombre', 'id'),
+                 ('id', 'codigo', 'nombre'), lambda f: f"{f['nombre']} ({f['codigo']})"),
+    'lote': (lambda: Lote.objects.filter(cantidad__gt=0), {'LOTE': 'pk'}, ('fecha_vencimiento', 'id'),
+             ('id', 'numero_lote', 'producto__nombre'), lambda f: f"{f['numero_lote']} ({f['producto__nombre']})"),
+    'contenedor': (lambda: Contenedor.objects.all(), {'CONTENEDOR': 'pk'}, ('lugar__nombre', 'nombre', 'id'),
+                   ('id', 'nombre', 'lugar__nombre'), lambda f: f"{f['lugar__nombre']} - {f['nombre']}"),
+    'lugar': (lambda: Lugar.objects.all(), {'LUGAR': 'pk'}, ('nombre', 'id'),
+              ('id', 'nombre'), lambda f: f['nombre']),
+}
+# Índices cuyos cambios invalidan cada tipo: el texto del lote muestra el
+# producto y el del contenedor su lugar.
+AUTOCOMPLETAR_DEPENDE = {
+    'producto': ('PRODUCTO',),
+    'lote': ('LOTE', 'PRODUCTO'),
+    'contenedor': ('CONTENEDOR', 'LUGAR'),
+    'lugar': ('LUGAR',),
+}
+
+@login_required
+def autocompletar(request):
+    """Búsqueda paginada por prefijo para autocompletado y Select2; sin texto lista todo."""
+    texto = busqueda_indexada.normalizar(request.GET.get('q', ''))
+    tipo = request.GET.get('tipo', 'producto')
+    try:
+        pagina = max(1, int(request.GET.get('pagina', 1)))
+    except ValueError:
+        pagina = 1
+    if tipo not in AUTOCOMPLETAR:
+        return JsonResponse({'error': 'Tipo de búsqueda no válido.'}, status=400)
+
+    huella = hashlib.sha1(texto.encode()).hexdigest()
+    versiones = ':'.join(str(busqueda_indexada.version_de(t)) for t in AUTOCOMPLETAR_DEPENDE[tipo])
+    clave = f"bioapp:autocompletar:{versiones}:{tipo}:{pagina}:{huella}"
+    datos = cache.get(clave)
+    if datos is None:
+        base, campos, orden, columnas, armar = AUTOCOMPLETAR[tipo]
+        inicio = (pagina - 1) * AUTOCOMPLETAR_POR_PAGINA
+        filas = list(busqueda_indexada.filtrar(base(), texto, campos).order_by(*orden)
+                     .values(*columnas)[inicio:inicio + AUTOCOMPLETAR_POR_PAGINA + 1])
+        datos = {
+            'resultados': [{'id': f['id'], 'texto': armar(f)} for f in filas[:AUTOCOMPLETAR_POR_PAGINA]],
+            'mas': len(filas) > AUTOCOMPLETAR_POR_PAGINA,
+        }
+        cache.set(clave, datos, AUTOCOMPLETAR_TIMEOUT)
+    return JsonResponse(datos)
 
-    return response
 @login_required
 def registrar_movimiento(request):
     initial_data = {}
@@ -343,8 +571,7 @@ def registrar_movimiento(request):
     if request.method == 'POST':
         form = MovimientoForm(request.POST)
         if form.is_valid():
-            codigo = form.cleaned_data.get('codigo_barra')
-            producto_manual = form.cleaned_data.get('producto_manual')
+            producto = form.cleaned_data['producto']
             tipo = form.cleaned_data['tipo']
             cantidad = form.cleaned_data['cantidad']
             observacion = form.cleaned_data.get('observacion') or ""
@@ -356,72 +583,34 @@ def registrar_movimiento(request):
                 messages.error(request, "⛔ Escriba razón de merma obligatoria.")
                 return redirect('registrar_movimiento')
 
-            producto = None
-            if codigo:
-                try: producto = Producto.objects.get(codigo=codigo)
-                except Producto.DoesNotExist:
-                    messages.error(request, "No existe producto.")
-                    return redirect('registrar_movimiento')
-            elif producto_manual: producto = producto_manual
-
-            precio_snapshot = producto.precio_venta if tipo == 'VENTA' else producto.precio_costo
-
             if tipo == 'ENTRADA':
+                registrar_entrada(
+                    producto, cantidad, request.user, observacion=observacion, numero_lote=numero_lote_input,
+                    fecha_vencimiento=fecha_vencimiento_input, contenedor=contenedor_destino
+                )
                 if producto.gestiona_lotes:
-                    Lote.objects.create(
-                        producto=producto, cantidad=cantidad, numero_lote=numero_lote_input,
-                        fecha_vencimiento=fecha_vencimiento_input, contenedor=contenedor_destino
-                    )
                     ubicacion_str = f"en {contenedor_destino}" if contenedor_destino else ""
                 else:
                     ubicacion_str = "(Flujo Rápido)"
-
-                Movimiento.objects.create(
-                    producto=producto, usuario=request.user, tipo=tipo, cantidad=cantidad,
-                    precio_unitario_snapshot=precio_snapshot, observacion=observacion
-                )
                 messages.success(request, f"Entrada OK: {cantidad} {producto.get_unidad_medida_display()} {ubicacion_str}.")
-
             else:
-                if producto.stock_actual < cantidad:
+                try:
+                    registrar_salida(producto, tipo, cantidad, request.user, observacion=observacion)
+                except StockInsuficiente:
                     messages.error(request, "Stock insuficiente.")
                     return redirect('registrar_movimiento')
-
-                cantidad_pendiente = cantidad
-                lotes_activos = Lote.objects.filter(producto=producto, cantidad__gt=0).order_by('fecha_vencimiento')
-                
-                if not lotes_activos.exists() and producto.gestiona_lotes:
-                     messages.error(request, "Error crítico: Sin lotes físicos.")
-                     return redirect('registrar_movimiento')
-
-                for lote in lotes_activos:
-                    if cantidad_pendiente == 0: break
-                    if lote.cantidad >= cantidad_pendiente:
-                        lote.cantidad -= cantidad_pendiente
-                        lote.save()
-                        Movimiento.objects.create(
-                            producto=producto, lote=lote, usuario=request.user, tipo=tipo,
-                            cantidad=cantidad_pendiente, precio_unitario_snapshot=precio_snapshot, observacion=observacion
-                        )
-                        cantidad_pendiente = 0
-                    else:
-                        consumido = lote.cantidad
-                        lote.cantidad = 0
-                        lote.save()
-                        Movimiento.objects.create(
-                            producto=producto, lote=lote, usuario=request.user, tipo=tipo,
-                            cantidad=consumido, precio_unitario_snapshot=precio_snapshot, observacion=observacion
-                        )
-                        cantidad_pendiente -= consumido
-                
-                if not producto.gestiona_lotes:
-                     Movimiento.objects.create(
-                         producto=producto, usuario=request.user, tipo=tipo, 
-                         cantidad=cantidad, precio_unitario_snapshot=precio_snapshot, observacion=observacion
-                     )
-
                 messages.success(request, f"{tipo} registrada correctamente.")
             return redirect('registrar_movimiento')
     else:
         form = MovimientoForm(initial=initial_data)
-    return render(request, 'bodega/movimiento.html', {'form': form})
\ No newline at end of file
+    return render(request, 'bodega/movimiento.html', {'form': form})
+
+
+def metricas(request):
+    """Métricas en texto de Prometheus. Para staff con sesión o con `Authorization: Bearer <METRICAS_TOKEN>`."""
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    autorizacion = request.headers.get('Authorization', '')
+    por_token = bool(token) and hmac.compare_digest(autorizacion.encode(), f"Bearer {token}".encode())
+    if not (por_token or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(metricas_proceso.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -19,11 +19,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'bioapp',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'bioapp.estaticos.EstaticosMiddleware',
+    'bioapp.metricas.MetricasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -45,6 +48,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'bioapp.roles.roles',
             ],
         },
     },
@@ -55,12 +59,25 @@ WSGI_APPLICATION = 'biofrescoproyecto.wsgi.application'
 
 import pymysql
 pymysql.install_as_MySQLdb()
+# Las conexiones salen de un pool por proceso (bioapp/backends/mysql_pool) y
+# vuelven a él al terminar cada solicitud, así que CONN_MAX_AGE queda en 0.
+# BIOFRESCO_DB_POOL=0 desactiva el pool; BIOFRESCO_DB_HOST/PORT permiten
+# apuntar a otra instancia (p. ej. un MariaDB local para pruebas).
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'BIOFRESCO',
-        'USER': 'root',
-        'PASSWORD': '123456',
+        'ENGINE': 'bioapp.backends.mysql_pool',
+        'NAME': os.environ.get('BIOFRESCO_DB_NAME', 'BIOFRESCO'),
+        'USER': os.environ.get('BIOFRESCO_DB_USER', 'root'),
+        'PASSWORD': os.environ.get('BIOFRESCO_DB_PASSWORD', '123456'),
+        'HOST': os.environ.get('BIOFRESCO_DB_HOST', ''),
+        'PORT': os.environ.get('BIOFRESCO_DB_PORT', ''),
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'TAMANO': int(os.environ.get('BIOFRESCO_DB_POOL', '10')),
+            'ESPERA': 5,
+            'VIDA_MAXIMA': 30 * 60,
+            'VERIFICAR': True,
+        },
     }
 }
 
@@ -92,9 +109,50 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [STATIC_DIR]
+# `collectstatic` deja aquí los estáticos con hash en el nombre y sus versiones
+# .gz/.br (brotli si está instalado); sin DEBUG los sirve EstaticosMiddleware.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'bioapp.estaticos.EstaticosComprimidos'},
+}
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache local por proceso. Con varios workers hace falta un backend compartido
+# (Memcached/Redis) para que las invalidaciones lleguen a todos: con LocMem un
+# worker sigue sirviendo precios y nombres viejos (bioapp.codigos) hasta que
+# caduquen.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'biofresco',
+    }
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = 'home'
-LOGOUT_REDIRECT_URL = 'home'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'home'
+
+# Exportaciones de reportes: se generan en hilos del propio proceso web. Con
+# False quedan pendientes hasta que las tome `manage.py procesar_exportaciones`.
+EXPORTACIONES_EN_SEGUNDO_PLANO = True
+EXPORTACIONES_HILOS = 2
+
+# Miniaturas de las fotos de productos: se generan al subir la imagen en hilos
+# del proceso web. Con False se generan en la misma solicitud, al confirmar.
+MINIATURAS_EN_SEGUNDO_PLANO = True
+MINIATURAS_HILOS = 2
+
+# /metricas/ (formato Prometheus): staff con sesión o el scraper con
+# "Authorization: Bearer <token>". Sin token solo entra el staff.
+METRICAS_TOKEN = os.environ.get('BIOFRESCO_METRICAS_TOKEN', '')
+
+# `manage.py archivar_movimientos` deja en Movimiento solo los últimos N días;
+# lo anterior queda en MovimientoArchivado y en el saldo inicial de cada producto.
+ARCHIVO_DIAS = 365
+
+# Paneles async: sus agregados independientes corren a la vez, cada uno en un
+# hilo con su propia conexión. Cuenta HILOS conexiones más por proceso.
+PANELES_EN_PARALELO = True
+PANELES_HILOS = 4
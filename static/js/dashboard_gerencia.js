@@ -0,0 +1,58 @@
+// Gráficos del panel gerencial (gerencia/dashboard.html). Requiere Chart.js.
+const ctx = document.getElementById('miGrafico');
+
+new Chart(ctx, {
+    type: 'doughnut',
+    data: {
+        labels: ['Ingresos (Ventas)', 'Pérdidas (Mermas)'],
+        datasets: [{
+            data: [Number(ctx.dataset.ventas), Number(ctx.dataset.mermas)],
+            backgroundColor: [
+                '#aec90b',
+                '#dc3545'
+            ],
+            hoverOffset: 15,
+            borderWidth: 0,
+        }]
+    },
+    options: {
+        responsive: true,
+        cutout: '75%',
+        plugins: {
+            legend: {
+                position: 'bottom',
+                labels: {
+                    usePointStyle: true,
+                    padding: 20,
+                    font: { family: "system-ui, -apple-system, 'Segoe UI', Roboto, sans-serif", size: 12 }
+                }
+            }
+        },
+        animation: {
+            animateScale: true,
+            animateRotate: true
+        }
+    }
+});
+
+const tendencia = document.getElementById('graficoTendencia');
+fetch(tendencia.dataset.url)
+    .then(r => r.json())
+    .then(datos => {
+        new Chart(tendencia, {
+            type: 'line',
+            data: {
+                labels: datos.fechas.map(f => f.slice(8, 10) + '/' + f.slice(5, 7)),
+                datasets: [
+                    { label: 'Ventas', data: datos.series.VENTA, borderColor: '#aec90b', backgroundColor: '#aec90b', tension: 0.3 },
+                    { label: 'Mermas', data: datos.series.MERMA, borderColor: '#dc3545', backgroundColor: '#dc3545', tension: 0.3 },
+                ]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: { legend: { position: 'bottom', labels: { usePointStyle: true } } },
+                scales: { y: { beginAtZero: true } }
+            }
+        });
+    });
@@ -0,0 +1,81 @@
+// Formulario de movimientos de bodega (bodega/movimiento.html). Requiere jQuery y Select2.
+let dataContenedores = [];
+
+$(document).ready(function() {
+    const formulario = document.getElementById('form-movimiento');
+
+    $('.select2-producto').select2({
+        placeholder: "Buscar producto...", allowClear: true, width: '100%',
+        ajax: {
+            url: formulario.dataset.urlAutocompletar,
+            delay: 250,
+            cache: true,
+            data: function(params) { return { tipo: 'producto', q: params.term || '', pagina: params.page || 1 }; },
+            processResults: function(datos) {
+                return {
+                    results: datos.resultados.map(function(r) { return { id: r.id, text: r.texto }; }),
+                    pagination: { more: datos.mas }
+                };
+            }
+        }
+    });
+
+    $('#id_codigo_barra').on('input', function() { $('.select2-producto').val(null).trigger('change'); });
+    $('.select2-producto').on('change', function() { if($(this).val()) { $('#id_codigo_barra').val(''); } });
+
+    window.setTimeout(function() { $(".alert").fadeTo(500, 0).slideUp(500, function(){ $(this).remove(); }); }, 3000);
+
+    const $selectLugar = $('#id_lugar_filtro');
+    const $selectContenedor = $('#id_contenedor_destino');
+
+    function filtrarContenedores() {
+        const lugarSeleccionado = $selectLugar.val();
+        const contenedorActual = $selectContenedor.val();
+
+        $selectContenedor.empty();
+        $selectContenedor.append('<option value="">---------</option>');
+
+        dataContenedores.forEach(function(cont) {
+            if (!lugarSeleccionado || cont.lugar_id === lugarSeleccionado) {
+                $selectContenedor.append(new Option(cont.nombre, cont.id));
+            }
+        });
+
+        $selectContenedor.val(contenedorActual);
+    }
+
+    $selectLugar.change(filtrarContenedores);
+    fetch(formulario.dataset.urlContenedores)
+        .then(function(r) { return r.json(); })
+        .then(function(datos) {
+            dataContenedores = [];
+            datos.lugares.forEach(function(lugar) {
+                lugar.contenedores.forEach(function(c) {
+                    dataContenedores.push({ id: String(c.id), nombre: c.nombre, lugar_id: String(lugar.id) });
+                });
+            });
+            filtrarContenedores();
+        });
+
+    function actualizarFormulario() {
+        let tipo = $('#id_tipo').val();
+        
+        if (tipo === 'ENTRADA') {
+            $('#bloque_entrada').slideDown();
+        } else {
+            $('#bloque_entrada').slideUp();
+        }
+
+        if (tipo === 'MERMA') {
+            $('#id_observacion').addClass('border-danger bg-danger bg-opacity-10');
+            $('#label_obs').addClass('text-danger').text('Razón de Merma (Obligatorio)');
+            $('#help_obs').removeClass('d-none');
+        } else {
+            $('#id_observacion').removeClass('border-danger bg-danger bg-opacity-10');
+            $('#label_obs').removeClass('text-danger').text('Observación (Opcional)');
+            $('#help_obs').addClass('d-none');
+        }
+    }
+    $('#id_tipo').change(actualizarFormulario);
+    actualizarFormulario(); 
+});